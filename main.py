@@ -9,6 +9,8 @@ Example:
     request = RequestMp(qa_pairs)
     request.get(endpoint="my/ships", priority=3, token="abc123")
     ```
+
+Processes that are started otherwise (e.g. a notebook) can use `RequestClient()` instead.
 """
 
 if __name__ == "__main__":
@@ -20,7 +22,7 @@ if __name__ == "__main__":
     db_server()
     manager, api_handler, qa_pairs = api_server()
 
-    request = RequestMp(qa_pairs, priority=0, token=None)
+    request = RequestMp(qa_pairs, priority=0, token=None, raw=True)
     status = request.get(endpoint="")
     print(status['status'])
 
@@ -30,8 +32,10 @@ if __name__ == "__main__":
 
     token = api_agent(request, priority=0)[1]
     db_update_factions(request, priority=0, token=token)
-    astronomer(request, priority=0, token=token)
-    cartographer(request, priority=0, token=token, chart="start systems")
+    astronomer(request.tagged("astronomer"), priority=0, token=token)
+    cartographer(
+        request.tagged("cartographer"), priority=0, token=token, chart="start systems"
+    )
 
     # # (Re)start the start system probing
     # from st2.spies import spymaster
@@ -1,10 +1,10 @@
 import random
 import string
 
-from psycopg import connect
 from psycopg.types.json import Jsonb
 
 from st2 import time
+from st2.db import db_conn
 
 
 def api_agent(request, priority=0):
@@ -13,7 +13,7 @@ def api_agent(request, priority=0):
     This is to notice server resets immediately.
     """
     role = "reset detection"
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 "SELECT symbol, token, role FROM agents WHERE role = %s",
@@ -95,7 +95,7 @@ def register_agent(
         payload["email"] = email
     # data keys: ['token', 'agent', 'contract', 'faction', 'ship']
     data = request.post("register", priority, None, payload)["data"]
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
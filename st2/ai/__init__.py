@@ -3,10 +3,9 @@ import threading
 from time import sleep
 from uuid import uuid1
 
-from psycopg import connect
-
 from st2.ai.probe import ai_probe_waypoint
 from st2.ai.system import ai_seed_system
+from st2.db import db_conn
 from st2.logging import logger
 
 
@@ -93,9 +92,10 @@ class TaskMaster:
         self.terminate()
 
     def run(self):
-        with connect("dbname=st2 user=postgres") as conn:
-            with conn.cursor() as cur:
-                while True:
+        while True:
+            # a connection per round (the pool is shared with the tasks)
+            with db_conn() as conn:
+                with conn.cursor() as cur:
                     cur.execute(
                         """
                         SELECT *
@@ -188,7 +188,7 @@ class TaskMaster:
                         if commit:
                             conn.commit()
 
-                    sleep(0.1)  # TODO: remove?
+            sleep(0.1)  # TODO: remove?
 
     def get_task(self, ship_symbol, agent_symbol, task):
         task = task.split(" ")
@@ -1,7 +1,7 @@
 from asyncio import sleep
 
 from st2.logging import logger
-from st2.ship import Ship
+from st2.ship import AsyncShip
 
 
 @logger.catch  # catch errors in a separate thread
@@ -13,12 +13,14 @@ async def ai_probe_waypoint(
     priority=3,
     verbose=False,
 ):
-    ship = Ship(ship_symbol, qa_pairs, priority)
-    ship.refresh()
+    ship = await AsyncShip.load(
+        ship_symbol, qa_pairs, priority, tag=f"probe {ship_symbol}"
+    )
+    await ship.refresh()
 
     # navigate to the waypoint
     if ship["nav"]["waypointSymbol"] != waypoint_symbol:
-        ship.navigate(waypoint_symbol, verbose=verbose)
+        await ship.navigate(waypoint_symbol, verbose=verbose)
     if t := ship.nav_remaining():
         await sleep(t)
 
@@ -28,6 +30,6 @@ async def ai_probe_waypoint(
         logger.info(f"{ship.name()} is probing {trait} {waypoint_symbol}")
     while True:
         if is_shipyard:
-            ship.shipyard()
-        ship.market()
+            await ship.shipyard()
+        await ship.market()
         await sleep(600)
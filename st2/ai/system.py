@@ -1,12 +1,11 @@
-from asyncio import sleep
-
-from psycopg import connect
+from asyncio import sleep, to_thread
 
+from st2.db import db_conn, db_conn_async
 from st2.exceptions import GameError
 from st2.logging import logger
 from st2.pathing.travel import travel
 from st2.pathing.utils import nav_score
-from st2.ship import Ship, buy_ship
+from st2.ship import AsyncShip, Ship, buy_ship_async
 from st2.system import System
 
 
@@ -22,24 +21,29 @@ async def ai_seed_system(
     Assumption: any pre-existing probes meant for probing should have
     their task set to probe prior to starting this function.
     """
-    ship = Ship(ship_symbol, qa_pairs, priority)
-    ship.refresh()
+    ship = await AsyncShip.load(
+        ship_symbol, qa_pairs, priority, tag=f"seed {ship_symbol}"
+    )
+    await ship.refresh()
     system_symbol = ship["nav"]["systemSymbol"]
-    system = System(system_symbol, ship.request)
-    shipyards = {wp: None for wp in system.shipyards_with("SHIP_PROBE")}
+    system = System(system_symbol, ship.request.sync)
+    # (in threads: the system is loaded with blocking API and database calls)
+    await to_thread(system.load, "markets", "graph")
+    probe_shipyards = await to_thread(system.shipyards_with, "SHIP_PROBE")
+    shipyards = {wp: None for wp in probe_shipyards}
     markets = {wp: None for wp in system.markets if wp not in shipyards}
     if len(shipyards) == 0:
         raise NotImplementedError(f"System {system_symbol} does not sell probes!")
     if None not in list(markets.values()) + list(shipyards.values()):
-        return stop_task(ship_symbol)
+        return await to_thread(stop_task, ship_symbol)
 
     if verbose:
         logger.info(f"{ship.name()} begun seeding system {system_symbol}")
 
-    with connect("dbname=st2 user=postgres") as conn:
-        with conn.cursor() as cur:
+    async with db_conn_async() as conn:
+        async with conn.cursor() as cur:
             # load probe overview
-            cur.execute(
+            await cur.execute(
                 """
                 SELECT *
                 FROM tasks
@@ -49,7 +53,7 @@ async def ai_seed_system(
                 """,
                 [ship["agentSymbol"], f"probe % {system_symbol}-%"],
             )
-            for probe_symbol, _, current, _, _, _, _ in cur.fetchall():
+            for probe_symbol, _, current, _, _, _, _ in await cur.fetchall():
                 task, waypoint_type, waypoint_symbol = current.split(" ")
                 if waypoint_symbol in shipyards:
                     shipyards[waypoint_symbol] = probe_symbol
@@ -66,11 +70,11 @@ async def ai_seed_system(
             continue
         # purchase & assign a probe at each shipyard
         await travel(ship, waypoint_symbol, verbose=verbose)
-        probe_symbol = ship.buy_ship("SHIP_PROBE", verbose)
+        probe_symbol = await ship.buy_ship("SHIP_PROBE", verbose)
         task = f"probe {wp_type} {waypoint_symbol}"
-        with connect("dbname=st2 user=postgres") as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with db_conn_async() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
                     UPDATE tasks
                     SET current = %s,
@@ -83,7 +87,7 @@ async def ai_seed_system(
 
     # wait until all probes arrived to the shipyards
     for probe_symbol in shipyards.values():
-        probe = Ship(probe_symbol, qa_pairs, priority)
+        probe = await to_thread(Ship, probe_symbol, qa_pairs, priority)
         if t := probe.nav_remaining():
             await sleep(t)
 
@@ -92,11 +96,11 @@ async def ai_seed_system(
     waypoints = [wp for (wp, probe) in markets.items() if probe is None]
     for waypoint_symbol in waypoints:
         # select the shipyard to purchase a probe from
-        shipyard_symbol = select_shipyard(waypoint_symbol, system)
+        shipyard_symbol = await to_thread(select_shipyard, waypoint_symbol, system)
 
         # purchase & assign a probe
         try:
-            probe_symbol = buy_ship(
+            probe_symbol = await buy_ship_async(
                 ship_type="SHIP_PROBE",
                 waypoint_symbol=shipyard_symbol,
                 agent_symbol=ship["agentSymbol"],
@@ -105,13 +109,13 @@ async def ai_seed_system(
             )
         except GameError as e:
             if "Agent has insufficient funds." in str(e):
-                return stop_task(ship_symbol)
+                return await to_thread(stop_task, ship_symbol)
             raise e
-        ship.shipyard()
+        await ship.shipyard()
         task = f"probe {wp_type} {waypoint_symbol}"
-        with connect("dbname=st2 user=postgres") as conn:
-            with conn.cursor() as cur:
-                cur.execute(
+        async with db_conn_async() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
                     """
                     UPDATE tasks
                     SET current = %s,
@@ -125,7 +129,7 @@ async def ai_seed_system(
     # done
     if verbose:
         logger.info(f"{ship.name()} completed seeding system {system_symbol}!")
-    stop_task(ship_symbol)
+    await to_thread(stop_task, ship_symbol)
 
 
 def select_shipyard(waypoint_symbol, system):
@@ -149,7 +153,7 @@ def stop_task(ship_symbol):
     """
     Remove this current task from the task table.
     """
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -0,0 +1,144 @@
+import threading
+from collections import defaultdict, deque
+from copy import deepcopy
+from json import JSONDecodeError, dumps, loads
+from time import sleep
+
+from st2.exceptions import CassetteError
+
+
+class Cassette:
+    """
+    Records the API traffic of a Request to a file, or replays it.
+
+    Each exchange (method, endpoint, params, data, status code, rate limit headers,
+    response, send time and round trip time) is appended as one compact JSON line.
+    Tokens are not recorded.
+
+    When replaying, requests are matched by method, endpoint, params and data,
+    and answered with the recorded responses in their recorded order
+    (the last one is repeated once they are used up).
+    Requests that were never recorded raise a CassetteError.
+
+    :param mode: "record" or "replay".
+    :param pace: when replaying, take the recorded round trip time for each answer.
+    Otherwise, requests are answered at once.
+    """
+
+    headers = [
+        "x-ratelimit-type",
+        "x-ratelimit-limit-per-second",
+        "x-ratelimit-limit-burst",
+        "x-ratelimit-limit-burst-time",
+        "x-ratelimit-remaining",
+        "x-ratelimit-reset",
+    ]
+
+    def __init__(self, path, mode="record", pace=False):
+        if mode not in ["record", "replay"]:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.pace = pace
+        self.recorded = 0
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._file = None
+        self._tape = defaultdict(deque)  # key: exchanges
+        if mode == "replay":
+            self._load()
+
+    @staticmethod
+    def _key(method, endpoint, params, data):
+        params = dumps(params, sort_keys=True) if params else None
+        return method, endpoint, params, data or None
+
+    def _load(self):
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    x = loads(line)
+                except JSONDecodeError:
+                    continue  # interrupted while recording
+                key = self._key(x["m"], x["e"], x["p"], x["d"])
+                self._tape[key].append(x)
+
+    def record(self, method, endpoint, params, data, response, sent, rtt):
+        """append an exchange (response: requests.Response)"""
+        try:
+            resp_json = response.json()
+        except ValueError:
+            resp_json = None
+        x = {
+            "t": round(sent, 3),
+            "r": round(rtt, 4),
+            "m": method,
+            "e": endpoint,
+            "p": params,
+            "d": data,
+            "s": response.status_code,
+            "h": {
+                k: response.headers[k] for k in self.headers if k in response.headers
+            },
+            "j": resp_json,
+        }
+        line = dumps(x, separators=(",", ":")) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a")
+            self._file.write(line)
+            self._file.flush()
+            self.recorded += 1
+
+    def play(self, method, endpoint, params, data):
+        """return the recorded response to a request"""
+        key = self._key(method, endpoint, params, data)
+        with self._lock:
+            exchanges = self._tape.get(key)
+            if not exchanges:
+                raise CassetteError(
+                    f"No recorded answer to '{method} {endpoint}' "
+                    f"(params: {params}, data: {data}) in {self.path}"
+                )
+            x = exchanges.popleft() if len(exchanges) > 1 else exchanges[0]
+            self.replayed += 1
+        if self.pace:
+            sleep(x["r"])
+        return _Response(x["s"], x["h"], x["j"])
+
+    def __getstate__(self):
+        # (to start the messenger with a cassette)
+        state = self.__dict__.copy()
+        del state["_lock"], state["_file"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self._file = None
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def stats(self):
+        return {"mode": self.mode, "recorded": self.recorded, "replayed": self.replayed}
+
+
+class _Response:
+    """a recorded response, with the parts of requests.Response used by Request"""
+
+    def __init__(self, status_code, headers, resp_json):
+        self.status_code = status_code
+        self.headers = headers
+        self._json = resp_json
+
+    @property
+    def content(self):
+        return b"" if self._json is None else dumps(self._json).encode()
+
+    def json(self):
+        # (a copy: the same exchange can be replayed again, and callers change responses)
+        return {} if self._json is None else deepcopy(self._json)
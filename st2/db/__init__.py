@@ -3,14 +3,236 @@ Postgresql: https://gist.github.com/gwangjinkim/f13bf596fefa7db7d31c22efd1627c7a
 Psycopg3 docs: https://www.psycopg.org/psycopg3/docs/basic/index.html
 """
 
+import asyncio
 import atexit
+import datetime
 import os
 import subprocess as sp
+import threading
+import weakref
+from contextlib import asynccontextmanager, contextmanager
+from time import sleep
 
-from psycopg import connect
+from psycopg.rows import tuple_row
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
 
 from st2.caching import cache
 from st2.db.static.traits import TRAITS_FACTION
+from st2.logging import logger
+
+# the database, and the size of the connection pool of each process
+conninfo = os.environ.get("ST2_DB", "dbname=st2 user=postgres")
+pool_min_size = int(os.environ.get("ST2_DB_POOL_MIN", 1))
+pool_max_size = int(os.environ.get("ST2_DB_POOL_MAX", 4))
+# seconds to wait for a connection before raising a PoolTimeout
+pool_timeout = float(os.environ.get("ST2_DB_POOL_TIMEOUT", 30))
+# days of history to keep (0: keep everything), and what to do with older partitions:
+#  "archive" (detach them to the archive schema) or "drop"
+retention_days = int(os.environ.get("ST2_DB_RETENTION_DAYS", 0))
+retention_action = os.environ.get("ST2_DB_RETENTION_ACTION", "archive")
+
+_pool = None  # (pid, ConnectionPool)
+_pool_lock = threading.Lock()
+_async_pools = weakref.WeakKeyDictionary()  # event loop: (pid, AsyncConnectionPool)
+
+
+def db_pool():
+    """
+    The connection pool of this process (opened on first use, and again after a fork).
+    """
+    global _pool
+    pid = os.getpid()
+    with _pool_lock:
+        if _pool is None or _pool[0] != pid:
+            pool = ConnectionPool(
+                conninfo,
+                min_size=pool_min_size,
+                max_size=pool_max_size,
+                timeout=pool_timeout,
+                name=f"st2-{pid}",
+                open=True,
+            )
+            _pool = (pid, pool)
+            atexit.register(_close_pool, pid, pool)
+        return _pool[1]
+
+
+async def db_pool_async():
+    """
+    The async connection pool of this process for the running event loop
+    (async connections can only be used in the event loop that opened them).
+    """
+    pid = os.getpid()
+    loop = asyncio.get_running_loop()
+    if _async_pools.get(loop, (None,))[0] != pid:
+        pool = AsyncConnectionPool(
+            conninfo,
+            min_size=pool_min_size,
+            max_size=pool_max_size,
+            timeout=pool_timeout,
+            name=f"st2-{pid}-async",
+            open=False,
+        )
+        _async_pools[loop] = (pid, pool)
+        await pool.open()
+    return _async_pools[loop][1]
+
+
+def _close_pool(pid, pool):
+    # forked processes do not close the connections of their parent
+    if os.getpid() == pid:
+        pool.close()
+
+
+@contextmanager
+def db_conn(row_factory=None, autocommit=False):
+    """
+    A connection from the pool of this process, used like psycopg.connect():
+    the transaction is committed at the end of the block (rolled back on an exception),
+    then the connection is returned to the pool.
+    """
+    with db_pool().connection() as conn:
+        conn.row_factory = row_factory or tuple_row
+        conn.autocommit = autocommit
+        try:
+            yield conn
+        finally:
+            if autocommit:
+                # (only possible without a transaction in progress)
+                conn.autocommit = False
+
+
+@asynccontextmanager
+async def db_conn_async(row_factory=None):
+    """A connection from the async pool of this process (see db_conn)."""
+    async with (await db_pool_async()).connection() as conn:
+        conn.row_factory = row_factory or tuple_row
+        yield conn
+
+
+def db_execute(statements):
+    """
+    Execute the statements, (query, list of parameters) pairs, in one transaction.
+    The query is SQL (the parameters are sent with executemany, pipelined)
+    or an Insert (the rows are sent in bulk).
+    """
+    with db_conn() as conn, conn.cursor() as cur:
+        for query, params in statements:
+            if not params:
+                continue
+            if isinstance(query, Insert):
+                query.execute(cur, params)
+            else:
+                cur.executemany(query, params)
+
+
+async def db_execute_async(statements):
+    """Execute the statements in one transaction (see db_execute)."""
+    async with db_conn_async() as conn, conn.cursor() as cur:
+        for query, params in statements:
+            if not params:
+                continue
+            if isinstance(query, Insert):
+                await query.execute_async(cur, params)
+            else:
+                await cur.executemany(query, params)
+
+
+class Insert:
+    """
+    Insert many rows into a table in one round trip:
+    up to `copy_rows` rows with one multi-row INSERT statement,
+    more rows with COPY. With an `on_conflict` clause (e.g. 'ON CONFLICT ("symbol") DO NOTHING'),
+    the rows are copied into a temporary staging table first,
+    and inserted from there with the clause.
+
+    Example:
+        SYSTEMS = Insert("systems", ["symbol", "type", "x", "y"], "ON CONFLICT (symbol) DO NOTHING")
+        db_execute([(SYSTEMS, rows)])  # or SYSTEMS.execute(cur, rows)
+    """
+
+    copy_rows = 500
+
+    def __init__(self, table, columns, on_conflict=""):
+        self.table = table
+        self.columns = ", ".join(f'"{column}"' for column in columns)
+        self.on_conflict = on_conflict
+        self.row = f"({', '.join(['%s'] * len(columns))})"
+        # Postgres accepts up to 65535 parameters per statement
+        self.copy_rows = min(self.copy_rows, 65535 // len(columns))
+        target = f"staging_{table}" if on_conflict else table
+        self.copy_query = f"COPY {target} ({self.columns}) FROM STDIN"
+        self.staging = [
+            f"""
+            CREATE TEMPORARY TABLE IF NOT EXISTS staging_{table}
+            (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DELETE ROWS
+            """,
+            f"TRUNCATE staging_{table}",
+        ]
+        self.insert_staged = f"""
+            INSERT INTO {table} ({self.columns})
+            SELECT {self.columns} FROM staging_{table}
+            {on_conflict}
+            """
+
+    def _values(self, rows):
+        query = f"""
+            INSERT INTO {self.table} ({self.columns})
+            VALUES {", ".join([self.row] * len(rows))}
+            {self.on_conflict}
+            """
+        return query, [value for row in rows for value in row]
+
+    def execute(self, cur, rows):
+        if not rows:
+            return
+        if len(rows) <= self.copy_rows:
+            cur.execute(*self._values(rows))
+            return
+        if self.on_conflict:
+            for query in self.staging:
+                cur.execute(query)
+        with cur.copy(self.copy_query) as copy:
+            for row in rows:
+                copy.write_row(row)
+        if self.on_conflict:
+            cur.execute(self.insert_staged)
+
+    async def execute_async(self, cur, rows):
+        if not rows:
+            return
+        if len(rows) <= self.copy_rows:
+            await cur.execute(*self._values(rows))
+            return
+        if self.on_conflict:
+            for query in self.staging:
+                await cur.execute(query)
+        async with cur.copy(self.copy_query) as copy:
+            for row in rows:
+                await copy.write_row(row)
+        if self.on_conflict:
+            await cur.execute(self.insert_staged)
+
+
+def db_pool_stats():
+    """
+    Usage of the connection pools of this process (see ConnectionPool.get_stats()),
+    with the mean time a request for a connection waited (wait_ms).
+    """
+    pools = {}
+    if _pool is not None and _pool[0] == os.getpid():
+        pools["sync"] = _pool[1]
+    for pid, pool in list(_async_pools.values()):
+        if pid == os.getpid():
+            pools["async"] = pool
+    ret = {}
+    for name, pool in pools.items():
+        stats = pool.get_stats()
+        requests = stats.get("requests_num", 0)
+        wait_ms = stats.get("requests_wait_ms", 0)
+        stats["wait_ms"] = round(wait_ms / requests, 3) if requests else 0.0
+        ret[name] = stats
+    return ret
 
 
 def db_server_path():
@@ -59,7 +281,7 @@ def db_server_init():
 
 
 def db_tables_init():
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
 
         # Fetch existing table names
         cur.execute(
@@ -71,6 +293,18 @@ def db_tables_init():
         )
         tables = [row[0] for row in cur.fetchall()]
 
+        # partition the history tables of databases created before partitioning
+        cur.execute(
+            """
+            SELECT c.relname
+            FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid
+            """
+        )
+        partitioned = [row[0] for row in cur.fetchall()]
+        for table in HISTORY:
+            if table in tables and table not in partitioned:
+                _partition_table(cur, table)
+
         # # delete all tables
         # for table in tables:
         #     cur.execute(f"DROP TABLE {table}")
@@ -278,8 +512,6 @@ def db_tables_init():
             )
 
         if "market_transactions" not in tables:
-            # - Create a waypoint specific transactions table:
-            #   CREATE TABLE transactions_wp1 PARTITION OF transactions FOR VALUES IN ('wp1');
             cur.execute(
                 """
                 CREATE TABLE market_transactions
@@ -294,15 +526,12 @@ def db_tables_init():
                     "totalPrice" integer,
                     "timestamp" timestamptz,
                     PRIMARY KEY ("waypointSymbol", "timestamp")
-                )
+                ) PARTITION BY RANGE ("timestamp")
                 """
             )
-            #  PARTITION BY LIST ("waypointSymbol")
 
         if "market_tradegoods" not in tables:
-            # - Create a waypoint specific tradegoods table:
-            #   CREATE TABLE tradegoods_wp1 PARTITION OF tradegoods FOR VALUES IN ('wp1');
-            # - Use st2.time.now() as timestamp
+            # use st2.time.now() as timestamp
             cur.execute(
                 """
                 CREATE TABLE market_tradegoods
@@ -318,10 +547,9 @@ def db_tables_init():
                     "sellPrice" integer,
                     "timestamp" timestamptz,
                     PRIMARY KEY ("waypointSymbol", "symbol", "timestamp")
-                )
+                ) PARTITION BY RANGE ("timestamp")
                 """
             )
-            #  PARTITION BY LIST ("waypointSymbol")
 
         if "shipyards" not in tables:
             cur.execute(
@@ -337,9 +565,7 @@ def db_tables_init():
             )
 
         if "shipyard_transactions" not in tables:
-            # - Create a waypoint specific transactions table:
-            #   CREATE TABLE transactions_wp1 PARTITION OF transactions FOR VALUES IN ('wp1');
-            # - Use st2.time.read(timestamp) as timestamp
+            # use st2.time.read(timestamp) as timestamp
             cur.execute(
                 """
                 CREATE TABLE shipyard_transactions
@@ -352,15 +578,12 @@ def db_tables_init():
                     "price" integer,
                     "timestamp" timestamptz,
                     PRIMARY KEY ("waypointSymbol", "timestamp")
-                )
+                ) PARTITION BY RANGE ("timestamp")
                 """
             )
-            #  PARTITION BY LIST ("waypointSymbol")
 
         if "shipyard_ships" not in tables:
-            # - Create a waypoint specific tradegoods table:
-            #   CREATE TABLE tradegoods_wp1 PARTITION OF tradegoods FOR VALUES IN ('wp1');
-            # - Use st2.time.now() as timestamp
+            # use st2.time.now() as timestamp
             cur.execute(
                 """
                 CREATE TABLE shipyard_ships
@@ -373,10 +596,46 @@ def db_tables_init():
                     "purchasePrice" integer,
                     "timestamp" timestamptz,
                     PRIMARY KEY ("waypointSymbol", "type", "timestamp")
-                )
+                ) PARTITION BY RANGE ("timestamp")
+                """
+            )
+
+        # the latest snapshot of each trade good and ship type
+        #  (upserted with the history, see ship._market and ship._shipyard)
+        if "market_latest" not in tables:
+            cur.execute(
+                """
+                CREATE TABLE market_latest
+                (LIKE market_tradegoods INCLUDING DEFAULTS,
+                 PRIMARY KEY ("waypointSymbol", "symbol"))
+                """
+            )
+            # backfill from the history
+            cur.execute(
+                """
+                INSERT INTO market_latest
+                SELECT DISTINCT ON ("waypointSymbol", "symbol") *
+                FROM market_tradegoods
+                ORDER BY "waypointSymbol", "symbol", "timestamp" DESC
+                """
+            )
+
+        if "shipyard_latest" not in tables:
+            cur.execute(
+                """
+                CREATE TABLE shipyard_latest
+                (LIKE shipyard_ships INCLUDING DEFAULTS,
+                 PRIMARY KEY ("waypointSymbol", "type"))
+                """
+            )
+            cur.execute(
+                """
+                INSERT INTO shipyard_latest
+                SELECT DISTINCT ON ("waypointSymbol", "type") *
+                FROM shipyard_ships
+                ORDER BY "waypointSymbol", "type", "timestamp" DESC
                 """
             )
-            # PARTITION BY LIST ("waypointSymbol")
 
         if "events" not in tables:
             cur.execute(
@@ -389,7 +648,7 @@ def db_tables_init():
                     "component" text,
                     "condition" float8,
                     "timestamp" timestamptz
-                )
+                ) PARTITION BY RANGE ("timestamp")
                 """
             )
 
@@ -411,8 +670,9 @@ def db_tables_init():
                     "reactor_integrity" float8,
                     "engine" text,
                     "engine_condition" float8,
-                    "engine_integrity" float8
-                )
+                    "engine_integrity" float8,
+                    "timestamp" timestamptz DEFAULT now()
+                ) PARTITION BY RANGE ("timestamp")
                 """
             )
 
@@ -434,11 +694,288 @@ def db_tables_init():
                     "reactor_integrity" float8,
                     "engine" text,
                     "engine_condition" float8,
-                    "engine_integrity" float8
+                    "engine_integrity" float8,
+                    "timestamp" timestamptz DEFAULT now()
+                ) PARTITION BY RANGE ("timestamp")
+                """
+            )
+
+        if "api_calls" not in tables:
+            cur.execute(
+                """
+                CREATE TABLE api_calls
+                (
+                    "minute" timestamptz,
+                    "tag" text,
+                    "calls" integer,
+                    "coalesced" integer,
+                    "errors" integer,
+                    PRIMARY KEY ("minute", "tag")
                 )
                 """
             )
 
+    db_partitions_maintain()
+    db_indexes_init()
+
+
+# indexes for the frequent queries (besides the primary keys):
+#   name: (table, columns)
+INDEXES = {
+    # System.shipyards_with(): the latest ship type per shipyard of a system
+    "shipyard_latest_system_idx": ("shipyard_latest", '"systemSymbol", "type"'),
+    # TaskMaster.run(): the tasks of the process, polled 10 times a second
+    "tasks_pname_idx": ("tasks", '"pname"'),
+    # System: the waypoints, markets, shipyards and jump gate of a system
+    "waypoints_system_idx": ("waypoints", '"systemSymbol"'),
+    "markets_system_idx": ("markets", '"systemSymbol"'),
+    "shipyards_system_idx": ("shipyards", '"systemSymbol"'),
+    "jump_gates_system_idx": ("jump_gates", '"systemSymbol"'),
+}
+# indexes that are no longer used (dropped by db_indexes_init)
+#  the latest prices are in market_latest and shipyard_latest
+OBSOLETE_INDEXES = ["market_tradegoods_symbol_idx", "shipyard_ships_type_idx"]
+
+
+def db_indexes_init():
+    """
+    Create the missing INDEXES (and drop the OBSOLETE_INDEXES), also on existing databases.
+    Indexes are built CONCURRENTLY (without blocking writes to large tables),
+    and rebuilt if a previous build was interrupted (invalid index).
+    """
+    with db_conn(autocommit=True) as conn, conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT c.relname
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+            """,
+            (list(INDEXES),),
+        )
+        for (name,) in cur.fetchall():
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        for name in OBSOLETE_INDEXES:
+            cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        for name, (table, columns) in INDEXES.items():
+            cur.execute(
+                f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})"
+            )
+
+
+# the history tables, partitioned by day on "timestamp" (UTC):
+#   {table}_p{YYYYMMDD}: the rows of that day
+#   {table}_legacy_{YYYYMMDD}: the older rows of a table created before partitioning
+#   {table}_default: the rows without a partition (e.g. a NULL timestamp)
+#  old partitions are detached or dropped whole (retention_days): no DELETE or VACUUM
+#   table: primary key (it includes the partition key)
+HISTORY = {
+    "market_transactions": '"waypointSymbol", "timestamp"',
+    "market_tradegoods": '"waypointSymbol", "symbol", "timestamp"',
+    "shipyard_transactions": '"waypointSymbol", "timestamp"',
+    "shipyard_ships": '"waypointSymbol", "type", "timestamp"',
+    "events": None,
+    "navigation": None,
+    "extraction": None,
+}
+# partitions created in advance (days after today)
+partitions_ahead = 2
+# seconds between two runs of db_partitions_maintain in db_maintenance
+maintenance_interval = 3600
+_maintenance = None  # (pid, Thread)
+
+
+def _today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+def _midnight(day):
+    return datetime.datetime.combine(day, datetime.time(), datetime.timezone.utc)
+
+
+def _partition_bounds(table, name):
+    """The (first day, day after the last) of a partition (None: unbounded)."""
+    suffix = name[len(table) + 1 :]
+    if suffix.startswith("p"):
+        day = datetime.datetime.strptime(suffix[1:], "%Y%m%d").date()
+        return day, day + datetime.timedelta(days=1)
+    if suffix.startswith("legacy_"):
+        return None, datetime.datetime.strptime(suffix[7:], "%Y%m%d").date()
+    return None, None
+
+
+def _partition_plan(table, names, today):
+    """
+    The days to create a partition for (today and the partitions_ahead days after it),
+    and the partitions past the retention (retention_days, 0: none), of a history table
+    with the partitions `names`.
+    """
+    bounds = {name: _partition_bounds(table, name) for name in names}
+    days = {start for start, end in bounds.values() if start is not None}
+    legacy = [end for start, end in bounds.values() if start is None and end]
+    covered = max(legacy, default=None)
+    create = []
+    for n in range(partitions_ahead + 1):
+        day = today + datetime.timedelta(days=n)
+        if day not in days and (covered is None or day >= covered):
+            create.append(day)
+    retire = []
+    if retention_days > 0:
+        cutoff = today - datetime.timedelta(days=retention_days)
+        retire = sorted(n for n, (_, end) in bounds.items() if end and end <= cutoff)
+    return create, retire
+
+
+def _partition_table(cur, table):
+    """
+    Turn an existing (unpartitioned) history table into a partitioned table:
+    its rows become the legacy partition (up to and including today),
+    the rows without a timestamp (or a later one) go to the default partition.
+    """
+    tomorrow = _today() + datetime.timedelta(days=1)
+    legacy = f"{table}_legacy_{tomorrow:%Y%m%d}"
+    logger.info(f"partitioning {table} (existing rows: {legacy})")
+    if table in ("navigation", "extraction"):
+        cur.execute(
+            f"""
+            ALTER TABLE {table}
+            ADD COLUMN IF NOT EXISTS "timestamp" timestamptz DEFAULT now()
+            """
+        )
+    cur.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    primary_key = ""
+    if HISTORY[table]:
+        cur.execute(
+            f"ALTER TABLE {legacy} RENAME CONSTRAINT {table}_pkey TO {legacy}_pkey"
+        )
+        primary_key = f", PRIMARY KEY ({HISTORY[table]})"
+    cur.execute(
+        f"""
+        CREATE TABLE {table}
+        (LIKE {legacy} INCLUDING DEFAULTS{primary_key})
+        PARTITION BY RANGE ("timestamp")
+        """
+    )
+    cur.execute(f"CREATE TABLE {table}_default PARTITION OF {table} DEFAULT")
+    cur.execute(
+        f"""
+        WITH moved AS (
+            DELETE FROM {legacy}
+            WHERE "timestamp" IS NULL OR "timestamp" >= %s
+            RETURNING *
+        )
+        INSERT INTO {table}_default SELECT * FROM moved
+        """,
+        (_midnight(tomorrow),),
+    )
+    cur.execute(
+        f"""
+        ALTER TABLE {table} ATTACH PARTITION {legacy}
+        FOR VALUES FROM (MINVALUE) TO ('{_midnight(tomorrow).isoformat()}')
+        """
+    )
+
+
+def db_partitions_maintain(today=None):
+    """
+    Create the partitions of the history tables for today and the next days,
+    and archive or drop the partitions past the retention (see retention_days).
+    Run by db_tables_init and then every maintenance_interval seconds by db_maintenance.
+    """
+    today = today or _today()
+    for table in HISTORY:
+        with db_conn() as conn, conn.cursor() as cur:
+            default = f"{table}_default"
+            cur.execute(
+                f"CREATE TABLE IF NOT EXISTS {default} PARTITION OF {table} DEFAULT"
+            )
+            cur.execute(
+                """
+                SELECT c.relname
+                FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+                """,
+                (table,),
+            )
+            names = [row[0] for row in cur.fetchall()]
+            create, retire = _partition_plan(table, names, today)
+            for day in create:
+                name = f"{table}_p{day:%Y%m%d}"
+                start = _midnight(day)
+                end = start + datetime.timedelta(days=1)
+                cur.execute(f"CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS)")
+                # rows of that day written before the partition existed
+                cur.execute(
+                    f"""
+                    WITH moved AS (
+                        DELETE FROM {default}
+                        WHERE "timestamp" >= %s AND "timestamp" < %s
+                        RETURNING *
+                    )
+                    INSERT INTO {name} SELECT * FROM moved
+                    """,
+                    (start, end),
+                )
+                cur.execute(
+                    f"""
+                    ALTER TABLE {table} ATTACH PARTITION {name}
+                    FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')
+                    """
+                )
+            for name in retire:
+                logger.info(f"{retention_action} partition {name}")
+                if retention_action == "drop":
+                    cur.execute(f"DROP TABLE {name}")
+                else:
+                    cur.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                    cur.execute("CREATE SCHEMA IF NOT EXISTS archive")
+                    cur.execute(f"ALTER TABLE {name} SET SCHEMA archive")
+
+
+def db_maintenance():
+    """Run db_partitions_maintain every maintenance_interval seconds."""
+    while True:
+        sleep(maintenance_interval)
+        try:
+            db_partitions_maintain()
+        except Exception as e:
+            logger.exception(f"partition maintenance failed: {e}")
+
+
+def db_maintenance_start():
+    """Start db_maintenance in a daemon thread (once per process)."""
+    global _maintenance
+    pid = os.getpid()
+    if _maintenance is None or _maintenance[0] != pid:
+        thread = threading.Thread(
+            target=db_maintenance, name="st2-db-maintenance", daemon=True
+        )
+        thread.start()
+        _maintenance = (pid, thread)
+
+
+def db_write_api_calls(rows):
+    """
+    Add the API calls per tag and minute (see Ledger.take()) to the api_calls table.
+    Example (the most expensive tags of the last hour):
+        SELECT "tag", sum("calls") / 60.0 AS "calls/minute"
+        FROM api_calls
+        WHERE "minute" > now() - interval '1 hour'
+        GROUP BY "tag" ORDER BY 2 DESC
+    """
+    with db_conn() as conn, conn.cursor() as cur:
+        cur.executemany(
+            """
+            INSERT INTO api_calls
+            ("minute", "tag", "calls", "coalesced", "errors")
+            VALUES (to_timestamp(%s), %s, %s, %s, %s)
+            ON CONFLICT ("minute", "tag") DO UPDATE
+            SET "calls" = api_calls."calls" + excluded."calls",
+                "coalesced" = api_calls."coalesced" + excluded."coalesced",
+                "errors" = api_calls."errors" + excluded."errors"
+            """,
+            rows,
+        )
+
 
 def db_update_factions(request, priority=0, token=None):
     factions = {}
@@ -446,7 +983,7 @@ def db_update_factions(request, priority=0, token=None):
         for f in fs["data"]:
             factions[f["symbol"]] = f
 
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             # insert factions & faction_traits
             for symbol in sorted(factions):
@@ -490,7 +1027,7 @@ def db_update_factions(request, priority=0, token=None):
 
 
 def print_tables():
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """
             SELECT table_name
@@ -502,7 +1039,7 @@ def print_tables():
 
 
 def print_table(table):
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         # print a table's columns
         cur.execute(
             """
@@ -532,13 +1069,13 @@ def print_table(table):
 
 
 def delete_table(table):
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         cur.execute(f"DROP TABLE {table}")
         conn.commit()
 
 
 def delete_tables():
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """
             SELECT table_name
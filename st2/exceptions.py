@@ -7,6 +7,18 @@ class ServerResetError(Exception):
     pass
 
 
+class DeadlineExceededError(Exception):
+    pass
+
+
+class ServerDownError(Exception):
+    pass
+
+
+class CassetteError(Exception):
+    pass
+
+
 class ExtractDestabilizedError(Exception):
     def __init__(self, *args):
         super().__init__(*args)
@@ -0,0 +1,271 @@
+import random
+import threading
+from time import monotonic, time
+
+from st2.exceptions import ServerDownError
+from st2.time import epoch
+
+
+class RateLimiter:
+    """
+    Paces API requests to the rate limits of the SpaceTraders server.
+
+    The server allows a steady rate (`per_second`), plus a burst pool
+    (`burst` requests, refilled `burst_time` seconds after it was first used).
+    Both limits are read from the response headers.
+
+    Requests use the steady rate when possible, and the burst pool otherwise.
+    Burst requests left over when the pool is refilled are counted as wasted.
+    Until the first response, the burst pool is assumed to be empty.
+
+    :param reserve: burst requests to leave unused, as a margin for requests in flight.
+    """
+
+    headers = {
+        "per_second": "x-ratelimit-limit-per-second",
+        "burst": "x-ratelimit-limit-burst",
+        "burst_time": "x-ratelimit-limit-burst-time",
+        "remaining": "x-ratelimit-remaining",
+        "reset": "x-ratelimit-reset",
+    }
+
+    def __init__(self, per_second=2, burst=30, burst_time=60, reserve=1):
+        self.per_second = per_second
+        self.burst = burst
+        self.burst_time = burst_time
+        self.reserve = reserve
+        self.steady = 0  # requests sent at the steady rate
+        self.burst_used = 0  # requests sent from the burst pool
+        self.burst_wasted = 0  # burst requests that expired unused
+        self.limited = 0  # rate limit errors received
+
+        self._cond = threading.Condition()
+        self._tokens = per_second  # steady rate bucket
+        self._updated = monotonic()
+        self._remaining = 0  # burst pool
+        self._reset = None  # monotonic time at which the burst pool refills
+        self._blocked = 0  # monotonic time until which all requests wait
+
+    def acquire(self):
+        """Block until a request may be sent. Returns the token ("steady" or "burst")"""
+        with self._cond:
+            self._wait()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.steady += 1
+                return "steady"
+            self._remaining -= 1
+            self.burst_used += 1
+            if self._reset is None:
+                self._reset = monotonic() + self.burst_time
+            return "burst"
+
+    def release(self, token):
+        """Give back a token of acquire() that was not used to send a request"""
+        with self._cond:
+            if token == "steady":
+                self._tokens = min(self.per_second, self._tokens + 1)
+                self.steady -= 1
+            else:
+                self._remaining += 1
+                self.burst_used -= 1
+            self._cond.notify_all()
+
+    def _wait(self):
+        while True:
+            now = monotonic()
+            self._refill(now)
+            if now < self._blocked:
+                wait = self._blocked - now
+            elif self._tokens >= 1 or self._remaining > self.reserve:
+                return
+            else:
+                wait = (1 - self._tokens) / self.per_second
+                if self._reset is not None:
+                    wait = min(wait, self._reset - now)
+            self._cond.wait(max(wait, 0.001))
+
+    def _refill(self, now):
+        self._tokens = min(
+            self.per_second, self._tokens + (now - self._updated) * self.per_second
+        )
+        self._updated = now
+        if self._reset is not None and now >= self._reset:
+            self.burst_wasted += self._remaining
+            self._remaining = self.burst
+            self._reset = None
+
+    def update(self, headers):
+        """Synchronize the limits and the burst pool with the response headers"""
+        try:
+            per_second = float(headers[self.headers["per_second"]])
+            burst = int(headers[self.headers["burst"]])
+            burst_time = float(headers[self.headers["burst_time"]])
+            remaining = int(headers[self.headers["remaining"]])
+            reset = epoch(headers[self.headers["reset"]])
+        except (KeyError, TypeError, ValueError):
+            return  # not (all) rate limit headers present
+        with self._cond:
+            self.per_second = per_second
+            self.burst = burst
+            self.burst_time = burst_time
+            self._sync(remaining, reset)
+            self._cond.notify_all()
+
+    def penalize(self, retry_after, remaining=None, reset=None):
+        """Pause all requests after a rate limit error"""
+        with self._cond:
+            self.limited += 1
+            self._tokens = 0
+            self._blocked = max(self._blocked, monotonic() + retry_after)
+            if remaining is not None and reset is not None:
+                self._sync(remaining, epoch(reset))
+
+    def _sync(self, remaining, reset):
+        # (answers may arrive after requests that were sent later)
+        now = monotonic()
+        reset = now + (reset - time())
+        if reset <= now:
+            return  # outdated
+        if self._reset is None or reset > self._reset + 1:
+            # a new burst window
+            self._remaining = remaining
+            self._reset = reset
+        else:
+            self._remaining = min(self._remaining, remaining)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "per_second": self.per_second,
+                "burst": self.burst,
+                "steady": self.steady,
+                "burst_used": self.burst_used,
+                "burst_wasted": self.burst_wasted,
+                "limited": self.limited,
+            }
+
+
+class Unlimited(RateLimiter):
+    """A RateLimiter that never waits (e.g. to replay recorded traffic at full speed)"""
+
+    def _wait(self):
+        return
+
+
+class CircuitBreaker:
+    """
+    Holds API requests while the SpaceTraders server is down (5xx errors).
+
+    The breaker opens after `threshold` consecutive server errors.
+    While it is open, requests wait (or fail fast with a ServerDownError).
+    After the backoff, a single request is let through as a health probe:
+    if the server answers, the breaker closes and all waiting requests continue,
+    otherwise it opens again with twice the backoff (up to `max_backoff`).
+    Each backoff is randomized by +/- `jitter` (fraction).
+
+    :param backoff_502: the first backoff after a 502 error (DDoS protection).
+    """
+
+    def __init__(
+        self, threshold=1, backoff=3, backoff_502=210, max_backoff=600, jitter=0.2
+    ):
+        self.threshold = threshold
+        self.backoff = backoff
+        self.backoff_502 = backoff_502
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.opened = 0  # times the breaker opened
+        self.probes = 0  # requests sent while the breaker was open
+        self.fast_failed = 0  # requests refused while the breaker was open
+
+        self._cond = threading.Condition()
+        self._failures = 0  # consecutive server errors
+        self._open = False
+        self._backoff = 0
+        self._retry = 0  # monotonic time of the next probe
+        self._probing = False
+
+    @property
+    def is_open(self):
+        return self._open
+
+    def acquire(self, fail_fast=False):
+        """
+        Block until a request may be sent: the breaker is closed, or this request is the probe.
+        Returns True for the probe, which must be followed by success(), failure() or cancel().
+        :param fail_fast: raise a ServerDownError instead of waiting.
+        """
+        with self._cond:
+            while self._open:
+                if not self._probing and monotonic() >= self._retry:
+                    self._probing = True
+                    self.probes += 1
+                    return True
+                if fail_fast:
+                    self.fast_failed += 1
+                    raise ServerDownError(
+                        f"Server down, retrying in {self._retry - monotonic():.0f} sec"
+                    )
+                self._cond.wait(None if self._probing else self._retry - monotonic())
+            return False
+
+    def wait(self, timeout=None):
+        """
+        Block until a request may be sent (without being the probe).
+        Returns False after timeout seconds.
+        """
+        end = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while self._open and (self._probing or monotonic() < self._retry):
+                wait = None if self._probing else self._retry - monotonic()
+                if end is not None:
+                    if monotonic() >= end:
+                        return False
+                    wait = min(wait or timeout, end - monotonic())
+                self._cond.wait(wait)
+            return True
+
+    def success(self):
+        """The server answered (with anything but a server error)"""
+        with self._cond:
+            self._failures = 0
+            if self._open:
+                self._open = False
+                self._probing = False
+                self._backoff = 0
+                self._cond.notify_all()
+
+    def failure(self, status_code, probe=False):
+        """The server answered with a server error"""
+        with self._cond:
+            self._failures += 1
+            if probe or (not self._open and self._failures >= self.threshold):
+                if not self._open:
+                    self.opened += 1
+                    first = self.backoff_502 if status_code == 502 else self.backoff
+                    self._backoff = first
+                else:
+                    self._backoff = min(2 * self._backoff, self.max_backoff)
+                self._open = True
+                self._probing = False
+                jitter = random.uniform(-self.jitter, self.jitter)
+                self._retry = monotonic() + self._backoff * (1 + jitter)
+                self._cond.notify_all()
+
+    def cancel(self, probe):
+        """The request got no answer (another request may probe instead)"""
+        if probe:
+            with self._cond:
+                self._probing = False
+                self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                "open": self._open,
+                "backoff": self._backoff,
+                "opened": self.opened,
+                "probes": self.probes,
+                "fast_failed": self.fast_failed,
+            }
@@ -0,0 +1,205 @@
+import re
+import threading
+from bisect import bisect_left
+
+# path segments that follow these segments are symbols (or ids)
+_SYMBOLS = {
+    "agents": "{agentSymbol}",
+    "contracts": "{contractId}",
+    "factions": "{factionSymbol}",
+    "ships": "{shipSymbol}",
+    "systems": "{systemSymbol}",
+    "waypoints": "{waypointSymbol}",
+}
+_SEGMENT = re.compile(r"[^/]+")
+
+
+def endpoint_template(endpoint):
+    """
+    The endpoint with its symbols replaced by placeholders,
+    e.g. 'systems/X1-A1/waypoints/X1-A1-B2/market'
+    -> 'systems/{systemSymbol}/waypoints/{waypointSymbol}/market'
+    """
+    segments = _SEGMENT.findall(endpoint)
+    for n in range(1, len(segments)):
+        placeholder = _SYMBOLS.get(segments[n - 1])
+        if placeholder is not None:
+            segments[n] = placeholder
+    return "/".join(segments)
+
+
+class Histogram:
+    """
+    Counts durations (in seconds) in exponential buckets, from 1 ms up to ~4.5 min.
+    Percentiles are estimated as the upper bound of their bucket.
+    """
+
+    bounds = [0.001 * 2**n for n in range(19)]
+
+    def __init__(self):
+        self.counts = [0] * (len(self.bounds) + 1)  # the last bucket is unbounded
+        self.total = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, p):
+        if not self.total:
+            return None
+        rank = p / 100 * self.total
+        seen = 0
+        for n, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[n] if n < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.total,
+            "mean": self.sum / self.total if self.total else None,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.max,
+            "buckets": list(self.counts),
+        }
+
+
+class RequestMetrics:
+    """
+    Aggregates the timings of API requests, per endpoint template and per priority:
+
+        - wait: from queueing to sending (includes waiting for the rate limit)
+        - rtt: from sending to the answer (includes retries after 429/5xx errors)
+
+    Also counts the requests, errors (by exception name) and retries (by status code).
+    Requests can be recorded from multiple threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}  # "METHOD template": {...}
+        self.priorities = {}  # priority: {...}
+
+    @staticmethod
+    def _new():
+        return {
+            "wait": Histogram(),
+            "rtt": Histogram(),
+            "errors": {},
+            "retries": {},
+        }
+
+    def record(
+        self, priority, method, endpoint, queued, sent, done, error=None, retries=None
+    ):
+        """
+        :param queued, sent, done: epoch seconds (queued may be None if unknown)
+        :param error: name of the exception raised by the request
+        :param retries: {status code: retries}
+        """
+        key = f"{method.upper()} {endpoint_template(endpoint)}"
+        with self._lock:
+            for group in (
+                self.endpoints.setdefault(key, self._new()),
+                self.priorities.setdefault(priority, self._new()),
+            ):
+                if queued is not None:
+                    group["wait"].add(max(sent - queued, 0.0))
+                group["rtt"].add(max(done - sent, 0.0))
+                if error is not None:
+                    group["errors"][error] = group["errors"].get(error, 0) + 1
+                for status_code, n in (retries or {}).items():
+                    group["retries"][status_code] = (
+                        group["retries"].get(status_code, 0) + n
+                    )
+
+    @staticmethod
+    def _snapshot(group):
+        return {
+            "requests": group["rtt"].total,
+            "wait": group["wait"].snapshot(),
+            "rtt": group["rtt"].snapshot(),
+            "errors": dict(group["errors"]),
+            "retries": dict(group["retries"]),
+        }
+
+    def snapshot(self):
+        """the aggregated metrics, as a dict of builtin types"""
+        with self._lock:
+            return {
+                "bounds": list(Histogram.bounds),
+                "endpoints": {k: self._snapshot(v) for k, v in self.endpoints.items()},
+                "priorities": {
+                    k: self._snapshot(v) for k, v in self.priorities.items()
+                },
+            }
+
+
+class Ledger:
+    """
+    Counts the API calls per attribution tag (e.g. a task, ship or subsystem) and minute:
+
+        - calls: requests sent to the server, including retries after 429/5xx errors
+        - coalesced: requests answered with an identical request of another caller
+        - errors: requests that raised an exception
+
+    Completed minutes are taken out in batches (e.g. to write them to the database).
+    Requests can be recorded from multiple threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._minutes = {}  # (minute, tag): [calls, coalesced, errors]
+        self.totals = {}  # tag: [calls, coalesced, errors]
+
+    def record(self, tag, timestamp, retries=0, error=None, coalesced=False):
+        """
+        :param tag: None is counted as "untagged"
+        :param timestamp: epoch seconds
+        :param retries: the number of retries of the request
+        :param error: name of the exception raised by the request
+        :param coalesced: the request was answered without a call
+        """
+        tag = tag or "untagged"
+        minute = int(timestamp // 60) * 60
+        if coalesced:
+            counts = (0, 1, 0)
+        else:
+            counts = (1 + retries, 0, 0 if error is None else 1)
+        with self._lock:
+            for row in (
+                self._minutes.setdefault((minute, tag), [0, 0, 0]),
+                self.totals.setdefault(tag, [0, 0, 0]),
+            ):
+                for n, count in enumerate(counts):
+                    row[n] += count
+
+    def take(self, before):
+        """remove and return the (minute, tag, calls, coalesced, errors) rows
+        of the minutes before `before` (epoch seconds)"""
+        with self._lock:
+            keys = [key for key in self._minutes if key[0] + 60 <= before]
+            return [(*key, *self._minutes.pop(key)) for key in sorted(keys)]
+
+    def restore(self, rows):
+        """put taken rows back (e.g. if they could not be written)"""
+        with self._lock:
+            for minute, tag, *counts in rows:
+                row = self._minutes.setdefault((minute, tag), [0, 0, 0])
+                for n, count in enumerate(counts):
+                    row[n] += count
+
+    def snapshot(self):
+        """the calls, coalesced requests and errors per tag since the start"""
+        with self._lock:
+            return {
+                tag: dict(zip(["calls", "coalesced", "errors"], row))
+                for tag, row in self.totals.items()
+            }
@@ -1,5 +1,5 @@
 import math
-from asyncio import sleep
+from asyncio import sleep, to_thread
 
 import networkx as nx
 
@@ -17,36 +17,48 @@ async def travel(
     verbose=True,
 ):
     """
-    Navigate the ship to the destination waypoint.
+    Navigate the ship (an AsyncShip) to the destination waypoint.
+    The API calls are tagged "travel {ship symbol}" (see RequestMp.tagged()).
     Examples:
       asyncio.run(travel(ship, destination))
 
       asyncio.run(await asyncio.gather(travel(s1, t2), travel(s2, t2)))
     """
+    request = ship.request
+    ship.request = request.tagged(f'travel {ship["symbol"]}')
+    try:
+        await _travel(ship, destination, explore, verbose)
+    finally:
+        ship.request = request
+
+
+async def _travel(ship, destination, explore, verbose):
     if ship["nav"]["waypointSymbol"] == destination:
         if t := ship.nav_remaining():
             await sleep(t)
 
     elif ship["frame"]["symbol"] == "FRAME_PROBE":
-        ship.navigate(destination, verbose)
+        await ship.navigate(destination, verbose)
         await sleep(ship.nav_remaining())
 
     else:
-        system = System(ship["nav"]["systemSymbol"], ship.request)
-        fuel_stops = system.markets_with("FUEL", "sells")
+        system = System(ship["nav"]["systemSymbol"], ship.request.sync)
+        # (in threads: the system is loaded with blocking API and database calls)
+        await to_thread(system.load, "markets", "shipyards", "graph")
+        fuel_stops = await to_thread(system.markets_with, "FUEL", "sells")
         path, edges = get_path(ship, destination, fuel_stops, system)
         for i, waypoint_symbol in enumerate(path):
             if waypoint_symbol != ship["nav"]["waypointSymbol"]:
-                ship.navigate(waypoint_symbol, verbose)
+                await ship.navigate(waypoint_symbol, verbose)
             await sleep(ship.nav_remaining())
             if waypoint_symbol in fuel_stops:
-                ship.refuel()
-            ship.nav_patch(edges["modes"][i])
+                await ship.refuel()
+            await ship.nav_patch(edges["modes"][i])
             if explore:
                 if waypoint_symbol in system.shipyards:
-                    ship.shipyard()
+                    await ship.shipyard()
                 if waypoint_symbol in system.markets:
-                    ship.market()
+                    await ship.market()
 
     if verbose:
         logger.info(f"{ship.name()} has arrived at {destination}")
@@ -1,25 +1,75 @@
+import asyncio
+import math
+import os
+import pickle
+import re
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import closing
+from copy import copy
+from functools import partial
 from json import dumps
-from time import sleep
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from os import getpid
+from tempfile import gettempdir
+from time import perf_counter, sleep, time
 from uuid import uuid1
 
+from requests import Session
 from requests.exceptions import ConnectionError, JSONDecodeError  # noqa
-from requests_ratelimiter import LimiterSession
 
-from st2.exceptions import GameError, ServerResetError
+from st2.caching import cache
+from st2.db import db_pool_stats, db_write_api_calls
+from st2.exceptions import (
+    DeadlineExceededError,
+    GameError,
+    ServerDownError,
+    ServerResetError,
+)
+from st2.limiter import CircuitBreaker, RateLimiter, Unlimited
 from st2.logging import logger
+from st2.metrics import Ledger, RequestMetrics
+from st2.scheduler import Scheduler
+from st2.time import epoch
+
+try:
+    from orjson import loads as _loads  # faster, if available
+except ImportError:
+    from json import loads as _loads
 
 DEBUG = False
 
+# the local socket of the messenger, for processes without qa_pairs (see RequestClient):
+# a Unix socket path, or "host:port" for a TCP socket
+broker_address = os.environ.get(
+    "ST2_BROKER", os.path.join(gettempdir(), "st2-broker.sock")
+)
+# the authkey of a TCP socket (a Unix socket gets a new key each run, see Messenger)
+broker_authkey = os.environ.get("ST2_BROKER_AUTHKEY", "").encode() or None
+
 
 class Request:
     """
     Handles all API requests.
     Only one instance of this class should be used per IP address & agent.
 
+    Requests are paced by a RateLimiter, which follows the rate limit headers.
+    While the server is down, requests are held by a CircuitBreaker.
+    Requests can be made from multiple threads.
+
     To use this class in a multiprocess context, see main.py.
+
+    :param base_url: use another API server (e.g. a local stand-in server).
+    The default can be set with the ST2_BASE_URL environment variable.
+    :param fail_fast: raise a ServerDownError while the server is down, instead of waiting.
+    :param cassette: record all requests, or replay recorded requests (see Cassette).
+    Cassettes replayed at full speed are not paced by the rate limit.
     """
 
-    base_url = "https://api.spacetraders.io/v2/"
+    base_url = os.environ.get("ST2_BASE_URL", "https://api.spacetraders.io/v2/")
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
@@ -29,16 +79,28 @@ class Request:
     ]
     server_down_codes = [
         500,  # unexpected server error
+        502,  # bad gateway (DDoS protection)
         503,  # service unavailable
         504,  # gateway timeout
     ]
-    server_down_sleep = 3
 
-    def __init__(self):
-        self.session = LimiterSession(
-            per_second=2,
-            limit_statuses=self.rate_limit_codes,
-        )
+    def __init__(self, base_url=None, fail_fast=False, cassette=None):
+        if base_url:
+            self.base_url = base_url
+        self.fail_fast = fail_fast
+        self.cassette = cassette
+        self.session = Session()
+        self.limiter = RateLimiter()
+        self.breaker = CircuitBreaker()
+        if cassette is not None and cassette.mode == "replay" and not cassette.pace:
+            self.limiter = Unlimited()
+            self.breaker = CircuitBreaker(backoff=0, backoff_502=0)
+        self._local = threading.local()
+
+    @property
+    def last_retries(self):
+        """{status code: retries} of the last request made by this thread"""
+        return getattr(self._local, "retries", {})
 
     def _request(
         self,
@@ -47,14 +109,14 @@ class Request:
         token: str = None,
         data: dict = None,
         params: dict = None,
+        raw: bool = False,
+        reserved: bool = False,
     ):
-        if method == "get":
-            method = self.session.get
-        elif method == "post":
-            method = self.session.post
-        elif method == "patch":
-            method = self.session.patch
-        else:
+        """
+        :param raw: return successful responses as RawJson (not decoded)
+        :param reserved: the first attempt has a rate limit token already (see Messenger)
+        """
+        if method not in ["get", "post", "patch"]:
             raise NotImplementedError
         url = self.base_url + endpoint
         headers = self.headers.copy()
@@ -70,7 +132,7 @@ class Request:
             logger.debug(f"{endpoint=} {d} {p}")
 
         status_code, error_code, resp_json = self._request_response(
-            method, url, headers, data, params
+            method, endpoint, headers, data, params, raw, reserved
         )
         if status_code in [200, 201]:
             return resp_json
@@ -94,15 +156,52 @@ class Request:
             )
         return resp_json
 
-    def _request_response(self, method, url, headers, data=None, params=None):
+    def _send(self, method, endpoint, headers, data, params):
+        """send the request (or replay it from the cassette)"""
+        if self.cassette is not None and self.cassette.mode == "replay":
+            return self.cassette.play(method, endpoint, params, data)
+        url = self.base_url + endpoint
+        sent, t0 = time(), perf_counter()
+        response = self.session.request(
+            method, url, headers=headers, data=data, params=params
+        )
+        if self.cassette is not None:
+            rtt = perf_counter() - t0
+            self.cassette.record(method, endpoint, params, data, response, sent, rtt)
+        return response
+
+    def _request_response(
+        self,
+        method,
+        endpoint,
+        headers,
+        data=None,
+        params=None,
+        raw=False,
+        reserved=False,
+    ):
         """Make the request until a response is given"""
+        retries = self._local.retries = {}
         while True:
+            probe = self.breaker.acquire(self.fail_fast)
+            if not reserved:
+                self.limiter.acquire()
+            reserved = False  # (retries take a new token)
             try:
-                response = method(url, headers=headers, data=data, params=params)
+                response = self._send(method, endpoint, headers, data, params)
             except ConnectionError:
                 # Server is still processing the request. Patience...
+                self.breaker.cancel(probe)
+                retries["connection"] = retries.get("connection", 0) + 1
                 sleep(0.1)
                 continue
+            except Exception:
+                self.breaker.cancel(probe)
+                raise
+            self.limiter.update(response.headers)
+            if raw and response.status_code in [200, 201]:
+                self.breaker.success()
+                return response.status_code, None, RawJson(response.content)
             try:
                 resp_json = response.json()
             except JSONDecodeError:
@@ -111,18 +210,23 @@ class Request:
             error_code = resp_json.get("error", {}).get("code")
             if status_code in self.rate_limit_codes:
                 logger.debug(resp_json.get("error", {}).get("message", resp_json))
-                sleep(resp_json.get("error", {}).get("data", {}).get("retryAfter", 1))
-            elif status_code == 502:  # DDoS protection
-                logger.warning(f"Error code 502: {resp_json}")
-                sleep(210)
+                error_data = resp_json.get("error", {}).get("data", {})
+                self.limiter.penalize(
+                    error_data.get("retryAfter", 1),
+                    error_data.get("remaining"),
+                    error_data.get("reset"),
+                )
+                self.breaker.success()
             elif status_code in self.server_down_codes:
+                self.breaker.failure(status_code, probe)
                 logger.warning(
-                    f"Server down (error code {status_code}). "
-                    f"Retrying in {self.server_down_sleep} sec"
+                    f"Server down (error code {status_code}): {resp_json}. "
+                    f"Retrying in {self.breaker.stats()['backoff']:.0f} sec"
                 )
-                sleep(self.server_down_sleep)
             else:
+                self.breaker.success()
                 return status_code, error_code, resp_json
+            retries[status_code] = retries.get(status_code, 0) + 1
 
     @staticmethod
     def _raise_formatted_error(resp_error, url, data, status_code):
@@ -140,116 +244,1153 @@ class Request:
             f"{resp_error}\n\n\t{msg}{req}{udata}{edata}{api_code}{game_code}"
         )
 
-    def get(self, endpoint, priority=None, token=None, params=None):
-        del priority
+    def get(
+        self, endpoint, priority=None, token=None, params=None, deadline=None, ttl=None
+    ):
+        del priority, deadline
         if endpoint == "status":
             endpoint = ""
         if params is None:
             params = {"page": 1, "limit": 20}
 
+        ttl = response_cache.ttl(endpoint) if ttl is None else ttl
+        if ttl:
+            key = response_cache.key(endpoint, token, params)
+            ret = response_cache.get(key)
+            if ret is None:
+                ret = self._request("get", endpoint, token, None, params)
+                response_cache.set(key, ret, ttl)
+            return ret
         return self._request("get", endpoint, token, None, params)
 
-    def get_all(self, endpoint, priority=None, token=None):
-        """yield all results from the get request, not just the first 20 results."""
-        del priority
-        total = 0
-        page = 0
-        while True:
-            page += 1
-            resp_json = self.get(endpoint, token, {"page": page, "limit": 20})
-            yield resp_json
-            total += len(resp_json["data"])
-            if total == resp_json["meta"]["total"]:
-                break
+    def get_all(self, endpoint, priority=None, token=None, deadline=None, ttl=None):
+        """yield all results from the get request, not just the first 20 results.
+        After the first page, the other pages are requested at once (see _page_futures).
+        """
+        del priority, deadline
+        first = self.get(
+            endpoint, token=token, params={"page": 1, "limit": 20}, ttl=ttl
+        )
+        with ThreadPoolExecutor(_get_pages_window) as pool:
+
+            def submit(page):
+                params = {"page": page, "limit": 20}
+                return pool.submit(self.get, endpoint, None, token, params, None, ttl)
 
-    def post(self, endpoint, priority=None, token=None, data=None):
-        del priority
+            yield from _get_pages(first, submit)
+
+    def post(self, endpoint, priority=None, token=None, data=None, deadline=None):
+        del priority, deadline
         return self._request("post", endpoint, token, data)
 
-    def patch(self, endpoint, priority=None, token=None, data=None):
-        del priority
+    def patch(self, endpoint, priority=None, token=None, data=None, deadline=None):
+        del priority, deadline
         return self._request("patch", endpoint, token, data)
 
 
+class RawJson:
+    """
+    The body of a JSON response, decoded only when needed (with orjson, if available).
+    Passing the bytes between processes is cheaper than passing the decoded response.
+    """
+
+    __slots__ = ("content",)
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+    def __getstate__(self):
+        return self.content
+
+    def __setstate__(self, content):
+        self.content = content
+
+    def json(self):
+        return _loads(self.content) if self.content else {}
+
+
+class ResponseCache:
+    """
+    Caches the answers to GET requests of slow-changing endpoints in the diskcache.
+    Cached answers do not use the rate limit.
+
+    :param rules: list of (endpoint pattern, time to live in seconds).
+    The first pattern that matches the whole endpoint is used.
+    Requests can override the rules with their own `ttl` (0 to skip the cache).
+
+    The cache is cleared by game_server() when the server resets.
+    """
+
+    rules = [
+        (r"systems", 24 * 3600),  # all systems (paged)
+        (r"systems/[^/]+", 24 * 3600),  # a system and its waypoints
+        (r"systems/[^/]+/waypoints/[^/]+/jump-gate", 24 * 3600),
+        (r"factions(/[^/]+)?", 3600),
+    ]
+
+    def __init__(self, rules=None):
+        if rules is not None:
+            self.rules = rules
+        self._patterns = [(re.compile(p), ttl) for p, ttl in self.rules]
+        self.hits = 0
+        self.misses = 0
+
+    def ttl(self, endpoint):
+        """time to live of the endpoint's answers (0 if not cached)"""
+        for pattern, ttl in self._patterns:
+            if pattern.fullmatch(endpoint):
+                return ttl
+        return 0
+
+    @staticmethod
+    def key(endpoint, token, params):
+        params = tuple(sorted(params.items())) if params else None
+        return "response", endpoint, token, params
+
+    def get(self, key):
+        ret = cache.get(key)
+        if ret is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return ret
+
+    @staticmethod
+    def set(key, value, ttl):
+        cache.set(key, value, expire=ttl, tag="response")
+
+    @staticmethod
+    def clear():
+        cache.evict("response")
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# shared by all Request & RequestMp instances in this process
+response_cache = ResponseCache()
+
+
+_get_pages_window = 10
+
+
+def _page_futures(first, submit, window=_get_pages_window):
+    """
+    Yield the Futures of the other pages than the first one, in order.
+
+    The number of pages is known from the first page,
+    so up to `window` pages are requested at once with submit(page) -> Future.
+    Pages that are not yet answered when the generator is closed are cancelled.
+    """
+    pages = math.ceil(first["meta"]["total"] / first["meta"]["limit"])
+    futures = deque()
+    page = 2
+    try:
+        while page <= pages or futures:
+            while page <= pages and len(futures) < window:
+                futures.append(submit(page))
+                page += 1
+            yield futures[0]
+            futures.popleft()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _get_pages(first, submit, window=_get_pages_window):
+    """Yield the first page, and then all other pages in order (see _page_futures)."""
+    yield first
+    with closing(_page_futures(first, submit, window)) as futures:
+        for future in futures:
+            yield future.result()
+
+
+class _Replies:
+    """
+    Receives answers from the messenger and wakes up the waiting RequestMp callers.
+
+    The messenger opens one connection per process, and sends (uuid, answer) tuples.
+    One instance is shared by all RequestMp instances in a process (see _replies()).
+    """
+
+    def __init__(self):
+        self.pid = getpid()
+        self.listener = Listener(family="AF_UNIX")
+        self.address = self.listener.address
+        self._futures = {}
+        self._lock = threading.Lock()
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            conn = self.listener.accept()
+            threading.Thread(target=self._receive, args=(conn,), daemon=True).start()
+
+    def _receive(self, conn):
+        while True:
+            try:
+                uuid, ret = conn.recv()
+            except (EOFError, OSError):
+                conn.close()
+                return
+            with self._lock:
+                future = self._futures.pop(uuid, None)
+            if future is None:
+                continue
+            if isinstance(ret, RawJson):
+                # (decoded once, in the process that needs it)
+                try:
+                    ret = ret.json()
+                except ValueError as e:
+                    ret = e
+            # a running future can no longer be cancelled (by a timeout or a coroutine)
+            if not future.set_running_or_notify_cancel():
+                continue  # (e.g. the awaiting coroutine was cancelled)
+            if isinstance(ret, Exception):
+                future.set_exception(ret)
+            else:
+                future.set_result(ret)
+
+    def expect(self, uuid):
+        """return a Future that is resolved when the answer to uuid arrives
+        (the Future raises the answer if it is an exception)"""
+        future = Future()
+        with self._lock:
+            self._futures[uuid] = future
+        return future
+
+    def forget(self, uuid):
+        """stop waiting for the answer to uuid"""
+        with self._lock:
+            self._futures.pop(uuid, None)
+
+
+_replies_instance = None
+_replies_lock = threading.Lock()
+
+
+def _replies():
+    """The reply listener of this process (a new one is started after a fork)"""
+    global _replies_instance
+    with _replies_lock:
+        if _replies_instance is None or _replies_instance.pid != getpid():
+            _replies_instance = _Replies()
+        return _replies_instance
+
+
 class RequestMp:
     """
     Request helper class for multiprocess contexts.
     Uses the same arguments, but requires additional `priority`.
 
+    Requests are sent to the messenger via the priority queues,
+    answers are sent back directly to this process (see _Replies).
+
+    Requests can have an optional deadline (datetime, ISO 8601 string or epoch seconds).
+    Requests that are still queued at their deadline are not sent,
+    and raise a DeadlineExceededError instead.
+    With `fail_fast`, requests made while the server is down raise a ServerDownError,
+    instead of waiting until it is back up.
+
+    Requests can have an optional timeout (seconds to wait for the answer).
+    Requests that time out raise a TimeoutError, and are cancelled:
+    if they are still queued, they are not sent.
+    Cancelling the Future of _submit() (or the AsyncRequestMp coroutine) does the same.
+
+    GET requests of slow-changing endpoints are answered from the response cache
+    when possible (see ResponseCache), without using the rate limit.
+
+    The API calls of requests are counted per `tag` (e.g. a task, ship or subsystem)
+    by the messenger (see Ledger). Use tagged() for requests with another tag.
+
+    With `raw`, the messenger passes the response bytes of successful requests,
+    which are decoded in this process (see RawJson). This saves the messenger
+    from decoding and pickling large responses (e.g. waypoints and markets).
+
     See main.py.
     """
 
-    def __init__(self, qa_pairs, priority=0, token=None):
+    def __init__(
+        self, qa_pairs, priority=0, token=None, fail_fast=False, tag=None, raw=False
+    ):
         self.queues = {}
-        for priority, (queue, answer_dict) in enumerate(qa_pairs):
-            self.queues[priority] = (queue, answer_dict)
+        for n, (queue, answer_dict) in enumerate(qa_pairs):
+            self.queues[n] = (queue, answer_dict)
         self.priority = priority
         self.token = token
-        self.sleep = 0.01
+        self.fail_fast = fail_fast
+        self.tag = tag
+        self.raw = raw
+
+    def tagged(self, tag):
+        """a copy that attributes its requests to `tag`"""
+        request = copy(self)
+        request.tag = tag
+        return request
 
-    def _request(self, method, endpoint, priority, token, data=None, params=None):
+    def _request(
+        self,
+        method,
+        endpoint,
+        priority,
+        token,
+        data=None,
+        params=None,
+        deadline=None,
+        timeout=None,
+    ):
+        future = self._submit(method, endpoint, priority, token, data, params, deadline)
+        return self._result(future, timeout)
+
+    @staticmethod
+    def _result(future, timeout):
+        """the answer of the Future, or cancel the request after `timeout` seconds"""
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            if not future.cancel():
+                return future.result()  # (answered in the meantime)
+            raise TimeoutError(f"No answer within {timeout} sec, request cancelled")
+
+    def _submit(
+        self,
+        method,
+        endpoint,
+        priority,
+        token,
+        data=None,
+        params=None,
+        deadline=None,
+        ttl=None,
+    ):
+        """queue a request, and return a Future of the answer"""
         if priority is None:
             priority = self.priority
         if token is None:
             token = self.token
-        queue, answer_dict = self.queues[priority]
+        if method == "get":
+            ttl = response_cache.ttl(endpoint) if ttl is None else ttl
+            if ttl:
+                return self._submit_cached(
+                    endpoint, priority, token, params, deadline, ttl
+                )
+        if deadline is not None:
+            deadline = epoch(deadline)
+        queue, _ = self.queues[priority]
+        replies = _replies()
         uuid = uuid1()
-        queue.put((uuid, method, endpoint, token, data, params))
-        while uuid not in answer_dict:
-            sleep(self.sleep)
-        ret = answer_dict.pop(uuid)
-        if isinstance(ret, Exception):
-            raise ret
-        return ret
+        future = replies.expect(uuid)
+        future.add_done_callback(partial(self._cancel, queue, uuid))
+        queue.put(
+            {
+                "uuid": uuid,
+                "method": method,
+                "endpoint": endpoint,
+                "token": token,
+                "data": data,
+                "params": params,
+                "reply": replies.address,
+                "deadline": deadline,
+                "queued": time(),
+                "fail_fast": self.fail_fast,
+                "tag": self.tag,
+                "raw": self.raw,
+            }
+        )
+        return future
+
+    def set_budget(self, priority, reserve=None, cap=None):
+        """
+        Reserve and/or cap the rate of API requests (per second) of a priority queue,
+        or remove its budget (see Scheduler), without restarting the messenger.
+        """
+        queue, _ = self.queues[priority]
+        queue.put({"budget": (reserve, cap)})
+
+    @staticmethod
+    def _cancel(queue, uuid, future):
+        """tell the messenger that a cancelled request need not be sent"""
+        if future.cancelled():
+            _replies().forget(uuid)
+            queue.put({"cancel": uuid})
+
+    def _submit_cached(self, endpoint, priority, token, params, deadline, ttl):
+        """like _submit(), but answer from the response cache when possible"""
+        key = response_cache.key(endpoint, token, params)
+        ret = response_cache.get(key)
+        if ret is not None:
+            future = Future()
+            future.set_result(ret)
+            return future
+
+        def store(f):
+            if not f.cancelled() and f.exception() is None:
+                response_cache.set(key, f.result(), ttl)
+
+        future = self._submit(
+            "get", endpoint, priority, token, None, params, deadline, 0
+        )
+        future.add_done_callback(store)
+        return future
 
-    def get(self, endpoint, priority=None, token=None, params=None):
+    def get(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        params=None,
+        deadline=None,
+        ttl=None,
+        timeout=None,
+    ):
         if endpoint == "status":
             endpoint = ""
         if params is None:
             params = {"page": 1, "limit": 20}
 
-        return self._request("get", endpoint, priority, token, None, params)
+        future = self._submit(
+            "get", endpoint, priority, token, None, params, deadline, ttl
+        )
+        return self._result(future, timeout)
 
-    def get_all(self, endpoint, priority=None, token=None):
-        """yield all results from the get request, not just the first 20 results."""
-        total = 0
-        page = 0
-        while True:
-            page += 1
-            resp_json = self.get(endpoint, priority, token, {"page": page, "limit": 20})
-            yield resp_json
-            total += len(resp_json["data"])
-            if total == resp_json["meta"]["total"]:
-                break
+    def get_all(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        deadline=None,
+        ttl=None,
+        timeout=None,
+    ):
+        """yield all results from the get request, not just the first 20 results.
+        After the first page, the other pages are requested at once (see _page_futures).
+        (the timeout applies to the first page)
+        """
+        params = {"page": 1, "limit": 20}
+        first = self.get(endpoint, priority, token, params, deadline, ttl, timeout)
 
-    def post(self, endpoint, priority=None, token=None, data=None):
-        return self._request("post", endpoint, priority, token, data)
+        def submit(page):
+            params = {"page": page, "limit": 20}
+            return self._submit(
+                "get", endpoint, priority, token, None, params, deadline, ttl
+            )
 
-    def patch(self, endpoint, priority=None, token=None, data=None):
-        return self._request("patch", endpoint, priority, token, data)
+        yield from _get_pages(first, submit)
 
+    def post(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        data=None,
+        deadline=None,
+        timeout=None,
+    ):
+        return self._request(
+            "post", endpoint, priority, token, data, None, deadline, timeout
+        )
 
-def messenger(qa_pairs):
+    def patch(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        data=None,
+        deadline=None,
+        timeout=None,
+    ):
+        return self._request(
+            "patch", endpoint, priority, token, data, None, deadline, timeout
+        )
+
+
+class AsyncRequestMp(RequestMp):
+    """
+    RequestMp for coroutines: get, get_all, post and patch are awaitable,
+    so that other coroutines on the event loop run while a request is answered.
+
+    Example:
+        ```
+        request = AsyncRequestMp(qa_pairs, priority=3, token="abc123")
+        ships = await request.get("my/ships")
+        async for page in request.get_all("systems/X1-A1/waypoints"):
+            ...
+        ```
+    """
+
+    @property
+    def sync(self):
+        """a RequestMp with the same queues and defaults (for blocking code)"""
+        qa_pairs = list(self.queues.values())
+        return RequestMp(
+            qa_pairs, self.priority, self.token, self.fail_fast, self.tag, self.raw
+        )
+
+    async def _request(
+        self,
+        method,
+        endpoint,
+        priority,
+        token,
+        data=None,
+        params=None,
+        deadline=None,
+        timeout=None,
+    ):
+        future = self._submit(method, endpoint, priority, token, data, params, deadline)
+        return await self._result(future, timeout)
+
+    @staticmethod
+    async def _result(future, timeout):
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            # (wait_for cancelled the request)
+            raise TimeoutError(f"No answer within {timeout} sec, request cancelled")
+
+    async def get(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        params=None,
+        deadline=None,
+        ttl=None,
+        timeout=None,
+    ):
+        if endpoint == "status":
+            endpoint = ""
+        if params is None:
+            params = {"page": 1, "limit": 20}
+
+        future = self._submit(
+            "get", endpoint, priority, token, None, params, deadline, ttl
+        )
+        return await self._result(future, timeout)
+
+    async def get_all(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        deadline=None,
+        ttl=None,
+        timeout=None,
+    ):
+        """yield all results from the get request, not just the first 20 results.
+        After the first page, the other pages are requested at once (see _page_futures).
+        (the timeout applies to the first page)
+        """
+        params = {"page": 1, "limit": 20}
+        first = await self.get(
+            endpoint, priority, token, params, deadline, ttl, timeout
+        )
+
+        def submit(page):
+            params = {"page": page, "limit": 20}
+            return self._submit(
+                "get", endpoint, priority, token, None, params, deadline, ttl
+            )
+
+        yield first
+        with closing(_page_futures(first, submit)) as futures:
+            for future in futures:
+                yield await asyncio.wrap_future(future)
+
+    async def post(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        data=None,
+        deadline=None,
+        timeout=None,
+    ):
+        return await self._request(
+            "post", endpoint, priority, token, data, None, deadline, timeout
+        )
+
+    async def patch(
+        self,
+        endpoint,
+        priority=None,
+        token=None,
+        data=None,
+        deadline=None,
+        timeout=None,
+    ):
+        return await self._request(
+            "patch", endpoint, priority, token, data, None, deadline, timeout
+        )
+
+
+class _BrokerQueue:
+    """a priority queue of the messenger's broker (for RequestClient)"""
+
+    def __init__(self, conn, lock, priority):
+        self.conn = conn
+        self.lock = lock
+        self.priority = priority
+
+    def put(self, job):
+        with self.lock:
+            self.conn.send((self.priority, job))
+
+
+def _broker_address(address):
+    """a Unix socket path, or a (host, port) tuple for "host:port" """
+    if isinstance(address, str) and ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def _broker_key_file(address):
+    """the file with the authkey of a Unix broker socket (see Messenger._listen)"""
+    return f"{address}.key"
+
+
+def _broker_authkey(address, authkey=None):
+    """
+    The authkey to connect to the broker: `authkey`, or by default
+    broker_authkey (TCP socket) or the key of the running messenger (Unix socket,
+    broker_authkey without a key file).
+    """
+    if authkey is not None:
+        return authkey
+    if isinstance(address, tuple):
+        if broker_authkey is None:
+            raise ValueError(
+                f"The broker socket {address} needs an authkey (ST2_BROKER_AUTHKEY)"
+            )
+        return broker_authkey
+    try:
+        with open(_broker_key_file(address), "rb") as f:
+            return f.read()
+    except FileNotFoundError:
+        return broker_authkey  # (None: no messenger is running)
+
+
+class RequestClient(RequestMp):
+    """
+    RequestMp for processes that were not started with the qa_pairs
+    (e.g. notebooks, scripts or another main.py).
+    Requests are sent to the messenger's broker socket,
+    so that all processes on this host share the same rate limit and priority queues.
+
+    Example:
+        ```
+        request = RequestClient(priority=3, token="abc123")
+        ships = request.get("my/ships")
+        # or, in coroutines:
+        request = AsyncRequestMp(request.qa_pairs, priority=3, token="abc123")
+        ```
+
+    :param address: the messenger's broker socket (default: broker_address).
+    :param authkey: the messenger's authkey (default: see _broker_authkey).
+    """
+
+    def __init__(
+        self,
+        address=None,
+        priority=0,
+        token=None,
+        fail_fast=False,
+        authkey=None,
+        tag=None,
+        raw=False,
+    ):
+        address = _broker_address(address or broker_address)
+        conn = Client(address, authkey=_broker_authkey(address, authkey))
+        classes = conn.recv()
+        lock = threading.Lock()
+        self.qa_pairs = [(_BrokerQueue(conn, lock, n), None) for n in range(classes)]
+        super().__init__(self.qa_pairs, priority, token, fail_fast, tag, raw)
+        self.conn = conn
+        # answers arrive on the same connection
+        threading.Thread(target=_replies()._receive, args=(conn,), daemon=True).start()
+
+    def close(self):
+        self.conn.close()
+
+
+def messenger(*args, **kwargs):
+    m = Messenger(*args, **kwargs)
+    m.run()
+
+
+class Messenger:
     """
     Delivers API requests between Request() and any number of RequestMp() instances.
 
     :param qa_pairs: can contain any number of tuples, in order of importance (high -> low).
     Each tuple should contain a queue and a dictionary.
-    :return: None.
-    The messenger draws API requests from the queues
-    (which must be a tuple in the form seen below)
-    and stores the results in the answer dicts.
-    """
-    session = Request()
-    while True:
-        for queue, answer_dict in qa_pairs:
-            if queue.empty():
-                continue  # next queue
-            uuid, method, endpoint, token, data, params = queue.get()
+    :param weights: optional share of the API requests per queue (see Scheduler).
+    Use None for queues that should always go first.
+    :param edf: order the requests in each queue by deadline (earliest first).
+    Requests past their deadline are answered with a DeadlineExceededError.
+    :param budgets: optional (reserve, cap) rate per queue, in requests per second
+    (see Scheduler; can be changed at runtime with RequestMp.set_budget()).
+    :param workers: maximum number of requests in flight.
+    :param base_url: use another API server (see Request).
+    :param cassette: record or replay the API traffic (see Request).
+    :param broker: also accept requests on this local socket (see RequestClient),
+    e.g. broker_address.
+    :param authkey: bytes that RequestClients need to connect to the broker
+    (requests are pickled). Required for a TCP socket. By default, a Unix socket
+    gets a new key each run, in a file next to it that only this user can read.
+    :param ledger: write the API calls per tag and minute (see Ledger)
+    to the database every `ledger_interval` seconds.
+
+    One thread per queue moves the API requests
+    (which must be a dict in the form seen in RequestMp._request)
+    into the scheduler, which blocks until any queue has work.
+    When a worker is free and the rate limit allows it, the next request is sent.
+    The results are sent to the reply address of the caller, in any order.
+    Requests without a reply address are answered in the answer dict.
+
+    While the server is down, requests stay queued until the CircuitBreaker closes.
+    Requests of fail_fast callers are answered with a ServerDownError instead.
+
+    Cancelled requests (see RequestMp) that are still queued are not sent,
+    neither are requests of callers whose process has stopped.
+    Answers in the answer dict that are not claimed within `answer_ttl` seconds
+    are evicted every `evict_interval` seconds.
+
+    Identical GET requests (same endpoint, params and token) are sent once,
+    and the answer is delivered to all callers (see _join()).
+    Requests can join an identical request in flight, or one that is queued
+    with at least their priority and no later deadline.
+    Other requests of the same token stop requests in flight from being joined,
+    so that answers are never older than the caller's own previous requests.
+
+    Statistics are written to the cache every `stats_interval` seconds
+    (see messenger_stats()), including the queue wait and round trip time
+    of the requests per endpoint and per queue (see RequestMetrics).
+    """
+
+    stats_interval = 10
+    answer_ttl = 600
+    evict_interval = 60
+    ledger_interval = 60
+
+    def __init__(
+        self,
+        qa_pairs,
+        weights=None,
+        edf=False,
+        workers=4,
+        base_url=None,
+        cassette=None,
+        broker=None,
+        budgets=None,
+        authkey=None,
+        ledger=False,
+    ):
+        self.qa_pairs = qa_pairs
+        self.broker = broker
+        self.authkey = authkey
+        self.session = Request(base_url, cassette=cassette)
+        self.scheduler = Scheduler(len(qa_pairs), weights, edf, budgets)
+        self.workers = workers
+        self.expired = [0] * len(qa_pairs)
+        self.coalesced = [0] * len(qa_pairs)  # requests saved, per queue
+        self.cancelled = [0] * len(qa_pairs)  # requests not sent, per queue
+        self.orphaned = [0] * len(qa_pairs)  # answers without a caller, per queue
+        self.evicted = {"answers": 0, "bytes": 0}  # unclaimed answers
+        self._jobs = {}  # uuid: job, until it is answered
+        self._stopped = {}  # reply address of a stopped process: time
+        self._unclaimed = deque()  # (time, priority, uuid) of the answer dict
+        self._groups = {}  # GET request key: (priority, leading job)
+        self._groups_lock = threading.Lock()
+        self.metrics = RequestMetrics()
+        self.ledger = Ledger()
+        self.write_ledger = ledger
+        self._slots = threading.BoundedSemaphore(workers)
+        self._replies = {}  # reply address: connection
+        self._replies_lock = threading.Lock()  # for the two dicts, not the sends
+        self._send_locks = {}  # reply address: lock held to connect and send
+        self._stats_time = 0
+
+    def run(self):
+        for priority, (queue, _) in enumerate(self.qa_pairs):
+            threading.Thread(
+                target=self._feed, args=(priority, queue), daemon=True
+            ).start()
+        threading.Thread(target=self._evict, daemon=True).start()
+        if self.write_ledger:
+            threading.Thread(target=self._write_ledger, daemon=True).start()
+        listener = self._listen() if self.broker else None
+        if listener is not None:
+            self.broker = listener.address
+            threading.Thread(target=self._broker, args=(listener,), daemon=True).start()
+        pool = ThreadPoolExecutor(self.workers)
+        while True:
+            self._write_stats()
+            self._slots.acquire()
+            # select the request when it can be sent
+            if not self.session.breaker.wait(timeout=self.stats_interval):
+                self._slots.release()
+                continue
+            # (the rate limit token is taken before the request is selected,
+            #  so that the priorities and deadlines are decided when it is sent)
+            token = self.session.limiter.acquire()
+            ret = self.scheduler.get(timeout=self.stats_interval)
+            if (
+                ret is None
+                or self._abandoned(*ret)
+                or self._expired(*ret)
+                or self._join(*ret, queued=False)
+            ):
+                self.session.limiter.release(token)
+                self._slots.release()
+                continue
+            ret[1]["dispatched"] = time()
+            pool.submit(self._send, *ret)
+
+    def _send(self, priority, job):
+        error = None
+        try:
+            ret = self.session._request(  # noqa
+                job["method"],
+                job["endpoint"],
+                job["token"],
+                job["data"],
+                job["params"],
+                job.get("raw", False),
+                reserved=True,
+            )
+        except Exception as exc:
+            ret = exc
+            error = type(exc).__name__
+        finally:
+            self._slots.release()
+        done = time()
+        retries = self.session.last_retries
+        self.metrics.record(
+            priority,
+            job["method"],
+            job["endpoint"],
+            job.get("queued"),
+            job["dispatched"],
+            done,
+            error,
+            retries,
+        )
+        self.ledger.record(job.get("tag"), done, sum(retries.values()), error)
+        followers = self._release(job)
+        # (counted before the callers are answered)
+        for follower in followers:
+            self.coalesced[follower[0]] += 1
+            self.ledger.record(follower[1].get("tag"), done, coalesced=True)
+        self._deliver(priority, job, ret)
+        for follower in followers:
+            self._deliver(*follower, ret)
+
+    def _feed(self, priority, queue):
+        """move requests from a queue into the scheduler"""
+        while True:
+            job = queue.get()
+            try:
+                self._put(priority, job)
+            except Exception as e:
+                # (e.g. a malformed job) the queue is still served
+                logger.exception(f"Request {job!r} (queue {priority}) dropped: {e}")
+
+    def _put(self, priority, job):
+        """move a request into the scheduler (or cancel a request)"""
+        if "budget" in job:
+            try:
+                self.scheduler.set_budget(priority, *job["budget"])
+            except ValueError as e:
+                logger.warning(e)
+            return
+        if "cancel" in job:
+            job = self._jobs.get(job["cancel"])
+            if job is not None:
+                job["cancelled"] = True
+            return
+        self._jobs[job["uuid"]] = job
+        if job.get("fail_fast") and self.session.breaker.is_open:
+            error = ServerDownError(f"Server down, '{job['endpoint']}' not sent")
+            self._deliver(priority, job, error)
+        elif not self._join(priority, job, queued=True):
+            self.scheduler.put(priority, job, job.get("deadline"))
+
+    def _listen(self):
+        """open the broker socket (unless another messenger has it already)"""
+        address = _broker_address(self.broker)
+        if isinstance(address, tuple):
+            self.authkey = _broker_authkey(address, self.authkey)
+            return Listener(address, authkey=self.authkey)
+        if os.path.exists(address):
+            try:
+                Client(address, authkey=_broker_authkey(address, self.authkey)).close()
+                running = True
+            except AuthenticationError:
+                running = True  # (with another authkey)
+            except (OSError, EOFError):
+                running = False
+            if running:
+                logger.warning(f"Another messenger is listening on {address}")
+                return None
+            os.unlink(address)  # left behind by a stopped messenger
+        if self.authkey is None:
+            self.authkey = os.urandom(32)
+        # the key of this messenger (also a given one), readable by this user only
+        key_file = _broker_key_file(address)
+        if os.path.exists(key_file):
+            os.unlink(key_file)
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.authkey)
+        return Listener(address, authkey=self.authkey)
+
+    def _broker(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                continue  # e.g. a client with the wrong authkey
+            threading.Thread(
+                target=self._broker_client, args=(conn,), daemon=True
+            ).start()
+
+    def _broker_client(self, conn):
+        """
+        Move the requests of a RequestClient into the scheduler.
+        The answers are sent back on the same connection.
+        """
+        reply = f"broker-{uuid1()}"
+        conn.send(len(self.qa_pairs))
+        with self._replies_lock:
+            self._replies[reply] = conn
+            self._send_locks[reply] = threading.Lock()
+        while True:
+            try:
+                message = conn.recv()
+            except (OSError, EOFError):
+                break
+            try:
+                priority, job = message
+                job["reply"] = reply
+                self._put(priority, job)
+            except Exception as e:
+                # (e.g. a malformed job) the other requests are still served
+                logger.exception(f"Request {message!r} (broker) dropped: {e}")
+        # the client has stopped: its queued requests are dropped
+        with self._replies_lock:
+            self._stop(reply)
+
+    @staticmethod
+    def _key(job):
+        if job["method"] != "get":
+            return None
+        return ResponseCache.key(job["endpoint"], job["token"], job["params"])
+
+    def _join(self, priority, job, queued):
+        """
+        Attach a GET request to an identical request, instead of sending it.
+        Called when the request is queued, and when it is about to be sent.
+        Returns True if the request was attached.
+        """
+        key = self._key(job)
+        with self._groups_lock:
+            if key is None:
+                if not queued:
+                    self._close(job["token"])
+                return False
+            group = self._groups.get(key)
+            if group is None:
+                job["followers"] = []
+                job["sent"] = not queued
+                self._groups[key] = (priority, job)
+                return False
+            leader_priority, leader = group
+            if leader is job:
+                job["sent"] = True
+                return False
+            if leader["sent"] or (
+                queued and self._can_wait(leader_priority, leader, priority, job)
+            ):
+                leader["followers"].append((priority, job))
+                return True
+            if not queued:
+                # the request overtook the queued leader, and leads the group instead
+                job["followers"], leader["followers"] = leader["followers"], []
+                job["sent"] = True
+                self._groups[key] = (priority, job)
+            return False
+
+    @staticmethod
+    def _can_wait(leader_priority, leader, priority, job):
+        """whether the job is sent no later when it follows the queued leader"""
+        if priority < leader_priority:
+            return False
+        deadline = job.get("deadline")
+        leader_deadline = leader.get("deadline")
+        return deadline is None or (
+            leader_deadline is not None and leader_deadline <= deadline
+        )
+
+    def _close(self, token):
+        """stop GET requests in flight from being joined (their answers may be outdated)"""
+        for key, (_, leader) in list(self._groups.items()):
+            if key[2] == token and leader["sent"]:
+                del self._groups[key]
+
+    def _release(self, job):
+        """return the (priority, job) requests that are answered with the job"""
+        key = self._key(job)
+        with self._groups_lock:
+            if key is not None and self._groups.get(key, (None, None))[1] is job:
+                del self._groups[key]
+            return job.pop("followers", [])
+
+    def _gone(self, job):
+        """whether the caller no longer waits for the answer"""
+        return job.get("cancelled", False) or job.get("reply") in self._stopped
+
+    def _abandoned(self, priority, job):
+        """drop requests that nobody waits for, instead of sending them"""
+        if not self._gone(job):
+            return False
+        key = self._key(job)
+        with self._groups_lock:
+            followers = job.get("followers", [])
+            if not all(self._gone(follower) for _, follower in followers):
+                return False
+            if key is not None and self._groups.get(key, (None, None))[1] is job:
+                del self._groups[key]
+            job.pop("followers", None)
+        for p, j in [(priority, job)] + followers:
+            self._jobs.pop(j["uuid"], None)
+            self.cancelled[p] += 1
+        logger.debug(f"Request '{job['method']} {job['endpoint']}' was cancelled")
+        return True
+
+    def _expired(self, priority, job):
+        """answer requests that are past their deadline, instead of sending them"""
+        deadline = job.get("deadline")
+        if deadline is None or deadline >= time():
+            return False
+        self.expired[priority] += 1
+        msg = (
+            f"Request '{job['method']} {job['endpoint']}' (priority {priority}) "
+            f"passed its deadline {time() - deadline:.1f} sec ago, and was not sent"
+        )
+        logger.debug(msg)
+        # requests waiting for this one are queued again
+        for follower in self._release(job):
+            self.scheduler.put(*follower, follower[1].get("deadline"))
+        self._deliver(priority, job, DeadlineExceededError(msg))
+        return True
+
+    def _deliver(self, priority, job, ret):
+        """send the answer to the caller's reply listener"""
+        self._jobs.pop(job["uuid"], None)
+        address = job.get("reply")
+        if address is None:
+            if isinstance(ret, RawJson):
+                ret = ret.json()
+            answer_dict = self.qa_pairs[priority][1]
+            answer_dict[job["uuid"]] = ret
+            self._unclaimed.append((time(), priority, job["uuid"]))
+            return
+        if self._gone(job):
+            self.orphaned[priority] += 1
+            return
+        # a slow caller only holds up the answers to its own process
+        with self._replies_lock:
+            lock = self._send_locks.setdefault(address, threading.Lock())
+        try:
+            with lock:
+                with self._replies_lock:
+                    if address in self._stopped:
+                        self.orphaned[priority] += 1
+                        return
+                    conn = self._replies.get(address)
+                if conn is None:
+                    conn = Client(address, family="AF_UNIX")
+                    with self._replies_lock:
+                        self._replies[address] = conn
+                conn.send((job["uuid"], ret))
+        except (OSError, EOFError):
+            # the caller's process has stopped: its queued requests are dropped
+            with self._replies_lock:
+                self._stop(address)
+            self.orphaned[priority] += 1
+
+    def _stop(self, address):
+        """drop the requests of a stopped caller (with the _replies_lock)"""
+        self._stopped[address] = time()
+        self._send_locks.pop(address, None)
+        conn = self._replies.pop(address, None)
+        if conn is not None:
+            conn.close()
+
+    def _forget_stopped(self, before):
+        """
+        forget the callers that stopped before `before`, once none of their requests
+        are left (their requests arrive before they stop, or shortly after)
+        """
+        waiting = {job.get("reply") for job in list(self._jobs.values())}
+        with self._replies_lock:
+            for address, stopped in list(self._stopped.items()):
+                if stopped < before and address not in waiting:
+                    del self._stopped[address]
+
+    def _write_ledger(self):
+        """add the API calls per tag of each completed minute to the database"""
+        while True:
+            sleep(self.ledger_interval)
+            rows = self.ledger.take(time())
+            if not rows:
+                continue
             try:
-                ret = session._request(method, endpoint, token, data, params)  # noqa
-            except Exception as exc:
-                ret = exc
-            answer_dict[uuid] = ret
-            break  # next iteration
-        sleep(0.01)  # no requests
+                db_write_api_calls(rows)
+            except Exception as e:
+                logger.warning(f"API calls ledger not written (retrying later): {e}")
+                self.ledger.restore(rows)
+
+    def _evict(self):
+        while True:
+            sleep(self.evict_interval)
+            self._evict_answers(time() - self.answer_ttl)
+            self._forget_stopped(time() - self.evict_interval)
+
+    def _evict_answers(self, before):
+        """remove the answers from the answer dicts that were put before `before`
+        and are still unclaimed"""
+        while self._unclaimed and self._unclaimed[0][0] < before:
+            _, priority, uuid = self._unclaimed.popleft()
+            ret = self.qa_pairs[priority][1].pop(uuid, None)
+            if ret is not None:
+                self.evicted["answers"] += 1
+                self.evicted["bytes"] += len(pickle.dumps(ret))
+
+    def stats(self):
+        return {
+            "timestamp": time(),
+            "scheduler": self.scheduler.stats(),
+            "expired": list(self.expired),
+            "coalesced": list(self.coalesced),
+            "cancelled": list(self.cancelled),
+            "orphaned": list(self.orphaned),
+            "evicted": dict(self.evicted),
+            "limiter": self.session.limiter.stats(),
+            "breaker": self.session.breaker.stats(),
+            "metrics": self.metrics.snapshot(),
+            "ledger": self.ledger.snapshot(),
+            "db": db_pool_stats(),
+        }
+
+    def _write_stats(self):
+        if time() - self._stats_time >= self.stats_interval:
+            self._stats_time = time()
+            cache.set("messenger_stats", self.stats())
+
+
+def messenger_stats():
+    """The latest statistics written by the messenger (e.g. requests served per queue)"""
+    return cache.get("messenger_stats")
@@ -0,0 +1,252 @@
+import threading
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+from time import monotonic, time
+
+
+class Budget:
+    """
+    A reserved and/or capped rate (requests per second) for a priority class.
+
+    Both are token buckets that hold up to `period` seconds of requests (at least 1).
+    A reservation only takes effect while the class has work,
+    so unused reservations are available to the other classes.
+    """
+
+    period = 2
+
+    def __init__(self, reserve=None, cap=None):
+        self.reserve = None
+        self.cap = None
+        self._reserved = 0.0  # tokens
+        self._allowed = 0.0
+        self._updated = monotonic()
+        self.set(reserve, cap)
+
+    def set(self, reserve=None, cap=None):
+        if (reserve is not None and reserve <= 0) or (cap is not None and cap <= 0):
+            raise ValueError(f"Expected positive rates, got {reserve=} {cap=}")
+        self.refill(monotonic())
+        self.reserve = reserve
+        self.cap = cap
+        self._reserved = min(self._reserved, self._size(reserve))
+        self._allowed = self._size(cap) if cap is not None else 0.0
+
+    def _size(self, rate):
+        return max(1.0, rate * self.period) if rate is not None else 0.0
+
+    def refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.reserve is not None:
+            self._reserved = min(
+                self._size(self.reserve), self._reserved + elapsed * self.reserve
+            )
+        if self.cap is not None:
+            self._allowed = min(
+                self._size(self.cap), self._allowed + elapsed * self.cap
+            )
+
+    @property
+    def reserved(self):
+        """whether a request can use the reservation"""
+        return self._reserved >= 1
+
+    @property
+    def capped(self):
+        """whether the class has reached its cap"""
+        return self.cap is not None and self._allowed < 1
+
+    def wait(self):
+        """seconds until the cap allows a request"""
+        return (1 - self._allowed) / self.cap if self.capped else 0.0
+
+    def take(self):
+        """use a request, and return whether it was reserved"""
+        if self.cap is not None:
+            self._allowed -= 1
+        if self.reserved:
+            self._reserved -= 1
+            return True
+        return False
+
+
+class Scheduler:
+    """
+    Collects jobs in any number of priority classes (0 = highest priority).
+
+    Jobs can be added from any thread. get() blocks until any class has a job.
+
+    :param weights: share of the dispatches per class (weighted fair queuing).
+    A weight of None means strict priority: the class preempts all weighted classes.
+    Without weights, all classes are strict (the highest non-empty class goes first).
+    :param edf: within a class, jobs are ordered earliest deadline first
+    (jobs without a deadline go last). Otherwise, jobs are first in, first out.
+    :param budgets: optional (reserve, cap) rates per class, in requests per second
+    (see Budget, and set_budget() to change them at runtime).
+    A class within its reservation goes before all other classes;
+    a class at its cap waits, even if nothing else is pending.
+    Reserved dispatches do not count towards the weighted share of a class.
+
+    The dispatch rate of each class is recorded per minute,
+    for the last `history` minutes (minutes without dispatches are left out).
+    """
+
+    history = 60
+
+    def __init__(self, classes, weights=None, edf=False, budgets=None):
+        if weights is None:
+            weights = [None] * classes
+        if len(weights) != classes or any(w is not None and w <= 0 for w in weights):
+            raise ValueError(f"Expected {classes} positive weights, got {weights}")
+        self.weights = list(weights)
+        self.edf = edf
+        self.served = [0] * classes
+        self._queues = [[] for _ in range(classes)]  # heaps of (deadline, n, job)
+        self._counter = count()  # first in, first out for equal deadlines
+        self._pending = 0
+        self._cond = threading.Condition()
+
+        # stride scheduling: the class with the lowest pass is next,
+        #  and each dispatch advances its pass by 1/weight
+        self._pass = [0.0] * classes
+        self._vtime = 0.0
+
+        self.budgets = [Budget() for _ in range(classes)]
+        for priority, budget in enumerate(budgets or []):
+            if budget is not None:
+                self.budgets[priority].set(*budget)
+        self.reserved = [0] * classes  # dispatches that used the reservation
+        self.capped = [0] * classes  # dispatches of other classes while capped
+        self._minute = None
+        self._dispatched = [0] * classes  # in the current minute
+        self._history = deque(maxlen=self.history)  # (timestamp, rates)
+
+    def __len__(self):
+        return self._pending
+
+    def put(self, priority, job, deadline=None):
+        if deadline is None or not self.edf:
+            deadline = float("inf")
+        with self._cond:
+            queue = self._queues[priority]
+            if not queue:
+                # idle classes do not save up credit
+                self._pass[priority] = max(self._pass[priority], self._vtime)
+            heappush(queue, (deadline, next(self._counter), job))
+            self._pending += 1
+            self._cond.notify()
+
+    def set_budget(self, priority, reserve=None, cap=None):
+        """set (or remove) the reserved and capped rate of a class"""
+        with self._cond:
+            self.budgets[priority].set(reserve, cap)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        Return the next (priority, job).
+        Blocks until a job is available, or returns None after timeout seconds.
+        """
+        end = None if timeout is None else monotonic() + timeout
+        with self._cond:
+            while True:
+                now = monotonic()
+                for budget in self.budgets:
+                    budget.refill(now)
+                priority, reserved, wait = self._select()
+                if priority is not None:
+                    break
+                if end is not None:
+                    if now >= end:
+                        return None
+                    wait = min(end - now, wait) if wait else end - now
+                # (nothing pending, or all pending classes are capped)
+                self._cond.wait(wait)
+            self._pending -= 1
+            self.served[priority] += 1
+            self.budgets[priority].take()
+            weight = self.weights[priority]
+            if reserved:
+                self.reserved[priority] += 1
+            elif weight is not None:
+                self._vtime = self._pass[priority]
+                self._pass[priority] += 1 / weight
+            self._account(priority)
+            return priority, heappop(self._queues[priority])[2]
+
+    def _select(self):
+        """
+        The priority class to take the next job from, whether it is reserved,
+        and the seconds to wait if all classes with jobs are capped.
+        """
+        best = None
+        wait = None
+        for priority, queue in enumerate(self._queues):
+            if not queue:
+                continue
+            budget = self.budgets[priority]
+            if budget.capped:
+                wait = budget.wait() if wait is None else min(wait, budget.wait())
+                continue
+            if budget.reserved:
+                return priority, True, None
+            if best is not None and self.weights[best] is None:
+                continue
+            if (
+                best is None
+                or self.weights[priority] is None
+                or self._pass[priority] < self._pass[best]
+            ):
+                best = priority
+        if best is not None:
+            for priority, queue in enumerate(self._queues):
+                if queue and self.budgets[priority].capped:
+                    self.capped[priority] += 1
+        return best, False, wait
+
+    def _account(self, priority):
+        minute = int(time() // 60)
+        if minute != self._minute:
+            if self._minute is not None:
+                rates = [round(n / 60, 3) for n in self._dispatched]
+                self._history.append((self._minute * 60, rates))
+            self._minute = minute
+            self._dispatched = [0] * len(self._dispatched)
+        self._dispatched[priority] += 1
+
+    def utilization(self):
+        """
+        The dispatch rate per class (requests per second, per minute),
+        and its fraction of the reserved rate of each class.
+        """
+        with self._cond:
+            history = list(self._history)
+        return [
+            {
+                "timestamp": timestamp,
+                "rates": rates,
+                "reserved": [
+                    round(rate / budget.reserve, 3) if budget.reserve else None
+                    for rate, budget in zip(rates, self.budgets)
+                ],
+            }
+            for timestamp, rates in history
+        ]
+
+    def stats(self):
+        with self._cond:
+            return {
+                "weights": list(self.weights),
+                "edf": self.edf,
+                "pending": [len(queue) for queue in self._queues],
+                "served": list(self.served),
+                "budgets": [
+                    {"reserve": budget.reserve, "cap": budget.cap}
+                    for budget in self.budgets
+                ],
+                "reserved": list(self.reserved),
+                "capped": list(self.capped),
+                "utilization": self.utilization(),
+            }
@@ -1,15 +1,20 @@
-from psycopg import connect
+import asyncio
+from functools import wraps
+
 from psycopg.rows import dict_row
 from psycopg.types.json import Jsonb
 
 from st2 import time
+from st2.db import db_conn, db_conn_async, db_execute, db_execute_async
 from st2.logging import logger
-from st2.request import RequestMp
+from st2.request import AsyncRequestMp, RequestMp
 
 
 class Ship(dict):
-    def __init__(self, symbol, qa_pairs, priority):
-        with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+    request_class = RequestMp
+
+    def __init__(self, symbol, qa_pairs, priority, tag=None):
+        with db_conn(dict_row) as conn:
             with conn.cursor() as cur:
                 data = cur.execute(
                     "SELECT * FROM ships WHERE symbol = %s", (symbol,)
@@ -18,7 +23,10 @@ class Ship(dict):
                     "SELECT token FROM agents WHERE symbol = %s", (data["agentSymbol"],)
                 ).fetchone()["token"]
         super().__init__(data)
-        self.request = RequestMp(qa_pairs, priority, token)
+        # API calls are attributed to the ship, unless tagged otherwise (e.g. its task)
+        self.request = self.request_class(
+            qa_pairs, priority, token, tag=tag or symbol, raw=True
+        )
 
     def name(self):
         return f'{self["registration"]["role"].capitalize()} {self["frame"]["name"].lower()} {self["symbol"]}'
@@ -59,33 +67,38 @@ class Ship(dict):
     #     updates = ", ".join([f"{key} = %s" for key in keys])
     #     query = f"UPDATE ships SET {updates} WHERE symbol = %s"
     #     params = [Jsonb(self[key]) for key in keys] + [self["symbol"]]
-    #     with connect("dbname=st2 user=postgres") as conn:
+    #     with db_conn() as conn:
     #         with conn.cursor() as cur:
     #             cur.execute(query, params)
 
     def _update(self, data):
+        db_execute(self._update_statements(data))
+
+    def _update_statements(self, data):
+        """update the local ship, and return the statements to update the database"""
         keys = set(data.keys()) & set(self.keys())
         keys.discard("symbol")
         for key in keys:
             self[key] = data[key]
 
-        with connect("dbname=st2 user=postgres") as conn:
-            with conn.cursor() as cur:
-                if keys:
-                    updates = ", ".join([f'"{key}" = %s' for key in keys])
-                    query = f"UPDATE ships SET {updates} WHERE symbol = %s"
-                    params = [Jsonb(self[key]) for key in keys] + [self["symbol"]]
-                    cur.execute(query, params)
-
-                if "agent" in data:
-                    agent = data["agent"]
-                    cur.execute(
-                        """
-                        INSERT INTO agents_public
-                        ("accountId", "symbol", "headquarters", "credits",
-                         "startingFaction", "shipCount", "timestamp")
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """,
+        statements = []
+        if keys:
+            updates = ", ".join([f'"{key}" = %s' for key in keys])
+            query = f"UPDATE ships SET {updates} WHERE symbol = %s"
+            params = [Jsonb(self[key]) for key in keys] + [self["symbol"]]
+            statements.append((query, [params]))
+
+        if "agent" in data:
+            agent = data["agent"]
+            statements.append(
+                (
+                    """
+                    INSERT INTO agents_public
+                    ("accountId", "symbol", "headquarters", "credits",
+                     "startingFaction", "shipCount", "timestamp")
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    [
                         (
                             agent["accountId"],
                             agent["symbol"],
@@ -94,20 +107,24 @@ class Ship(dict):
                             agent["startingFaction"],
                             agent["shipCount"],
                             time.now(),
-                        ),
-                    )
-
-                if "transaction" in data:
-                    # TODO: fails with repair-/scrap-/modificationTransaction
-                    transaction = data["transaction"]
-                    cur.execute(
-                        """
-                        INSERT INTO market_transactions
-                        ("waypointSymbol", "systemSymbol", "shipSymbol", "tradeSymbol",
-                         "type", "units", "pricePerUnit", "totalPrice", "timestamp")
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING
-                        """,
+                        )
+                    ],
+                )
+            )
+
+        if "transaction" in data:
+            # TODO: fails with repair-/scrap-/modificationTransaction
+            transaction = data["transaction"]
+            statements.append(
+                (
+                    """
+                    INSERT INTO market_transactions
+                    ("waypointSymbol", "systemSymbol", "shipSymbol", "tradeSymbol",
+                     "type", "units", "pricePerUnit", "totalPrice", "timestamp")
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING
+                    """,
+                    [
                         (
                             transaction["waypointSymbol"],
                             self["nav"]["systemSymbol"],
@@ -118,34 +135,43 @@ class Ship(dict):
                             transaction["pricePerUnit"],
                             transaction["totalPrice"],
                             time.read(transaction["timestamp"]),
-                        ),
-                    )
-
-                for event in data.get("events", []):
-                    # TODO: use self.refresh() to get the condition after?
-                    activity = None
-                    if "fuel" in data:
-                        activity = "navigate"
-                    elif "extraction" in data:
-                        activity = "extract"
-                    elif "siphon" in data:
-                        activity = "siphon"
-                    condition = self[event["component"].lower()]["condition"]
-                    cur.execute(
-                        """
-                        INSERT INTO events
-                        (symbol, "shipSymbol", activity, component, condition, timestamp)
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        """,
-                        (
-                            event["symbol"],
-                            self["symbol"],
-                            activity,
-                            event["component"],
-                            condition,
-                            time.now(),
-                        ),
-                    )
+                        )
+                    ],
+                )
+            )
+
+        events = []
+        for event in data.get("events", []):
+            # TODO: use self.refresh() to get the condition after?
+            activity = None
+            if "fuel" in data:
+                activity = "navigate"
+            elif "extraction" in data:
+                activity = "extract"
+            elif "siphon" in data:
+                activity = "siphon"
+            condition = self[event["component"].lower()]["condition"]
+            events.append(
+                (
+                    event["symbol"],
+                    self["symbol"],
+                    activity,
+                    event["component"],
+                    condition,
+                    time.now(),
+                )
+            )
+        statements.append(
+            (
+                """
+                INSERT INTO events
+                (symbol, "shipSymbol", activity, component, condition, timestamp)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """,
+                events,
+            )
+        )
+        return statements
 
     def dock(self):
         self._nav_status()
@@ -161,18 +187,23 @@ class Ship(dict):
 
     def _nav_status(self):
         """update IN_TRANSIT if the ship has arrived"""
+        if data := self._arrival():
+            self._update(data)
+
+    def _arrival(self):
+        """the update of an IN_TRANSIT ship that has arrived (or None)"""
         if self["nav"]["status"] == "IN_TRANSIT":
             if self.nav_remaining() == 0:
                 data = {"nav": self["nav"]}
                 data["nav"]["status"] = "IN_ORBIT"
-                self._update(data)
+                return data
 
     def refresh(self, online=True):
         if online:
             data = self.request.get(f'my/ships/{self["symbol"]}')["data"]
             self._update(data)
         else:
-            with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+            with db_conn(dict_row) as conn:
                 with conn.cursor() as cur:
                     data = cur.execute(
                         "SELECT * FROM ships WHERE symbol = %s", (self["symbol"],)
@@ -206,12 +237,123 @@ class Ship(dict):
     from ._shipyard import shipyard
 
 
+def _in_thread(action):
+    """
+    An awaitable AsyncShip action that runs the Ship action in a thread,
+    on a blocking copy of the ship (see AsyncShip._blocking).
+    """
+
+    @wraps(action)
+    async def awaitable(self, *args, **kwargs):
+        ship = self._blocking()
+        try:
+            return await asyncio.to_thread(action, ship, *args, **kwargs)
+        finally:
+            self.update(ship)
+
+    return awaitable
+
+
+class AsyncShip(Ship):
+    """
+    Ship for coroutines: the API actions used by the ai coroutines
+    (refresh, dock, orbit, navigate, nav_patch, refuel, market, shipyard, buy_ship)
+    are awaitable, so the event loop keeps running while they wait for the API
+    and the database (with the async connection pool).
+    The other actions (e.g. buy, sell, extract) are awaitable too:
+    they run the Ship action in a thread, with a blocking request.
+    ship.request.sync is a blocking request for other classes (e.g. System).
+    In a coroutine, create the ship with `await AsyncShip.load(...)`
+    (the ship is read from the database in a thread).
+    """
+
+    request_class = AsyncRequestMp
+
+    @classmethod
+    async def load(cls, symbol, qa_pairs, priority, tag=None):
+        """the ship, created in a thread (see Ship.__init__)"""
+        return await asyncio.to_thread(cls, symbol, qa_pairs, priority, tag)
+
+    def _blocking(self):
+        """a Ship with the same data and a blocking request"""
+        ship = Ship.__new__(Ship)
+        ship.update(self)
+        ship.request = self.request.sync
+        return ship
+
+    async def _update_async(self, data):
+        await db_execute_async(self._update_statements(data))
+
+    async def _nav_status(self):
+        """update IN_TRANSIT if the ship has arrived"""
+        if data := self._arrival():
+            await self._update_async(data)
+
+    async def dock(self):
+        await self._nav_status()
+        if self["nav"]["status"] == "IN_ORBIT":
+            data = (await self.request.post(f'my/ships/{self["symbol"]}/dock'))["data"]
+            await self._update_async(data)
+
+    async def orbit(self):
+        await self._nav_status()
+        if self["nav"]["status"] == "DOCKED":
+            data = (await self.request.post(f'my/ships/{self["symbol"]}/orbit'))["data"]
+            await self._update_async(data)
+
+    async def refresh(self, online=True):
+        if online:
+            data = (await self.request.get(f'my/ships/{self["symbol"]}'))["data"]
+            await self._update_async(data)
+        else:
+            async with db_conn_async(dict_row) as conn:
+                cur = await conn.execute(
+                    "SELECT * FROM ships WHERE symbol = %s", (self["symbol"],)
+                )
+                for k, v in (await cur.fetchone()).items():
+                    self[k] = v
+
+    async def buy_ship(self, ship_type, verbose=True):
+        """
+        Purchase the specified ship_type at the current waypoint's shipyard.
+        Returns the new ship instance.
+        """
+        ship_symbol = await buy_ship_async(
+            ship_type,
+            self["nav"]["waypointSymbol"],
+            self["agentSymbol"],
+            self.request,
+            verbose,
+        )
+        await self.shipyard()
+        return ship_symbol
+
+    # import methods
+    from ._fuel import refuel_async as refuel
+    from ._market import market_async as market
+    from ._nav import nav_patch_async as nav_patch
+    from ._nav import navigate_async as navigate
+    from ._shipyard import shipyard_async as shipyard
+
+    buy = _in_thread(Ship.buy)
+    sell = _in_thread(Ship.sell)
+    transfer = _in_thread(Ship.transfer)
+    jettison = _in_thread(Ship.jettison)
+    supply = _in_thread(Ship.supply)
+    contract = _in_thread(Ship.contract)
+    deliver = _in_thread(Ship.deliver)
+    chart = _in_thread(Ship.chart)
+    extract = _in_thread(Ship.extract)
+    siphon = _in_thread(Ship.siphon)
+    survey = _in_thread(Ship.survey)
+    jump = _in_thread(Ship.jump)
+
+
 def buy_ship(ship_type, waypoint_symbol, agent_symbol, request, verbose=True):
     """
     Purchase the specified ship_type at the current waypoint's shipyard.
     Returns the new ship instance.
     """
-    system_symbol = waypoint_symbol.rsplit("-", 1)[0]
     data = request.post(
         f"my/ships",
         data={
@@ -219,18 +361,45 @@ def buy_ship(ship_type, waypoint_symbol, agent_symbol, request, verbose=True):
             "waypointSymbol": waypoint_symbol,
         },
     )["data"]
+    db_execute(_bought_ship_statements(data, waypoint_symbol, agent_symbol))
+    return _bought_ship(data, waypoint_symbol, verbose)
 
-    with connect("dbname=st2 user=postgres") as conn:
-        with conn.cursor() as cur:
-            ship = data["ship"]
-            ship["cooldown"]["expiration"] = time.write()
-            cur.execute(
-                """
-                INSERT INTO ships
-                ("symbol", "agentSymbol", "nav", "crew", "fuel", "cooldown", "frame",
-                 "reactor", "engine", "modules", "mounts", "registration", "cargo")
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
+
+async def buy_ship_async(
+    ship_type, waypoint_symbol, agent_symbol, request, verbose=True
+):
+    """
+    Purchase the specified ship_type at the current waypoint's shipyard.
+    Returns the new ship instance. (request: AsyncRequestMp)
+    """
+    data = (
+        await request.post(
+            f"my/ships",
+            data={
+                "shipType": ship_type,
+                "waypointSymbol": waypoint_symbol,
+            },
+        )
+    )["data"]
+    await db_execute_async(_bought_ship_statements(data, waypoint_symbol, agent_symbol))
+    return _bought_ship(data, waypoint_symbol, verbose)
+
+
+def _bought_ship_statements(data, waypoint_symbol, agent_symbol):
+    system_symbol = waypoint_symbol.rsplit("-", 1)[0]
+    ship = data["ship"]
+    ship["cooldown"]["expiration"] = time.write()
+    agent = data["agent"]
+    transaction = data["transaction"]
+    return [
+        (
+            """
+            INSERT INTO ships
+            ("symbol", "agentSymbol", "nav", "crew", "fuel", "cooldown", "frame",
+             "reactor", "engine", "modules", "mounts", "registration", "cargo")
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            [
                 (
                     ship["symbol"],
                     agent_symbol,
@@ -245,24 +414,24 @@ def buy_ship(ship_type, waypoint_symbol, agent_symbol, request, verbose=True):
                     Jsonb(ship["mounts"]),
                     Jsonb(ship["registration"]),
                     Jsonb(ship["cargo"]),
-                ),
-            )
-            cur.execute(
-                """
-                INSERT INTO tasks ("symbol", "agentSymbol", "current", "queued", "cancel", "pname", "pid")
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
-                (ship["symbol"], agent_symbol, None, None, False, None, None),
-            )
-
-            agent = data["agent"]
-            cur.execute(
-                """
-                INSERT INTO agents_public
-                ("accountId", "symbol", "headquarters", "credits",
-                 "startingFaction", "shipCount", "timestamp")
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
+                )
+            ],
+        ),
+        (
+            """
+            INSERT INTO tasks ("symbol", "agentSymbol", "current", "queued", "cancel", "pname", "pid")
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            [(ship["symbol"], agent_symbol, None, None, False, None, None)],
+        ),
+        (
+            """
+            INSERT INTO agents_public
+            ("accountId", "symbol", "headquarters", "credits",
+             "startingFaction", "shipCount", "timestamp")
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """,
+            [
                 (
                     agent["accountId"],
                     agent["symbol"],
@@ -271,18 +440,18 @@ def buy_ship(ship_type, waypoint_symbol, agent_symbol, request, verbose=True):
                     agent["startingFaction"],
                     agent["shipCount"],
                     time.now(),
-                ),
-            )
-
-            transaction = data["transaction"]
-            cur.execute(
-                """
-                INSERT INTO shipyard_transactions
-                ("waypointSymbol", "systemSymbol", "shipSymbol",
-                 "agentSymbol", "shipType", "price", "timestamp")
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING
-                """,
+                )
+            ],
+        ),
+        (
+            """
+            INSERT INTO shipyard_transactions
+            ("waypointSymbol", "systemSymbol", "shipSymbol",
+             "agentSymbol", "shipType", "price", "timestamp")
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+            ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING
+            """,
+            [
                 (
                     transaction["waypointSymbol"],
                     system_symbol,
@@ -291,9 +460,14 @@ def buy_ship(ship_type, waypoint_symbol, agent_symbol, request, verbose=True):
                     transaction["shipType"],
                     transaction["price"],
                     time.read(transaction["timestamp"]),
-                ),
-            )
+                )
+            ],
+        ),
+    ]
+
 
+def _bought_ship(data, waypoint_symbol, verbose):
+    ship = data["ship"]
     if verbose:
         logger.info(
             f'{ship["registration"]["role"].capitalize()} {ship["frame"]["name"].lower()} {ship["symbol"]} '
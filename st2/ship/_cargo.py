@@ -1,6 +1,6 @@
-from psycopg import connect
 from psycopg.types.json import Jsonb
 
+from st2.db import db_conn
 from st2.logging import logger
 
 
@@ -40,13 +40,13 @@ def sell(self, symbol, units, verbose=True):
 
 
 def _get_trade_volume(self, symbol):
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
-                SELECT "tradeVolume" 
-                FROM market_tradegoods 
-                WHERE "waypointSymbol" = %s 
+                SELECT "tradeVolume"
+                FROM market_latest
+                WHERE "waypointSymbol" = %s
                 AND symbol = %s
                 """,
                 (self["nav"]["waypointSymbol"], symbol),
@@ -79,7 +79,7 @@ def transfer(self, symbol, units, ship, verbose=True):
     """Transfer cargo between ships"""
     # match the status of the target ship
     if isinstance(ship, str):
-        with connect("dbname=st2 user=postgres") as conn:
+        with db_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     "SELECT * FROM ships WHERE symbol = %s",
@@ -117,7 +117,7 @@ def transfer(self, symbol, units, ship, verbose=True):
     else:
         ship["cargo"]["inventory"].append(md_good)  # noqa
     ship["cargo"]["units"] += units
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 f"UPDATE ships SET cargo = %s WHERE symbol = %s",
@@ -1,7 +1,7 @@
-from psycopg import connect
 from psycopg.types.json import Jsonb
 
 from st2 import time
+from st2.db import db_conn
 from st2.logging import logger
 
 
@@ -12,7 +12,7 @@ def contract(self):
     data = self.request.post(f'my/ships/{self["symbol"]}/negotiate/contract')["data"][
         "contract"
     ]
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -44,7 +44,7 @@ def deliver(self, symbol, units, contract, verbose=True):
     )["data"]
     self._update(data)
 
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -8,3 +8,17 @@ def refuel(self, units=None, from_cargo=False):
         payload["units"] = units
     data = self.request.post(f'my/ships/{self["symbol"]}/refuel', data=payload)["data"]
     self._update(data)
+
+
+async def refuel_async(self, units=None, from_cargo=False):
+    """Refuel your ship by buying fuel from the local market (awaitable, see AsyncShip).
+    1 unit of FUEL on the market adds 100 units fuel to the ship."""
+    await self.dock()
+
+    payload = {"fromCargo": from_cargo}
+    if units:
+        payload["units"] = units
+    data = (await self.request.post(f'my/ships/{self["symbol"]}/refuel', data=payload))[
+        "data"
+    ]
+    await self._update_async(data)
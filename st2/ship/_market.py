@@ -1,74 +1,122 @@
-from psycopg import connect
-
 from st2 import time
+from st2.db import Insert, db_execute, db_execute_async
+
+MARKETS = Insert(
+    "markets",
+    ["symbol", "systemSymbol", "imports", "exports", "exchange"],
+    'ON CONFLICT ("symbol") DO NOTHING',
+)
+TRADEGOOD_COLUMNS = [
+    "waypointSymbol",
+    "systemSymbol",
+    "symbol",
+    "tradeVolume",
+    "type",
+    "supply",
+    "activity",
+    "purchasePrice",
+    "sellPrice",
+    "timestamp",
+]
+TRADEGOODS = Insert(
+    "market_tradegoods",
+    TRADEGOOD_COLUMNS,
+    'ON CONFLICT ("waypointSymbol", "symbol", "timestamp") DO NOTHING',
+)
+# the latest snapshot of each trade good (not replaced by older snapshots)
+LATEST = Insert(
+    "market_latest",
+    TRADEGOOD_COLUMNS,
+    'ON CONFLICT ("waypointSymbol", "symbol") DO UPDATE SET '
+    + ", ".join(f'"{c}" = excluded."{c}"' for c in TRADEGOOD_COLUMNS[3:])
+    + ' WHERE market_latest."timestamp" <= excluded."timestamp"',
+)
+TRANSACTIONS = Insert(
+    "market_transactions",
+    [
+        "waypointSymbol",
+        "systemSymbol",
+        "shipSymbol",
+        "tradeSymbol",
+        "type",
+        "units",
+        "pricePerUnit",
+        "totalPrice",
+        "timestamp",
+    ],
+    'ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING',
+)
 
 
 def market(self):
     """get all marketplace details"""
+    data = self.request.get(_market_endpoint(self))["data"]
+    db_execute(_market_statements(self, data))
+    return data
+
+
+async def market_async(self):
+    """get all marketplace details (awaitable, see AsyncShip)"""
+    data = (await self.request.get(_market_endpoint(self)))["data"]
+    await db_execute_async(_market_statements(self, data))
+    return data
+
+
+def _market_endpoint(self):
+    waypoint_symbol = self["nav"]["waypointSymbol"]
+    system_symbol = self["nav"]["systemSymbol"]
+    return f"systems/{system_symbol}/waypoints/{waypoint_symbol}/market"
+
+
+def _market_statements(self, data):
     waypoint_symbol = self["nav"]["waypointSymbol"]
     system_symbol = self["nav"]["systemSymbol"]
-    data = self.request.get(
-        f"systems/{system_symbol}/waypoints/{waypoint_symbol}/market",
-    )["data"]
     timestamp = time.now()
-    with connect("dbname=st2 user=postgres") as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO markets
-                ("symbol", "systemSymbol", "imports", "exports", "exchange")
-                VALUES (%s, %s, %s, %s, %s)
-                ON CONFLICT ("symbol") DO NOTHING
-                """,
+    tradegoods = [
+        (
+            waypoint_symbol,
+            system_symbol,
+            t["symbol"],
+            t["tradeVolume"],
+            t["type"],
+            t["supply"],
+            t.get("activity"),
+            t["purchasePrice"],
+            t["sellPrice"],
+            timestamp,
+        )
+        for t in data.get("tradeGoods", [])
+    ]
+    return [
+        (
+            MARKETS,
+            [
                 (
                     waypoint_symbol,
                     system_symbol,
                     [good["symbol"] for good in data["imports"]],
                     [good["symbol"] for good in data["exports"]],
                     [good["symbol"] for good in data["exchange"]],
-                ),
-            )
-            for t in data.get("tradeGoods", []):
-                cur.execute(
-                    """
-                    INSERT INTO market_tradegoods
-                    ("waypointSymbol", "systemSymbol", "symbol", "tradeVolume", "type",
-                     "supply", "activity", "purchasePrice", "sellPrice", "timestamp")
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT ("waypointSymbol", "symbol", "timestamp") DO NOTHING
-                    """,
-                    (
-                        waypoint_symbol,
-                        system_symbol,
-                        t["symbol"],
-                        t["tradeVolume"],
-                        t["type"],
-                        t["supply"],
-                        t.get("activity"),
-                        t["purchasePrice"],
-                        t["sellPrice"],
-                        timestamp,
-                    ),
                 )
-            for t in data.get("transactions", []):
-                cur.execute(
-                    """
-                    INSERT INTO market_transactions
-                    ("waypointSymbol", "systemSymbol", "shipSymbol", "tradeSymbol",
-                     "type", "units", "pricePerUnit", "totalPrice", "timestamp")
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING
-                    """,
-                    (
-                        waypoint_symbol,
-                        system_symbol,
-                        t["shipSymbol"],
-                        t["tradeSymbol"],
-                        t["type"],
-                        t["units"],
-                        t["pricePerUnit"],
-                        t["totalPrice"],
-                        time.read(t["timestamp"]),
-                    ),
+            ],
+        ),
+        (TRADEGOODS, tradegoods),
+        (LATEST, tradegoods),
+        (
+            TRANSACTIONS,
+            [
+                (
+                    waypoint_symbol,
+                    system_symbol,
+                    t["shipSymbol"],
+                    t["tradeSymbol"],
+                    t["type"],
+                    t["units"],
+                    t["pricePerUnit"],
+                    t["totalPrice"],
+                    time.read(t["timestamp"]),
                 )
-    return data
+                for t in data.get("transactions", [])
+            ],
+        ),
+    ]
@@ -1,11 +1,12 @@
-from psycopg import connect
 from psycopg.types.json import Jsonb
 
+from st2.db import db_conn
+
 
 def chart(self):
     """Command a ship to chart the waypoint at its current location."""
     data = self.request.post(f'my/ships/{self["symbol"]}/chart')["data"]["waypoint"]
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             # cur.execute(
             #     """
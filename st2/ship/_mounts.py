@@ -1,6 +1,6 @@
-from psycopg import connect
 from psycopg.types.json import Jsonb
 
+from st2.db import db_conn
 from st2.logging import logger
 
 
@@ -73,7 +73,7 @@ def extract(self, survey=None, verbose=True):
         if m["symbol"].startswith("MOUNT_MINING_LASER_")
     ][0]
     cargo_full = self["cargo"]["units"] == self["cargo"]["capacity"]
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -122,7 +122,7 @@ def siphon(self, verbose=True):
         if m["symbol"].startswith("MOUNT_GAS_SIPHON_")
     ][0]
     cargo_full = self["cargo"]["units"] == self["cargo"]["capacity"]
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
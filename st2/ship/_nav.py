@@ -1,8 +1,7 @@
 import math
 
-from psycopg import connect
-
 from st2 import time
+from st2.db import db_execute, db_execute_async
 from st2.logging import logger
 
 
@@ -21,8 +20,24 @@ def navigate(self, waypoint, verbose=True):
     data = self.request.post(
         f'my/ships/{self["symbol"]}/navigate', data={"waypointSymbol": waypoint}
     )["data"]
-    self._update(data)
+    db_execute(self._update_statements(data) + _navigation_statements(self))
+    _navigated(self, data, waypoint, verbose)
+
+
+async def navigate_async(self, waypoint, verbose=True):
+    """navigate to a waypoint in the same system (awaitable, see AsyncShip)"""
+    await self.orbit()
+
+    data = (
+        await self.request.post(
+            f'my/ships/{self["symbol"]}/navigate', data={"waypointSymbol": waypoint}
+        )
+    )["data"]
+    await db_execute_async(self._update_statements(data) + _navigation_statements(self))
+    _navigated(self, data, waypoint, verbose)
+
 
+def _navigation_statements(self):
     # Log travel distance/travel time/fuel use etc.
     origin = self["nav"]["route"]["origin"]
     destination = self["nav"]["route"]["destination"]
@@ -35,17 +50,17 @@ def navigate(self, waypoint, verbose=True):
     t0 = time.read(self["nav"]["route"]["departureTime"])
     t1 = time.read(self["nav"]["route"]["arrival"])
     travel_time = (t1 - t0).seconds
-    with connect("dbname=st2 user=postgres") as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO navigation
-                ("distance", "time", "fuel", "flightMode", "speed",
-                "frame", "frame_condition", "frame_integrity", 
-                "reactor", "reactor_condition", "reactor_integrity", 
-                "engine", "engine_condition", "engine_integrity")
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """,
+    return [
+        (
+            """
+            INSERT INTO navigation
+            ("distance", "time", "fuel", "flightMode", "speed",
+            "frame", "frame_condition", "frame_integrity", 
+            "reactor", "reactor_condition", "reactor_integrity", 
+            "engine", "engine_condition", "engine_integrity")
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """,
+            [
                 (
                     distance,
                     travel_time,
@@ -61,9 +76,13 @@ def navigate(self, waypoint, verbose=True):
                     self["engine"]["symbol"],
                     self["engine"]["condition"],
                     self["engine"]["integrity"],
-                ),
-            )
+                )
+            ],
+        )
+    ]
 
+
+def _navigated(self, data, waypoint, verbose):
     if verbose:
         t2 = round(self.nav_remaining())
         logger.info(f"{self.name()} will arrive at {waypoint} in {t2}s")
@@ -83,6 +102,18 @@ def nav_patch(self, mode):
         self._update({"nav": nav})
 
 
+async def nav_patch_async(self, mode):
+    """update the nav configuration of the ship (awaitable, see AsyncShip)"""
+    if mode != self["nav"]["flightMode"]:
+        nav = (
+            await self.request.patch(
+                f'my/ships/{self["symbol"]}/nav',
+                data={"flightMode": mode},
+            )
+        )["data"]
+        await self._update_async({"nav": nav})
+
+
 def jump(self, waypoint, verbose=True):
     self.orbit()
 
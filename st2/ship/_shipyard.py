@@ -1,71 +1,114 @@
-from psycopg import connect
-
 from st2 import time
+from st2.db import Insert, db_execute, db_execute_async
+
+SHIPYARDS = Insert(
+    "shipyards",
+    ["symbol", "systemSymbol", "shipTypes", "modificationsFee"],
+    'ON CONFLICT ("symbol") DO NOTHING',
+)
+SHIP_COLUMNS = [
+    "waypointSymbol",
+    "systemSymbol",
+    "type",
+    "supply",
+    "activity",
+    "purchasePrice",
+    "timestamp",
+]
+SHIPS = Insert(
+    "shipyard_ships",
+    SHIP_COLUMNS,
+    'ON CONFLICT ("waypointSymbol", "type", "timestamp") DO NOTHING',
+)
+# the latest snapshot of each ship type (not replaced by older snapshots)
+LATEST = Insert(
+    "shipyard_latest",
+    SHIP_COLUMNS,
+    'ON CONFLICT ("waypointSymbol", "type") DO UPDATE SET '
+    + ", ".join(f'"{c}" = excluded."{c}"' for c in SHIP_COLUMNS[3:])
+    + ' WHERE shipyard_latest."timestamp" <= excluded."timestamp"',
+)
+TRANSACTIONS = Insert(
+    "shipyard_transactions",
+    [
+        "waypointSymbol",
+        "systemSymbol",
+        "shipSymbol",
+        "agentSymbol",
+        "shipType",
+        "price",
+        "timestamp",
+    ],
+    'ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING',
+)
 
 
 def shipyard(self):
     """get all shipyard details"""
+    data = self.request.get(_shipyard_endpoint(self))["data"]
+    db_execute(_shipyard_statements(self, data))
+    return data
+
+
+async def shipyard_async(self):
+    """get all shipyard details (awaitable, see AsyncShip)"""
+    data = (await self.request.get(_shipyard_endpoint(self)))["data"]
+    await db_execute_async(_shipyard_statements(self, data))
+    return data
+
+
+def _shipyard_endpoint(self):
+    waypoint_symbol = self["nav"]["waypointSymbol"]
+    system_symbol = self["nav"]["systemSymbol"]
+    return f"systems/{system_symbol}/waypoints/{waypoint_symbol}/shipyard"
+
+
+def _shipyard_statements(self, data):
     waypoint_symbol = self["nav"]["waypointSymbol"]
     system_symbol = self["nav"]["systemSymbol"]
-    data = self.request.get(
-        f'systems/{self["nav"]["systemSymbol"]}/waypoints/{self["nav"]["waypointSymbol"]}/shipyard',
-    )["data"]
     timestamp = time.now()
-    with connect("dbname=st2 user=postgres") as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                """
-                INSERT INTO shipyards
-                ("symbol", "systemSymbol", "shipTypes", "modificationsFee")
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT ("symbol") DO NOTHING
-                """,
+    ships = [
+        (
+            waypoint_symbol,
+            system_symbol,
+            s["type"],
+            s["supply"],
+            s["activity"],
+            s["purchasePrice"],
+            timestamp,
+        )
+        for s in data.get("ships", [])
+    ]
+    return [
+        (
+            SHIPYARDS,
+            [
                 (
                     waypoint_symbol,
                     system_symbol,
                     [ship["type"] for ship in data["shipTypes"]],
                     data["modificationsFee"],
-                ),
-            )
-            for s in data.get("ships", []):
-                cur.execute(
-                    """
-                    INSERT INTO shipyard_ships
-                    ("waypointSymbol", "systemSymbol", "type",
-                     "supply", "activity", "purchasePrice", "timestamp")
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT ("waypointSymbol", "type", "timestamp") DO NOTHING
-                    """,
-                    (
-                        waypoint_symbol,
-                        system_symbol,
-                        s["type"],
-                        s["supply"],
-                        s["activity"],
-                        s["purchasePrice"],
-                        timestamp,
-                    ),
                 )
-            for s in data.get("transactions", []):
-                cur.execute(
-                    """
-                    INSERT INTO shipyard_transactions
-                    ("waypointSymbol", "systemSymbol", "shipSymbol",
-                     "agentSymbol", "shipType", "price", "timestamp")
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT ("waypointSymbol", "timestamp") DO NOTHING
-                    """,
-                    (
-                        waypoint_symbol,
-                        system_symbol,
-                        s["shipSymbol"],
-                        s["agentSymbol"],
-                        s["shipType"],
-                        s["price"],
-                        time.read(s["timestamp"]),
-                    ),
+            ],
+        ),
+        (SHIPS, ships),
+        (LATEST, ships),
+        (
+            TRANSACTIONS,
+            [
+                (
+                    waypoint_symbol,
+                    system_symbol,
+                    s["shipSymbol"],
+                    s["agentSymbol"],
+                    s["shipType"],
+                    s["price"],
+                    time.read(s["timestamp"]),
                 )
-    return data
+                for s in data.get("transactions", [])
+            ],
+        ),
+    ]
 
 
 # def repair(self, quote=True, verbose=True, log=True):
@@ -1,6 +1,5 @@
-from psycopg import connect
-
 from st2.agent import register_random_agent
+from st2.db import db_conn
 from st2.logging import logger
 from st2.system import System
 
@@ -14,7 +13,7 @@ def spymaster(request, priority=3):
     # get a dict of start systems per faction
     faction2start_system2agent = {}
     faction2hq = {}
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
@@ -46,7 +45,7 @@ def spymaster(request, priority=3):
 
     # get agents for each start system per faction
     role = "spy"
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             for faction in faction2start_system2agent:
                 if DEBUG:
@@ -101,7 +100,7 @@ def spymaster(request, priority=3):
     # (Re)start the seeding & probing of each system
     pname = "probes"  # TODO: where to start/host the probe/seed process(?)
     system = None
-    with connect("dbname=st2 user=postgres") as conn:
+    with db_conn() as conn:
         with conn.cursor() as cur:
             for faction in faction2start_system2agent:
                 for system_symbol, agent_symbol in faction2start_system2agent[
@@ -1,19 +1,27 @@
 import math
 
-from psycopg import connect
 from psycopg.types.json import Jsonb
 
 from st2.agent import api_agent
+from st2.db import Insert, db_conn, db_execute
 from st2.db.static.traits import TRAITS_WAYPOINT
 from st2.logging import logger
 
 DEBUG = False
+SYSTEMS = Insert(
+    "systems", ["symbol", "type", "x", "y"], "ON CONFLICT (symbol) DO NOTHING"
+)
+WAYPOINTS = Insert(
+    "waypoints",
+    ["symbol", "systemSymbol", "type", "x", "y", "orbits", "orbitals"],
+    'ON CONFLICT ("symbol") DO NOTHING',
+)
 
 
 def astronomer(request, priority=3, token=None):
     if token is None:
         token = api_agent(request, priority)[1]
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS astronomer 
@@ -26,90 +34,86 @@ def astronomer(request, priority=3, token=None):
         )
         cur.execute("SELECT * FROM astronomer")
         ret = cur.fetchone()
-        if ret is None:
-            total = request.get(
-                endpoint="systems",
-                priority=priority,
-                token=token,
-                params={"page": 1, "limit": 1},
-            )["meta"]["total"]
-            current = 0
-            page = 1
-            cur.execute(
-                """
-                INSERT INTO astronomer
-                (total, current, page)
-                VALUES (%s, %s, %s)
-                """,
-                (total, current, page),
-            )
-            conn.commit()
-        else:
-            total, current, page = ret
-
-        if current == total:
-            return
-
-        logger.info(f"The Astronomer has found {total:_} stars in the night sky")
-        total_pages = math.ceil(total / 20)
-        while current < total:
-            if DEBUG:
-                logger.debug(f"Processing page {page:_}/{total_pages}")
-            systems = request.get(
-                endpoint="systems",
-                priority=priority,
-                token=token,
-                params={"page": page, "limit": 20},
-            )
-            for s in systems["data"]:
-                system_symbol = s["symbol"]
-                cur.execute(
+    if ret is None:
+        total = request.get(
+            endpoint="systems",
+            priority=priority,
+            token=token,
+            params={"page": 1, "limit": 1},
+        )["meta"]["total"]
+        current = 0
+        page = 1
+        db_execute(
+            [
+                (
                     """
-                    INSERT INTO systems 
-                    (symbol, type, x, y)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (symbol) DO NOTHING
+                    INSERT INTO astronomer
+                    (total, current, page)
+                    VALUES (%s, %s, %s)
                     """,
-                    (system_symbol, s["type"], s["x"], s["y"]),
+                    [(total, current, page)],
                 )
+            ]
+        )
+    else:
+        total, current, page = ret
 
-                # update waypoints (with very limited fields)
-                waypoints = {}
-                for wp in s["waypoints"]:
-                    waypoints[wp["symbol"]] = wp
-                for waypoints_symbol in sorted(waypoints):
-                    wp = waypoints[waypoints_symbol]
-                    orbits = wp.get("orbits")
-                    orbitals = [o["symbol"] for o in wp["orbitals"]]
-                    cur.execute(
-                        """
-                        INSERT INTO waypoints
-                        ("symbol", "systemSymbol", "type", "x", "y", "orbits", "orbitals")
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        ON CONFLICT ("symbol") DO NOTHING
-                        """,
-                        (
-                            waypoints_symbol,
-                            system_symbol,
-                            wp["type"],
-                            wp["x"],
-                            wp["y"],
-                            orbits,
-                            orbitals,
-                        ),
+    if current == total:
+        return
+
+    logger.info(f"The Astronomer has found {total:_} stars in the night sky")
+    total_pages = math.ceil(total / 20)
+    while current < total:
+        if DEBUG:
+            logger.debug(f"Processing page {page:_}/{total_pages}")
+        systems = request.get(
+            endpoint="systems",
+            priority=priority,
+            token=token,
+            params={"page": page, "limit": 20},
+        )
+        system_rows = []
+        waypoint_rows = []
+        for s in systems["data"]:
+            system_symbol = s["symbol"]
+            system_rows.append((system_symbol, s["type"], s["x"], s["y"]))
+
+            # update waypoints (with very limited fields)
+            waypoints = {}
+            for wp in s["waypoints"]:
+                waypoints[wp["symbol"]] = wp
+            for waypoints_symbol in sorted(waypoints):
+                wp = waypoints[waypoints_symbol]
+                orbits = wp.get("orbits")
+                orbitals = [o["symbol"] for o in wp["orbitals"]]
+                waypoint_rows.append(
+                    (
+                        waypoints_symbol,
+                        system_symbol,
+                        wp["type"],
+                        wp["x"],
+                        wp["y"],
+                        orbits,
+                        orbitals,
                     )
-                current += 1
-            page += 1
-            # log progress
-            cur.execute(
-                """
-                UPDATE astronomer
-                SET current = %s, page = %s
-                WHERE total = %s
-                """,
-                (current, page, total),
-            )
-            conn.commit()
+                )
+            current += 1
+        page += 1
+        # the systems and waypoints of the page in bulk, and the progress
+        db_execute(
+            [
+                (SYSTEMS, system_rows),
+                (WAYPOINTS, waypoint_rows),
+                (
+                    """
+                    UPDATE astronomer
+                    SET current = %s, page = %s
+                    WHERE total = %s
+                    """,
+                    [(current, page, total)],
+                ),
+            ]
+        )
     logger.info(f"The Astronomer has completed its chart!")
 
 
@@ -120,7 +124,7 @@ def cartographer(request, priority=3, token=None, chart="start systems"):
     if token is None:
         token = api_agent(request, priority)[1]
     completed = False
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             """
             CREATE TABLE IF NOT EXISTS cartographer 
@@ -164,7 +168,7 @@ def cartographer(request, priority=3, token=None, chart="start systems"):
 
 
 def _chart_systems(request, priority, token, index, query):
-    with connect("dbname=st2 user=postgres") as conn, conn.cursor() as cur:
+    with db_conn() as conn, conn.cursor() as cur:
         cur.execute(
             "SELECT * FROM cartographer WHERE index = %s",
             (index,),
@@ -189,25 +193,29 @@ def _chart_systems(request, priority, token, index, query):
         if current == total:
             return False
 
-        logger.info(f"The Cartographer has found {total-current:_} {index} to chart")
         cur.execute(query)
         ret = cur.fetchall()
-        while current != total:
-            if DEBUG:
-                logger.debug(f"Processing {current+1:_}/{total:_}")
-            system_symbol = ret[current][0]
-            for ret2 in request.get_all(
-                endpoint=f"systems/{system_symbol}/waypoints",
-                priority=priority,
-                token=token,
-            ):
-                for wp in ret2["data"]:
-                    symbol = wp["symbol"]
-                    traits = [t["symbol"] for t in wp["traits"]]
-                    # update the values that may have been updated
-                    chart = Jsonb(wp.get("chart"))
-                    faction = wp.get("faction", {}).get("symbol")
-                    cur.execute(
+
+    logger.info(f"The Cartographer has found {total-current:_} {index} to chart")
+    while current != total:
+        if DEBUG:
+            logger.debug(f"Processing {current+1:_}/{total:_}")
+        system_symbol = ret[current][0]
+        # the statements of the system, executed together once it is charted
+        statements = []
+        for ret2 in request.get_all(
+            endpoint=f"systems/{system_symbol}/waypoints",
+            priority=priority,
+            token=token,
+        ):
+            for wp in ret2["data"]:
+                symbol = wp["symbol"]
+                traits = [t["symbol"] for t in wp["traits"]]
+                # update the values that may have been updated
+                chart = Jsonb(wp.get("chart"))
+                faction = wp.get("faction", {}).get("symbol")
+                statements.append(
+                    (
                         """
                         UPDATE "waypoints"
                         SET "traits" = %s,
@@ -216,120 +224,135 @@ def _chart_systems(request, priority, token, index, query):
                             "isUnderConstruction" = %s
                         WHERE "symbol" = %s
                         """,
-                        (
-                            traits,
-                            chart,
-                            faction,
-                            wp["isUnderConstruction"],
-                            symbol,
-                        ),
+                        [
+                            (
+                                traits,
+                                chart,
+                                faction,
+                                wp["isUnderConstruction"],
+                                symbol,
+                            )
+                        ],
                     )
+                )
 
-                    if traits in [["UNCHARTED"], []]:
-                        continue
+                if traits in [["UNCHARTED"], []]:
+                    continue
 
-                    if wp["type"] == "JUMP_GATE":
-                        _get_gate(symbol, system_symbol, request, priority, token, cur)
-                    if "MARKETPLACE" in traits:
-                        _get_market(
-                            symbol, system_symbol, request, priority, token, cur
-                        )
-                    if "SHIPYARD" in traits:
-                        _get_shipyard(
-                            symbol, system_symbol, request, priority, token, cur
-                        )
+                if wp["type"] == "JUMP_GATE":
+                    statements.append(
+                        _get_gate(symbol, system_symbol, request, priority, token)
+                    )
+                if "MARKETPLACE" in traits:
+                    statements.append(
+                        _get_market(symbol, system_symbol, request, priority, token)
+                    )
+                if "SHIPYARD" in traits:
+                    statements.append(
+                        _get_shipyard(symbol, system_symbol, request, priority, token)
+                    )
 
-                    # store unknown traits
-                    for trait in traits:
-                        if TRAITS_WAYPOINT.get(trait) is None:
-                            t = [t for t in wp["traits"] if t["symbol"] == trait][0]
-                            description = t["description"].replace("'", "''")
-                            cur.execute(
+                # store unknown traits
+                for trait in traits:
+                    if TRAITS_WAYPOINT.get(trait) is None:
+                        t = [t for t in wp["traits"] if t["symbol"] == trait][0]
+                        description = t["description"].replace("'", "''")
+                        statements.append(
+                            (
                                 """
                                 INSERT INTO traits_waypoint
                                 (symbol, name, description) 
                                 VALUES (%s, %s, %s)
                                 """,
-                                (t["symbol"], t["name"], description),
-                            )
-                            logger.info(
-                                f"The Cartographer has discovered a new trait: {t['symbol']}!"
+                                [(t["symbol"], t["name"], description)],
                             )
-            current += 1
-            # log progress
-            cur.execute(
+                        )
+                        logger.info(
+                            f"The Cartographer has discovered a new trait: {t['symbol']}!"
+                        )
+        current += 1
+        # log progress
+        statements.append(
+            (
                 """
                 UPDATE cartographer
                 SET current = %s
                 WHERE index = %s
                 """,
-                (current, index),
+                [(current, index)],
             )
-            conn.commit()
-        return True
+        )
+        db_execute(statements)
+    return True
 
 
-def _get_gate(symbol, system_symbol, request, priority, token, cur):
+def _get_gate(symbol, system_symbol, request, priority, token):
     connections = request.get(
         endpoint=f"systems/{system_symbol}/waypoints/{symbol}/jump-gate",
         priority=priority,
         token=token,
     )["data"]["connections"]
-    cur.execute(
+    return (
         """
         INSERT INTO "jump_gates"
         ("symbol", "systemSymbol", "connections")
         VALUES (%s, %s, %s)
         ON CONFLICT ("symbol") DO NOTHING
         """,
-        (
-            symbol,
-            system_symbol,
-            connections,
-        ),
+        [
+            (
+                symbol,
+                system_symbol,
+                connections,
+            )
+        ],
     )
 
 
-def _get_market(symbol, system_symbol, request, priority, token, cur):
+def _get_market(symbol, system_symbol, request, priority, token):
     ret = request.get(
         endpoint=f"systems/{system_symbol}/waypoints/{symbol}/market",
         priority=priority,
         token=token,
     )["data"]
-    cur.execute(
+    return (
         """
         INSERT INTO "markets"
         ("symbol", "systemSymbol", "imports", "exports", "exchange")
         VALUES (%s, %s, %s, %s, %s)
         ON CONFLICT ("symbol") DO NOTHING
         """,
-        (
-            symbol,
-            system_symbol,
-            [good["symbol"] for good in ret["imports"]],
-            [good["symbol"] for good in ret["exports"]],
-            [good["symbol"] for good in ret["exchange"]],
-        ),
+        [
+            (
+                symbol,
+                system_symbol,
+                [good["symbol"] for good in ret["imports"]],
+                [good["symbol"] for good in ret["exports"]],
+                [good["symbol"] for good in ret["exchange"]],
+            )
+        ],
     )
 
 
-def _get_shipyard(symbol, system_symbol, request, priority, token, cur):
+def _get_shipyard(symbol, system_symbol, request, priority, token):
     ret = request.get(
         endpoint=f"systems/{system_symbol}/waypoints/{symbol}/shipyard",
         priority=priority,
         token=token,
     )["data"]
-    cur.execute(
+    return (
         """
         INSERT INTO "shipyards"
         ("symbol", "systemSymbol", "shipTypes", "modificationsFee")
         VALUES (%s, %s, %s, %s)
         ON CONFLICT ("symbol") DO NOTHING
         """,
-        (
-            symbol,
-            system_symbol,
-            [ship["type"] for ship in ret["shipTypes"]],
-            ret["modificationsFee"],
-        ),
+        [
+            (
+                symbol,
+                system_symbol,
+                [ship["type"] for ship in ret["shipTypes"]],
+                ret["modificationsFee"],
+            )
+        ],
     )
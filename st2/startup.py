@@ -6,8 +6,8 @@ from xdg import XDG_DATA_HOME
 
 from st2 import time
 from st2.caching import cache
-from st2.db import db_server_init, db_tables_init
-from st2.request import Request, messenger
+from st2.db import db_maintenance_start, db_server_init, db_tables_init
+from st2.request import Request, broker_address, broker_authkey, messenger
 
 
 def game_server():
@@ -23,7 +23,7 @@ def game_server():
     if last_reset == cache.get("last_reset"):
         return
 
-    # server reset occurred
+    # server reset occurred (this also clears the cached API responses)
     cache.clear()
     cache.set("last_reset", last_reset)
     cache.set("next_reset", next_reset, expire=time.remaining(next_reset))
@@ -62,6 +62,8 @@ def game_server():
 def db_server():
     db_server_init()
     db_tables_init()
+    # new partitions for the history tables, and the retention of the old ones
+    db_maintenance_start()
 
 
 def api_server():
@@ -76,6 +78,19 @@ def api_server():
         target=messenger,
         kwargs={
             "qa_pairs": qa_pairs,
+            # high prio preempts, the others share the remaining requests 6:3:1
+            "weights": (None, 6, 3, 1),
+            # requests with a deadline go first, and are dropped when too late
+            "edf": True,
+            # optional reserved and capped requests/sec per queue, e.g. to guarantee
+            #  trades 0.5 req/s and cap the sector map at 0.3 req/s:
+            #  (None, (0.5, None), None, (None, 0.3)) (see RequestMp.set_budget)
+            "budgets": None,
+            # other processes on this host can send requests with RequestClient()
+            "broker": broker_address,
+            "authkey": broker_authkey,
+            # write the API calls per tag and minute to the database (table api_calls)
+            "ledger": True,
         },
     )
     api_handler.start()
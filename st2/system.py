@@ -4,12 +4,12 @@ from operator import itemgetter
 import networkx as nx
 import numpy as np
 from networkx.algorithms.approximation import traveling_salesman_problem
-from psycopg import connect
 from psycopg.rows import dict_row
 from psycopg.types.json import Jsonb
 from scipy.spatial.distance import cdist
 
 from st2.agent import api_agent
+from st2.db import db_conn, db_execute
 from st2.db.static.traits import TRAITS_WAYPOINT
 from st2.logging import logger
 
@@ -41,40 +41,26 @@ class System:
         else:
             self.token = api_agent(request, self.priority)[1]
 
-    def _get_system(self, cur):
+    def _get_system(self):
         """
-        Add the system and all its waypoints to the database
+        The statements to add the system and all its waypoints to the database
         """
         data = self.request.get(
-            endpoint=f"system/{self.symbol}",
+            endpoint=f"systems/{self.symbol}",
             priority=self.priority,
             token=self.token,
         )["data"]
-        cur.execute(
-            """
-            INSERT INTO systems 
-            (symbol, type, x, y)
-            VALUES (%s, %s, %s, %s)
-            ON CONFLICT (symbol) DO NOTHING
-            """,
-            (self.symbol, data["type"], data["x"], data["y"]),
-        )
 
         # update waypoints (with very limited fields)
         waypoints = {}
         for wp in data["waypoints"]:
             waypoints[wp["symbol"]] = wp
+        rows = []
         for waypoints_symbol in sorted(waypoints):
             wp = waypoints[waypoints_symbol]
             orbits = wp.get("orbits")
             orbitals = [o["symbol"] for o in wp["orbitals"]]
-            cur.execute(
-                """
-                INSERT INTO waypoints
-                ("symbol", "systemSymbol", "type", "x", "y", "orbits", "orbitals")
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT ("symbol") DO NOTHING
-                """,
+            rows.append(
                 (
                     waypoints_symbol,
                     self.symbol,
@@ -83,13 +69,34 @@ class System:
                     wp["y"],
                     orbits,
                     orbitals,
-                ),
+                )
             )
+        return [
+            (
+                """
+                INSERT INTO systems 
+                (symbol, type, x, y)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (symbol) DO NOTHING
+                """,
+                [(self.symbol, data["type"], data["x"], data["y"])],
+            ),
+            (
+                """
+                INSERT INTO waypoints
+                ("symbol", "systemSymbol", "type", "x", "y", "orbits", "orbitals")
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT ("symbol") DO NOTHING
+                """,
+                rows,
+            ),
+        ]
 
-    def _get_waypoints(self, cur):
+    def _get_waypoints(self):
         """
-        Add the extended details of all waypoints to the database
+        The statements to add the extended details of all waypoints to the database
         """
+        statements = []
         for ret in self.request.get_all(
             endpoint=f"systems/{self.symbol}/waypoints",
             priority=self.priority,
@@ -100,112 +107,125 @@ class System:
                 traits = [t["symbol"] for t in wp["traits"]]
                 chart = Jsonb(wp.get("chart"))
                 faction = wp.get("faction", {}).get("symbol")
-                cur.execute(
-                    """
-                    UPDATE "waypoints"
-                    SET "traits" = %s,
-                        "chart" = %s,
-                        "faction" = %s,
-                        "isUnderConstruction" = %s
-                    WHERE "symbol" = %s
-                    """,
+                statements.append(
                     (
-                        traits,
-                        chart,
-                        faction,
-                        wp["isUnderConstruction"],
-                        symbol,
-                    ),
+                        """
+                        UPDATE "waypoints"
+                        SET "traits" = %s,
+                            "chart" = %s,
+                            "faction" = %s,
+                            "isUnderConstruction" = %s
+                        WHERE "symbol" = %s
+                        """,
+                        [
+                            (
+                                traits,
+                                chart,
+                                faction,
+                                wp["isUnderConstruction"],
+                                symbol,
+                            )
+                        ],
+                    )
                 )
 
                 if traits in [["UNCHARTED"], []]:
                     continue
 
                 if wp["type"] == "JUMP_GATE":
-                    self._get_gate(symbol, cur)
+                    statements.append(self._get_gate(symbol))
                 if "MARKETPLACE" in traits:
-                    self._get_market(symbol, cur)
+                    statements.append(self._get_market(symbol))
                 if "SHIPYARD" in traits:
-                    self._get_shipyard(symbol, cur)
+                    statements.append(self._get_shipyard(symbol))
 
                 # store unknown traits
                 for trait in traits:
                     if TRAITS_WAYPOINT.get(trait) is None:
                         t = [t for t in wp["traits"] if t["symbol"] == trait][0]
                         description = t["description"].replace("'", "''")
-                        cur.execute(
-                            """
-                            INSERT INTO traits_waypoint
-                            (symbol, name, description) 
-                            VALUES (%s, %s, %s)
-                            """,
-                            (t["symbol"], t["name"], description),
+                        statements.append(
+                            (
+                                """
+                                INSERT INTO traits_waypoint
+                                (symbol, name, description) 
+                                VALUES (%s, %s, %s)
+                                """,
+                                [(t["symbol"], t["name"], description)],
+                            )
                         )
                         logger.info(
                             f"The Cartographer has discovered a new trait: {t['symbol']}!"
                         )
+        return statements
 
-    def _get_gate(self, waypoint_symbol, cur):
+    def _get_gate(self, waypoint_symbol):
         connections = self.request.get(
             endpoint=f"systems/{self.symbol}/waypoints/{waypoint_symbol}/jump-gate",
             priority=self.priority,
             token=self.token,
         )["data"]["connections"]
-        cur.execute(
+        return (
             """
             INSERT INTO "jump_gates"
             ("symbol", "systemSymbol", "connections")
             VALUES (%s, %s, %s)
             ON CONFLICT ("symbol") DO NOTHING
             """,
-            (
-                waypoint_symbol,
-                self.symbol,
-                connections,
-            ),
+            [
+                (
+                    waypoint_symbol,
+                    self.symbol,
+                    connections,
+                )
+            ],
         )
 
-    def _get_market(self, waypoint_symbol, cur):
+    def _get_market(self, waypoint_symbol):
         ret = self.request.get(
             endpoint=f"systems/{self.symbol}/waypoints/{waypoint_symbol}/market",
             priority=self.priority,
             token=self.token,
         )["data"]
-        cur.execute(
+        return (
             """
             INSERT INTO "markets"
             ("symbol", "systemSymbol", "imports", "exports", "exchange")
             VALUES (%s, %s, %s, %s, %s)
             ON CONFLICT ("symbol") DO NOTHING
             """,
-            (
-                waypoint_symbol,
-                self.symbol,
-                [good["symbol"] for good in ret["imports"]],
-                [good["symbol"] for good in ret["exports"]],
-                [good["symbol"] for good in ret["exchange"]],
-            ),
+            [
+                (
+                    waypoint_symbol,
+                    self.symbol,
+                    [good["symbol"] for good in ret["imports"]],
+                    [good["symbol"] for good in ret["exports"]],
+                    [good["symbol"] for good in ret["exchange"]],
+                )
+            ],
         )
 
-    def _get_shipyard(self, waypoint_symbol, cur):
+    def _get_shipyard(self, waypoint_symbol):
         ret = self.request.get(
             endpoint=f"systems/{self.symbol}/waypoints/{waypoint_symbol}/shipyard",
             priority=self.priority,
             token=self.token,
         )["data"]
-        cur.execute(
+        return (
             """
             INSERT INTO "shipyards"
             ("symbol", "systemSymbol", "shipTypes", "modificationsFee")
             VALUES (%s, %s, %s, %s)
             ON CONFLICT ("symbol") DO NOTHING
             """,
-            (
-                waypoint_symbol,
-                self.symbol,
-                [ship["type"] for ship in ret["shipTypes"]],
-                ret["modificationsFee"],
-            ),
+            [
+                (
+                    waypoint_symbol,
+                    self.symbol,
+                    [ship["type"] for ship in ret["shipTypes"]],
+                    ret["modificationsFee"],
+                )
+            ],
         )
 
     def _get_graph(self):
@@ -233,21 +253,28 @@ class System:
             case "waypoints":
                 if DEBUG:
                     logger.debug(f"Loading {name}")
-                with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+                # (the API requests are made without holding a connection)
+                query = (
+                    'SELECT * FROM waypoints WHERE "systemSymbol" = %s  ORDER BY symbol'
+                )
+                params = [self.symbol]
+                with db_conn(dict_row) as conn:
                     with conn.cursor() as cur:
-                        # ensure waypoints are in the database
-                        query = "SELECT * FROM systems WHERE symbol = %s"
-                        params = [self.symbol]
-                        data = cur.execute(query, params).fetchone()
-                        if data is None:
-                            self._get_system(cur)
-
-                        # ensure waypoint details are in the database
-                        query = 'SELECT * FROM waypoints WHERE "systemSymbol" = %s  ORDER BY symbol'
+                        system = cur.execute(
+                            "SELECT * FROM systems WHERE symbol = %s", params
+                        ).fetchone()
                         data = cur.execute(query, params).fetchall()
-                        if None in [wp.get("traits") for wp in data]:
-                            self._get_waypoints(cur)
-                            data = cur.execute(query, params).fetchall()
+
+                # ensure waypoints are in the database
+                if system is None:
+                    db_execute(self._get_system())
+
+                # ensure waypoint details are in the database
+                #  (the waypoints of a new system have none)
+                if system is None or None in [wp.get("traits") for wp in data]:
+                    db_execute(self._get_waypoints())
+                    with db_conn(dict_row) as conn:
+                        data = conn.execute(query, params).fetchall()
                 val = {}
                 for wp in data:
                     val[wp["symbol"]] = wp
@@ -256,7 +283,7 @@ class System:
             case "gate":
                 if DEBUG:
                     logger.debug(f"Loading {name}")
-                with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+                with db_conn(dict_row) as conn:
                     with conn.cursor() as cur:
                         ret = cur.execute(
                             """
@@ -294,7 +321,7 @@ class System:
             case "shipyards":
                 if DEBUG:
                     logger.debug(f"Loading {name}")
-                with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+                with db_conn(dict_row) as conn:
                     with conn.cursor() as cur:
                         ret = cur.execute(
                             """
@@ -315,7 +342,7 @@ class System:
             case "markets":
                 if DEBUG:
                     logger.debug(f"Loading {name}")
-                with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+                with db_conn(dict_row) as conn:
                     with conn.cursor() as cur:
                         ret = cur.execute(
                             """
@@ -336,7 +363,7 @@ class System:
             case "uncharted":
                 if DEBUG:
                     logger.debug(f"Loading {name}")
-                with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+                with db_conn(dict_row) as conn:
                     with conn.cursor() as cur:
                         ret = cur.execute(
                             """
@@ -362,6 +389,16 @@ class System:
 
         return val
 
+    def load(self, *names):
+        """
+        Load the lazy attributes `names` (they may need the API and the database).
+        In a coroutine, load them in a thread:
+            await asyncio.to_thread(system.load, "markets", "graph")
+        """
+        for name in names:
+            getattr(self, name)
+        return self
+
     def waypoints_with(self, type: str = None, traits: list[str] = None):
         query = """SELECT * FROM waypoints WHERE "systemSymbol" = %s """
         params = [self.symbol]
@@ -384,7 +421,7 @@ class System:
             params.append(traits)
         query += """ORDER BY "symbol" """
 
-        with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+        with db_conn(dict_row) as conn:
             with conn.cursor() as cur:
                 cur.execute(query, params)
                 wps = {wp["symbol"]: wp for wp in cur.fetchall()}
@@ -435,7 +472,7 @@ class System:
             case "_":
                 raise ValueError(f"{type=} not recognized")
         query += """\n) AS all_values"""
-        with connect("dbname=st2 user=postgres") as conn:
+        with db_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute(query)
                 return sorted(row[0] for row in cur.fetchall())
@@ -472,7 +509,7 @@ class System:
                 raise ValueError(f"{type=} not recognized")
         query += "ORDER BY symbol"
 
-        with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+        with db_conn(dict_row) as conn:
             with conn.cursor() as cur:
                 # this dict is complete
                 cur.execute(query, params)
@@ -481,11 +518,11 @@ class System:
                 # this dict can be incomplete (if the market has never been visited)
                 cur.execute(
                     """
-                    SELECT DISTINCT ON ("waypointSymbol") * 
-                    FROM market_tradegoods
+                    SELECT *
+                    FROM market_latest
                     WHERE symbol = %s
                       AND "waypointSymbol" = ANY(%s)
-                    ORDER BY "waypointSymbol", "timestamp" DESC
+                    ORDER BY "waypointSymbol"
                     """,
                     (symbol, list(wps)),
                 )
@@ -527,7 +564,7 @@ class System:
 
         :return: List of shipTypes
         """
-        with connect("dbname=st2 user=postgres") as conn:
+        with db_conn() as conn:
             with conn.cursor() as cur:
                 cur.execute(
                     """
@@ -548,7 +585,7 @@ class System:
         :param type: shipTypes (e.g. "SHIP_PROBE")
         :return: dict with waypoints as key and their latest ship as values
         """
-        with connect("dbname=st2 user=postgres", row_factory=dict_row) as conn:
+        with db_conn(dict_row) as conn:
             with conn.cursor() as cur:
                 # this dict is complete
                 cur.execute(
@@ -566,11 +603,11 @@ class System:
                 # this dict can be incomplete (if the shipyard has never been visited)
                 cur.execute(
                     """
-                    SELECT DISTINCT ON ("waypointSymbol") * 
-                    FROM shipyard_ships
+                    SELECT *
+                    FROM shipyard_latest
                     WHERE type = %s
                       AND "systemSymbol" = %s
-                    ORDER BY "waypointSymbol", "timestamp" DESC
+                    ORDER BY "waypointSymbol"
                     """,
                     (type, self.symbol),
                 )
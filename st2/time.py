@@ -22,6 +22,15 @@ def write(t: datetime.datetime = None):
     return f"{t.isoformat()[:23]}Z"
 
 
+def epoch(t: str or datetime.datetime or float):
+    """from ISO 8601 format string or datetime to seconds since the epoch"""
+    if isinstance(t, str):
+        t = read(t)
+    if isinstance(t, datetime.datetime):
+        t = t.timestamp()
+    return t
+
+
 def remaining(t: str or datetime.datetime):
     """in seconds"""
     if isinstance(t, str):
@@ -0,0 +1,44 @@
+"""
+Throughput of the messenger with one or more requests in flight,
+against a local stand-in server with latency.
+
+run from the command line with:
+    python -m tests.benchmarks.concurrency
+"""
+
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from st2.request import RequestMp, messenger
+from tests.mock_server import MockServer
+
+
+def benchmark(manager, server, workers, n=100, callers=20):
+    qa_pairs = tuple((manager.Queue(), manager.dict()) for _ in range(4))
+    api_handler = mp.Process(
+        target=messenger,
+        kwargs={"qa_pairs": qa_pairs, "workers": workers, "base_url": server.url},
+    )
+    api_handler.start()
+    request = RequestMp(qa_pairs)
+    request.get("status")  # wait for the messenger to start
+
+    t0 = perf_counter()
+    with ThreadPoolExecutor(callers) as pool:
+        list(pool.map(lambda i: request.get(f"my/ships/{i}"), range(n)))
+    t = perf_counter() - t0
+
+    api_handler.terminate()
+    api_handler.join()
+    return round(n / t, 2)
+
+
+if __name__ == "__main__":
+    latency = 0.2
+    per_second = 10
+    manager = mp.Manager()
+    with MockServer(latency=latency, per_second=per_second, burst=0) as server:
+        print(f"{latency=} sec, rate limit {per_second}/sec (1/RTT = {1/latency}/sec)")
+        for workers in [1, 2, 4, 8]:
+            print(f"{workers=}: {benchmark(manager, server, workers)} requests/sec")
@@ -0,0 +1,252 @@
+"""
+EXPLAIN ANALYZE the frequent queries of st2 on generated tables of several million rows,
+without and with the INDEXES of st2.db (created by db_tables_init).
+
+The tables are copies of the st2 tables (with their primary keys) in the schema bench_indexes:
+markets with `--goods` trade goods and `--snapshots` snapshots each
+(market_tradegoods: markets x goods x snapshots rows), shipyards with 10 ship types,
+and the tasks of `--processes` TaskMaster processes.
+The latest prices are queried from the history (as before market_latest and shipyard_latest)
+and from the latest tables, whose lookups do not slow down with more snapshots
+(compare e.g. --snapshots 4 and 400).
+Reports the execution time (median of 5) and the indexes in the plan of each query.
+Needs the st2 database (ST2_DB).
+
+run from the command line with:
+    python -m tests.benchmarks.db_indexes --markets 2000 --goods 50 --snapshots 40
+"""
+
+import argparse
+import json
+import statistics
+
+from psycopg import connect
+
+import st2.db
+from st2.db import INDEXES
+
+SCHEMA = "bench_indexes"
+TABLES = [
+    "market_tradegoods",
+    "market_latest",
+    "shipyard_ships",
+    "shipyard_latest",
+    "tasks",
+    "waypoints",
+    "markets",
+    "shipyards",
+    "jump_gates",
+]
+# 10 waypoints per system: the markets of system n are X1-S{n}-W{0..9}
+GENERATE = {
+    "waypoints": """
+        INSERT INTO waypoints ("symbol", "systemSymbol", "type", "x", "y")
+        SELECT 'X1-S' || s || '-W' || w, 'X1-S' || s, 'PLANET', s, w
+        FROM generate_series(0, %(systems)s - 1) s, generate_series(0, 9) w
+        """,
+    "markets": """
+        INSERT INTO markets ("symbol", "systemSymbol", "imports", "exports", "exchange")
+        SELECT 'X1-S' || m / 10 || '-W' || m %% 10, 'X1-S' || m / 10,
+               ARRAY['GOOD_1'], ARRAY['GOOD_2'], ARRAY['FUEL']
+        FROM generate_series(0, %(markets)s - 1) m
+        """,
+    "market_tradegoods": """
+        INSERT INTO market_tradegoods
+        ("waypointSymbol", "systemSymbol", "symbol", "tradeVolume", "type",
+         "supply", "activity", "purchasePrice", "sellPrice", "timestamp")
+        SELECT 'X1-S' || m / 10 || '-W' || m %% 10, 'X1-S' || m / 10, 'GOOD_' || g,
+               60, 'EXCHANGE', 'MODERATE', 'GROWING', 100 + g, 90 + g,
+               now() - t * interval '10 minutes'
+        FROM generate_series(0, %(markets)s - 1) m,
+             generate_series(0, %(goods)s - 1) g,
+             generate_series(0, %(snapshots)s - 1) t
+        """,
+    "shipyards": """
+        INSERT INTO shipyards ("symbol", "systemSymbol", "shipTypes")
+        SELECT 'X1-S' || y * 4 || '-W0', 'X1-S' || y * 4, ARRAY['SHIP_PROBE']
+        FROM generate_series(0, %(markets)s / 40 - 1) y
+        """,
+    "shipyard_ships": """
+        INSERT INTO shipyard_ships
+        ("waypointSymbol", "systemSymbol", "type", "supply", "activity",
+         "purchasePrice", "timestamp")
+        SELECT 'X1-S' || y * 4 || '-W0', 'X1-S' || y * 4, 'SHIP_' || k,
+               'MODERATE', 'GROWING', 25000, now() - t * interval '10 minutes'
+        FROM generate_series(0, %(markets)s / 40 - 1) y,
+             generate_series(0, 9) k,
+             generate_series(0, %(snapshots)s - 1) t
+        """,
+    "market_latest": """
+        INSERT INTO market_latest
+        SELECT DISTINCT ON ("waypointSymbol", "symbol") *
+        FROM market_tradegoods
+        ORDER BY "waypointSymbol", "symbol", "timestamp" DESC
+        """,
+    "shipyard_latest": """
+        INSERT INTO shipyard_latest
+        SELECT DISTINCT ON ("waypointSymbol", "type") *
+        FROM shipyard_ships
+        ORDER BY "waypointSymbol", "type", "timestamp" DESC
+        """,
+    "jump_gates": """
+        INSERT INTO jump_gates ("symbol", "systemSymbol")
+        SELECT 'X1-S' || s || '-W9', 'X1-S' || s
+        FROM generate_series(0, %(systems)s - 1) s
+        """,
+    "tasks": """
+        INSERT INTO tasks ("symbol", "agentSymbol", "current", "pname")
+        SELECT 'AGENT-' || n, 'AGENT', 'probe market X1-S0-W0', 'process ' || n %% %(processes)s
+        FROM generate_series(0, %(processes)s * 500 - 1) n
+        """,
+}
+# the queries of System.markets_with/shipyards_with, _get_trade_volume,
+# TaskMaster.run and System (the waypoints of a system),
+# and the latest prices from the history (before market_latest and shipyard_latest)
+QUERIES = {
+    "markets_with (history)": (
+        """
+        SELECT DISTINCT ON ("waypointSymbol") *
+        FROM market_tradegoods
+        WHERE symbol = %s
+          AND "waypointSymbol" = ANY(%s)
+        ORDER BY "waypointSymbol", "timestamp" DESC
+        """,
+        ("GOOD_7", [f"X1-S42-W{w}" for w in range(10)]),
+    ),
+    "markets_with": (
+        """
+        SELECT *
+        FROM market_latest
+        WHERE symbol = %s
+          AND "waypointSymbol" = ANY(%s)
+        ORDER BY "waypointSymbol"
+        """,
+        ("GOOD_7", [f"X1-S42-W{w}" for w in range(10)]),
+    ),
+    "_get_trade_volume (history)": (
+        """
+        SELECT "tradeVolume"
+        FROM market_tradegoods
+        WHERE "waypointSymbol" = %s
+          AND symbol = %s
+        ORDER BY "timestamp" DESC
+        LIMIT 1
+        """,
+        ("X1-S42-W3", "GOOD_7"),
+    ),
+    "_get_trade_volume": (
+        """
+        SELECT "tradeVolume"
+        FROM market_latest
+        WHERE "waypointSymbol" = %s
+          AND symbol = %s
+        """,
+        ("X1-S42-W3", "GOOD_7"),
+    ),
+    "shipyards_with (history)": (
+        """
+        SELECT DISTINCT ON ("waypointSymbol") *
+        FROM shipyard_ships
+        WHERE type = %s
+          AND "systemSymbol" = %s
+        ORDER BY "waypointSymbol", "timestamp" DESC
+        """,
+        ("SHIP_3", "X1-S40"),
+    ),
+    "shipyards_with": (
+        """
+        SELECT *
+        FROM shipyard_latest
+        WHERE type = %s
+          AND "systemSymbol" = %s
+        ORDER BY "waypointSymbol"
+        """,
+        ("SHIP_3", "X1-S40"),
+    ),
+    "TaskMaster.run (tasks)": ("SELECT * FROM tasks WHERE pname = %s", ("process 3",)),
+    "System (waypoints)": (
+        'SELECT * FROM waypoints WHERE "systemSymbol" = %s ORDER BY symbol',
+        ("X1-S42",),
+    ),
+    "System (markets)": (
+        'SELECT * FROM markets WHERE "systemSymbol" = %s',
+        ("X1-S42",),
+    ),
+}
+
+
+def setup(cur, params):
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"SET search_path TO {SCHEMA}")
+    for table in TABLES:
+        cur.execute(f"CREATE TABLE {table} (LIKE public.{table} INCLUDING ALL)")
+    # keep only the primary keys
+    cur.execute(
+        """
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = %s AND NOT i.indisprimary
+        """,
+        (SCHEMA,),
+    )
+    for (name,) in cur.fetchall():
+        cur.execute(f'DROP INDEX "{name}"')
+    for table in TABLES:
+        cur.execute(GENERATE[table], params)
+    cur.execute("ANALYZE")
+    cur.execute("SELECT count(*) FROM market_tradegoods")
+    return cur.fetchone()[0]
+
+
+def indexes(plan):
+    """the indexes used in a plan (EXPLAIN FORMAT JSON)"""
+    ret = set()
+    if "Index Name" in plan:
+        ret.add(f'{plan["Node Type"]} using {plan["Index Name"]}')
+    for child in plan.get("Plans", []):
+        ret |= indexes(child)
+    return ret
+
+
+def explain(cur, query, params, n=5):
+    times = []
+    for _ in range(n):
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", params)
+        plan = cur.fetchone()[0][0]
+        times.append(plan["Execution Time"])
+    return {
+        "execution time (ms)": round(statistics.median(times), 3),
+        "plan": plan["Plan"]["Node Type"],
+        "indexes": sorted(indexes(plan["Plan"])) or "none (sequential scan)",
+        "shared buffers": plan["Plan"].get("Shared Read Blocks", 0)
+        + plan["Plan"].get("Shared Hit Blocks", 0),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--markets", type=int, default=2000)
+    parser.add_argument("--goods", type=int, default=50)
+    parser.add_argument("--snapshots", type=int, default=40)
+    parser.add_argument("--processes", type=int, default=10)
+    args = parser.parse_args()
+    params = vars(args) | {"systems": args.markets // 10 * 10}
+
+    with connect(st2.db.conninfo, autocommit=True) as conn, conn.cursor() as cur:
+        try:
+            rows = setup(cur, params)
+            print(f"market_tradegoods: {rows:_} rows")
+            results = {"without indexes": {}, "with indexes": {}}
+            for name, (query, query_params) in QUERIES.items():
+                results["without indexes"][name] = explain(cur, query, query_params)
+            for name, (table, columns) in INDEXES.items():
+                cur.execute(f"CREATE INDEX {name} ON {table} ({columns})")
+            cur.execute("ANALYZE")
+            for name, (query, query_params) in QUERIES.items():
+                results["with indexes"][name] = explain(cur, query, query_params)
+            print(json.dumps(results, indent=2))
+        finally:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
@@ -0,0 +1,133 @@
+"""
+Ship actions per second with a new database connection per action
+(as before the connection pool) and with the connection pools of st2.db.
+
+An action is the database work of a ship action: update the ship (jsonb)
+and insert an event, in one transaction. The actions run in threads
+(sync pool) or coroutines (async pool). Reports the actions per second
+and the pool statistics, including the mean wait for a connection.
+Needs the st2 database (ST2_DB); uses the tables bench_ships and bench_events.
+
+run from the command line with:
+    python -m tests.benchmarks.db_pool --concurrency 1 4 16 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from psycopg import connect
+from psycopg.types.json import Jsonb
+
+import st2.db
+from st2.db import db_conn, db_conn_async, db_pool_stats
+
+SHIPS = 100
+UPDATE = 'UPDATE bench_ships SET "nav" = %s WHERE "symbol" = %s'
+INSERT = 'INSERT INTO bench_events ("shipSymbol", "timestamp") VALUES (%s, now())'
+
+
+def setup():
+    with connect(st2.db.conninfo) as conn:
+        conn.execute("DROP TABLE IF EXISTS bench_ships, bench_events")
+        conn.execute(
+            'CREATE TABLE bench_ships ("symbol" text PRIMARY KEY, "nav" jsonb)'
+        )
+        conn.execute(
+            'CREATE TABLE bench_events ("shipSymbol" text, "timestamp" timestamptz)'
+        )
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO bench_ships VALUES (%s, %s)",
+                [(f"S-{n}", Jsonb({"status": "DOCKED"})) for n in range(SHIPS)],
+            )
+
+
+def teardown():
+    with connect(st2.db.conninfo) as conn:
+        conn.execute("DROP TABLE bench_ships, bench_events")
+
+
+def action(conn, n):
+    symbol = f"S-{n % SHIPS}"
+    conn.execute(UPDATE, (Jsonb({"status": "IN_ORBIT", "n": n}), symbol))
+    conn.execute(INSERT, (symbol,))
+
+
+def new_connection(n):
+    with connect(st2.db.conninfo) as conn:
+        action(conn, n)
+
+
+def pooled_connection(n):
+    with db_conn() as conn:
+        action(conn, n)
+
+
+def threads(target, concurrency, duration):
+    def worker(w):
+        n = w
+        while perf_counter() < end:
+            target(n)
+            n += concurrency
+        return (n - w) // concurrency
+
+    end = perf_counter() + duration
+    with ThreadPoolExecutor(concurrency) as pool:
+        return sum(pool.map(worker, range(concurrency)))
+
+
+def coroutines(concurrency, duration):
+    async def worker(w):
+        n = w
+        while perf_counter() < end:
+            async with db_conn_async() as conn:
+                symbol = f"S-{n % SHIPS}"
+                await conn.execute(UPDATE, (Jsonb({"status": "IN_ORBIT"}), symbol))
+                await conn.execute(INSERT, (symbol,))
+            n += concurrency
+        return (n - w) // concurrency
+
+    async def main():
+        ret = sum(await asyncio.gather(*(worker(w) for w in range(concurrency))))
+        stats = db_pool_stats()["async"]
+        return ret, stats
+
+    end = perf_counter() + duration
+    return asyncio.run(main())
+
+
+def benchmark(concurrency, duration):
+    results = {}
+    for name in ["new connection", "pool", "async pool"]:
+        if st2.db._pool is not None:
+            st2.db._pool[1].close()
+            st2.db._pool = None  # fresh pool statistics
+        if name == "async pool":
+            n, stats = coroutines(concurrency, duration)
+        else:
+            target = new_connection if name == "new connection" else pooled_connection
+            n = threads(target, concurrency, duration)
+            stats = db_pool_stats().get("sync")
+        results[name] = {"actions/sec": round(n / duration, 1)}
+        if stats:
+            results[name]["pool wait (ms)"] = stats["wait_ms"]
+            results[name]["connections opened"] = stats.get("connections_num", 0)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    setup()
+    try:
+        for concurrency in args.concurrency:
+            ret = benchmark(concurrency, args.duration)
+            print(f"concurrency {concurrency}:", json.dumps(ret, indent=2))
+    finally:
+        teardown()
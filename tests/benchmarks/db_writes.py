@@ -0,0 +1,144 @@
+"""
+Write throughput of market snapshots with each way of sending the rows to the database:
+one INSERT per row (before), executemany (pipelined),
+one multi-row INSERT (Insert), and COPY through a staging table (Insert with copy_rows=0).
+
+Each snapshot is written in its own transaction, like market(): the trade goods
+into the history (ON CONFLICT DO NOTHING) and into the latest prices
+(ON CONFLICT DO UPDATE, unless the stored snapshot is newer).
+Reports snapshots/sec and rows/sec per method and snapshot size.
+Needs the st2 database (ST2_DB); uses the tables bench_tradegoods and bench_latest.
+
+run from the command line with:
+    python -m tests.benchmarks.db_writes --goods 20 60 600 --duration 5
+"""
+
+import argparse
+import datetime
+import json
+from time import perf_counter
+
+from psycopg import connect
+
+import st2.db
+from st2.db import Insert, db_conn
+from st2.ship._market import LATEST, TRADEGOOD_COLUMNS, TRADEGOODS
+
+COLUMNS = TRADEGOOD_COLUMNS
+CONFLICT = TRADEGOODS.on_conflict
+LATEST_CONFLICT = LATEST.on_conflict.replace("market_latest", "bench_latest")
+
+
+def query(table, on_conflict):
+    return f"""
+        INSERT INTO {table} ({", ".join(f'"{c}"' for c in COLUMNS)})
+        VALUES ({", ".join(["%s"] * len(COLUMNS))})
+        {on_conflict}
+        """
+
+
+QUERY = query("bench_tradegoods", CONFLICT)
+LATEST_QUERY = query("bench_latest", LATEST_CONFLICT)
+
+
+def setup():
+    with connect(st2.db.conninfo) as conn:
+        conn.execute("DROP TABLE IF EXISTS bench_tradegoods, bench_latest")
+        conn.execute("""
+            CREATE TABLE bench_tradegoods
+            (LIKE market_tradegoods INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+             PRIMARY KEY ("waypointSymbol", "symbol", "timestamp"))
+            """)
+        conn.execute("""
+            CREATE TABLE bench_latest
+            (LIKE market_latest INCLUDING DEFAULTS INCLUDING CONSTRAINTS,
+             PRIMARY KEY ("waypointSymbol", "symbol"))
+            """)
+
+
+def teardown():
+    with connect(st2.db.conninfo) as conn:
+        conn.execute("DROP TABLE bench_tradegoods, bench_latest")
+
+
+def snapshot(n, goods):
+    timestamp = datetime.datetime.now(datetime.timezone.utc)
+    return [
+        (
+            f"X1-A{n % 100}-B1",
+            f"X1-A{n % 100}",
+            f"GOOD_{g}",
+            60,
+            "EXCHANGE",
+            "MODERATE",
+            "GROWING",
+            100 + g,
+            90 + g,
+            timestamp,
+        )
+        for g in range(goods)
+    ]
+
+
+def per_row(cur, rows):
+    for row in rows:
+        cur.execute(QUERY, row)
+    for row in rows:
+        cur.execute(LATEST_QUERY, row)
+
+
+def executemany(cur, rows):
+    cur.executemany(QUERY, rows)
+    cur.executemany(LATEST_QUERY, rows)
+
+
+def inserts(copy_rows):
+    history = Insert("bench_tradegoods", COLUMNS, CONFLICT)
+    latest = Insert("bench_latest", COLUMNS, LATEST_CONFLICT)
+    history.copy_rows = latest.copy_rows = copy_rows
+
+    def method(cur, rows):
+        history.execute(cur, rows)
+        latest.execute(cur, rows)
+
+    return method
+
+
+METHODS = {
+    "INSERT per row": per_row,
+    "executemany": executemany,
+    "multi-row INSERT": inserts(Insert.copy_rows),
+    "COPY (staging table)": inserts(0),
+}
+
+
+def benchmark(method, goods, duration):
+    n = 0
+    t0 = perf_counter()
+    while perf_counter() - t0 < duration:
+        with db_conn() as conn, conn.cursor() as cur:
+            method(cur, snapshot(n, goods))
+        n += 1
+    t = perf_counter() - t0
+    return {
+        "snapshots/sec": round(n / t, 1),
+        "rows/sec": round(n * goods / t),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--goods", type=int, nargs="+", default=[20, 60, 600])
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    setup()
+    try:
+        results = {}
+        for goods in args.goods:
+            for name, method in METHODS.items():
+                ret = benchmark(method, goods, args.duration)
+                results[f"{name}, {goods} goods"] = ret
+                print(f"{name}, {goods} goods:", json.dumps(ret))
+    finally:
+        teardown()
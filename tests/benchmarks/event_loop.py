@@ -0,0 +1,123 @@
+"""
+Responsiveness of an event loop that makes API requests from many coroutines
+(as the ai coroutines do), against a local stand-in server.
+
+Compares blocking RequestMp calls inside the coroutines,
+RequestMp calls in a thread pool (run_in_executor) and awaitable AsyncRequestMp calls.
+A heartbeat coroutine sleeps 10 ms in a loop: its lag (how late it wakes up)
+shows how long the event loop was blocked.
+Reports the requests per second and the heartbeat lag percentiles.
+
+run from the command line with:
+    python -m tests.benchmarks.event_loop --coroutines 64 --duration 5
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from st2.request import AsyncRequestMp, RequestMp
+from tests.benchmarks.request import percentiles, run_messenger
+from tests.mock_server import MockServer
+
+HEARTBEAT = 0.01
+
+
+def blocking(request, pool):
+    async def get(endpoint):
+        return request.get(endpoint)
+
+    return get
+
+
+def executor(request, pool):
+    async def get(endpoint):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, request.get, endpoint)
+
+    return get
+
+
+def awaitable(request, pool):
+    request = AsyncRequestMp(list(request.queues.values()), token=request.token)
+    return request.get
+
+
+CONFIGURATIONS = {
+    "blocking RequestMp": blocking,
+    "RequestMp in threads": executor,
+    "AsyncRequestMp": awaitable,
+}
+
+
+def benchmark(qa_pairs, configuration, coroutines, duration):
+    request = RequestMp(qa_pairs, token="benchmark")
+    pool = ThreadPoolExecutor(coroutines)
+    get = configuration(request, pool)
+    lags = []
+    requests = 0
+
+    async def heartbeat():
+        while perf_counter() < end:
+            t = perf_counter()
+            await asyncio.sleep(HEARTBEAT)
+            lags.append(perf_counter() - t - HEARTBEAT)
+
+    async def caller(n):
+        nonlocal requests
+        i = 0
+        while perf_counter() < end:
+            # unique endpoints: no cached or coalesced requests
+            await get(f"my/ships/S-{configuration.__name__}-{n}-{i}")
+            requests += 1
+            i += 1
+
+    async def main():
+        await asyncio.gather(heartbeat(), *(caller(n) for n in range(coroutines)))
+
+    t0 = perf_counter()
+    end = t0 + duration
+    asyncio.run(main())
+    t = perf_counter() - t0
+    pool.shutdown()
+    return {
+        "requests": requests,
+        "requests/sec": round(requests / t, 1),
+        "heartbeats": len(lags),
+        "heartbeat lag (ms)": percentiles(lags),
+        "heartbeat max lag (ms)": round(max(lags) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--coroutines", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=5)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.03, 0.08])
+    parser.add_argument("--per-second", type=float, default=200)
+    parser.add_argument("--config", nargs="+", default=list(CONFIGURATIONS))
+    args = parser.parse_args()
+
+    mp.set_start_method("fork")
+    manager = mp.Manager()
+    results = {}
+    with MockServer(
+        latency=tuple(args.latency), per_second=args.per_second, burst=0
+    ) as server:
+        qa_pairs = tuple((manager.Queue(), manager.dict()) for _ in range(4))
+        kwargs = {"base_url": server.url, "workers": 16}
+        api_handler = mp.Process(target=run_messenger, args=(qa_pairs, kwargs))
+        api_handler.start()
+        RequestMp(qa_pairs).get("status")  # wait for the messenger to start
+        for name in args.config:
+            print(f"{name} ({args.coroutines} coroutines)")
+            ret = benchmark(
+                qa_pairs, CONFIGURATIONS[name], args.coroutines, args.duration
+            )
+            results[name] = ret
+            print(json.dumps(ret, indent=2))
+        api_handler.terminate()
+        api_handler.join()
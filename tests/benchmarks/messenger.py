@@ -0,0 +1,90 @@
+"""
+Compare the idle CPU use and dispatch delay of the messenger loop
+with the polling loop it replaced.
+The API is replaced by an instant, local answer.
+
+run from the command line with:
+    python -m tests.benchmarks.messenger
+"""
+
+import multiprocessing as mp
+import os
+import random
+from time import perf_counter, sleep
+
+import numpy as np
+
+import st2.request
+from st2.limiter import Unlimited
+from st2.request import Messenger, Request, RequestMp, messenger
+
+
+def _answer(
+    self, method, endpoint, token=None, data=None, params=None, raw=False, **kwargs
+):
+    return {"data": endpoint}
+
+
+def polling_messenger(qa_pairs):
+    """The messenger loop before the Scheduler (checks every queue, then sleeps)"""
+    m = Messenger(qa_pairs)
+    while True:
+        for priority, (queue, answer_dict) in enumerate(qa_pairs):
+            if queue.empty():
+                continue  # next queue
+            job = queue.get()
+            ret = m.session._request(  # noqa
+                job["method"], job["endpoint"], job["token"], job["data"], job["params"]
+            )
+            m._deliver(priority, job, ret)  # noqa
+            break  # next iteration
+        sleep(0.01)  # no requests
+
+
+def cpu_time(pid):
+    """user + system CPU time (in seconds) of a process (Linux only)"""
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def benchmark(target, manager, idle=5, n=500):
+    qa_pairs = tuple((manager.Queue(), manager.dict()) for _ in range(4))
+    api_handler = mp.Process(target=target, kwargs={"qa_pairs": qa_pairs})
+    api_handler.start()
+    try:
+        request = RequestMp(qa_pairs)
+        request.get("warmup")
+
+        # idle CPU use of the API handler & the Manager server
+        pids = [api_handler.pid, manager._process.pid]  # noqa
+        t0 = [cpu_time(pid) for pid in pids]
+        sleep(idle)
+        t1 = [cpu_time(pid) for pid in pids]
+        idle_cpu = [(b - a) / idle * 100 for a, b in zip(t0, t1)]
+
+        # dispatch delay: requests arrive at random moments
+        delays = []
+        for i in range(n):
+            sleep(random.uniform(0, 0.02))
+            t = perf_counter()
+            request.get(str(i), priority=random.randrange(4))
+            delays.append(perf_counter() - t)
+    finally:
+        api_handler.terminate()
+        api_handler.join()
+    return {
+        "idle CPU api_handler (%)": round(idle_cpu[0], 2),
+        "idle CPU manager (%)": round(idle_cpu[1], 2),
+        "delay p50 (ms)": round(float(np.percentile(delays, 50)) * 1000, 2),
+        "delay p99 (ms)": round(float(np.percentile(delays, 99)) * 1000, 2),
+    }
+
+
+if __name__ == "__main__":
+    mp.set_start_method("fork")  # the API handlers inherit the local answer
+    Request._request = _answer
+    st2.request.RateLimiter = Unlimited  # (no API, no rate limit)
+    manager = mp.Manager()
+    for name, target in [("polling", polling_messenger), ("scheduler", messenger)]:
+        print(name, benchmark(target, manager))
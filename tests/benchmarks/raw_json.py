@@ -0,0 +1,178 @@
+"""
+Compare passing decoded responses from the messenger to the callers
+with passing the raw response bytes (RequestMp(raw=True)), on large payloads:
+a page of 20 waypoints (with traits) and a market (with trade goods and transactions).
+
+1. the cost per response of each step between the server and the caller:
+   decode in the messenger, pickle, unpickle (decoded),
+   or pickle, unpickle and decode in the caller (raw, with json and orjson)
+2. end to end: requests/sec and the CPU use of the messenger and the caller,
+   against a local stand-in server
+
+run from the command line with:
+    python -m tests.benchmarks.raw_json --duration 5
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import pickle
+import random
+from time import perf_counter
+
+from st2.request import RawJson, RequestMp
+from tests.benchmarks.messenger import cpu_time
+from tests.benchmarks.request import run_messenger
+from tests.mock_game import GOODS, MockGame
+from tests.mock_server import MockServer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def payloads():
+    game = MockGame(systems=20, seed=0)
+    system = max(game.systems.values(), key=lambda s: len(s["waypoints"]))
+    _, waypoints = game.answer(
+        "get", f'systems/{system["symbol"]}/waypoints', {"limit": 20}, None, None
+    )
+    rng = random.Random(0)
+    goods = [
+        {
+            "symbol": good,
+            "tradeVolume": rng.choice([10, 20, 60, 100]),
+            "type": rng.choice(["EXPORT", "IMPORT", "EXCHANGE"]),
+            "supply": rng.choice(["SCARCE", "LIMITED", "MODERATE", "HIGH"]),
+            "activity": rng.choice(["WEAK", "GROWING", "STRONG"]),
+            "purchasePrice": rng.randint(20, 2000),
+            "sellPrice": rng.randint(20, 2000),
+        }
+        for good in GOODS
+    ]
+    transactions = [
+        {
+            "waypointSymbol": "X1-A1-B2",
+            "shipSymbol": f"AGENT-{n}",
+            "tradeSymbol": rng.choice(GOODS),
+            "type": rng.choice(["PURCHASE", "SELL"]),
+            "units": rng.randint(1, 100),
+            "pricePerUnit": rng.randint(20, 2000),
+            "totalPrice": rng.randint(20, 200_000),
+            "timestamp": "2025-01-01T00:00:00.000Z",
+        }
+        for n in range(20)
+    ]
+    market = {
+        "data": {
+            "symbol": "X1-A1-B2",
+            "imports": [
+                {"symbol": g["symbol"]} for g in goods if g["type"] == "IMPORT"
+            ],
+            "exports": [
+                {"symbol": g["symbol"]} for g in goods if g["type"] == "EXPORT"
+            ],
+            "exchange": [
+                {"symbol": g["symbol"]} for g in goods if g["type"] == "EXCHANGE"
+            ],
+            "tradeGoods": goods,
+            "transactions": transactions,
+        }
+    }
+    return {"waypoints": waypoints, "market": market}
+
+
+def per_response(payload, n=2000):
+    """microseconds per response for each step"""
+    body = json.dumps(payload).encode()
+
+    def timeit(f):
+        t0 = perf_counter()
+        for _ in range(n):
+            f()
+        return round((perf_counter() - t0) / n * 1e6, 1)
+
+    obj = json.loads(body)
+    decoded = pickle.dumps(obj)
+    raw = pickle.dumps(RawJson(body))
+    ret = {
+        "size (bytes)": len(body),
+        "pickled size, decoded (bytes)": len(decoded),
+        "decoded: json decode (messenger)": timeit(lambda: json.loads(body)),
+        "decoded: pickle (messenger)": timeit(lambda: pickle.dumps(obj)),
+        "decoded: unpickle (caller)": timeit(lambda: pickle.loads(decoded)),
+        "raw: pickle (messenger)": timeit(lambda: pickle.dumps(RawJson(body))),
+        "raw: unpickle (caller)": timeit(lambda: pickle.loads(raw)),
+        "raw: json decode (caller)": timeit(lambda: json.loads(body)),
+    }
+    if orjson is not None:
+        ret["raw: orjson decode (caller)"] = timeit(lambda: orjson.loads(body))
+    return ret
+
+
+class PayloadServer(MockServer):
+    """answers GET requests of `name/...` endpoints with payloads[name]"""
+
+    payloads = {}
+
+    def answer(self, method, endpoint, params, data, token=None):
+        if endpoint == "":
+            return super().answer(method, endpoint, params, data, token)
+        return 200, self.payloads[endpoint.split("/")[0]]
+
+
+def load(qa_pairs, raw, name, duration, results):
+    request = RequestMp(qa_pairs, token="benchmark", raw=raw)
+    cpu0, t0 = cpu_time(os.getpid()), perf_counter()
+    n = 0
+    while perf_counter() - t0 < duration:
+        request.get(f"{name}/{n}", ttl=0)
+        n += 1
+    results.put((n, cpu_time(os.getpid()) - cpu0))
+
+
+def end_to_end(qa_pairs, messenger_pid, raw, name, duration):
+    results = mp.Queue()
+    p = mp.Process(target=load, args=(qa_pairs, raw, name, duration, results))
+    cpu0 = cpu_time(messenger_pid)
+    p.start()
+    n, cpu = results.get()
+    p.join()
+    return {
+        "requests/sec": round(n / duration, 1),
+        "messenger CPU per request (ms)": round(
+            (cpu_time(messenger_pid) - cpu0) / n * 1000, 3
+        ),
+        "caller CPU per request (ms)": round(cpu / n * 1000, 3),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--duration", type=float, default=5)
+    args = parser.parse_args()
+
+    PayloadServer.payloads = payloads()
+    results = {"per response (us)": {}, "end to end": {}}
+    for name, payload in PayloadServer.payloads.items():
+        results["per response (us)"][name] = per_response(payload)
+    print(json.dumps(results["per response (us)"], indent=2))
+
+    mp.set_start_method("fork")
+    manager = mp.Manager()
+    with PayloadServer(per_second=10_000, burst=0) as server:
+        qa_pairs = tuple((manager.Queue(), manager.dict()) for _ in range(2))
+        kwargs = {"base_url": server.url, "workers": 4}
+        api_handler = mp.Process(target=run_messenger, args=(qa_pairs, kwargs))
+        api_handler.start()
+        RequestMp(qa_pairs).get("status")  # wait for the messenger to start
+        for name in PayloadServer.payloads:
+            for raw in [False, True]:
+                key = f"{name} ({'raw' if raw else 'decoded'})"
+                ret = end_to_end(qa_pairs, api_handler.pid, raw, name, args.duration)
+                results["end to end"][key] = ret
+                print(key, json.dumps(ret))
+        api_handler.terminate()
+        api_handler.join()
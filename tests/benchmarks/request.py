@@ -0,0 +1,165 @@
+"""
+Throughput and latency of the request layer (RequestMp -> Manager queues -> messenger),
+with N processes of M coroutines each, against a local stand-in server.
+
+Reports the requests per second, the end-to-end latency, queue wait and round trip time
+percentiles per priority, and the CPU use of the Manager and messenger processes.
+The default messenger() is the baseline for the other configurations.
+Results are saved as JSON, so that runs can be compared.
+
+run from the command line with:
+    python -m tests.benchmarks.request --processes 4 --coroutines 16 --duration 10
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter, sleep, time
+
+import numpy as np
+
+from st2.request import Messenger, RequestMp, messenger_stats
+from tests.benchmarks.messenger import cpu_time
+from tests.mock_server import MockServer
+
+CONFIGURATIONS = {
+    "baseline": {},
+    "workers=16": {"workers": 16},
+    "weighted edf": {"weights": (None, 6, 3, 1), "edf": True, "workers": 16},
+}
+
+
+STATS_INTERVAL = 1  # (the metrics are read from the messenger stats)
+
+
+def run_messenger(qa_pairs, kwargs):
+    Messenger.stats_interval = STATS_INTERVAL
+    Messenger(qa_pairs, **kwargs).run()
+
+
+def load(qa_pairs, coroutines, duration, results):
+    """send requests from `coroutines` coroutines for `duration` seconds"""
+    request = RequestMp(qa_pairs, token="benchmark")
+    pid = os.getpid()
+    latencies = [[] for _ in qa_pairs]
+
+    async def caller(n):
+        priority = n % len(qa_pairs)
+        loop = asyncio.get_running_loop()
+        i = 0
+        while perf_counter() < end:
+            # unique endpoints: no cached or coalesced requests
+            endpoint = f"my/ships/S-{pid}-{n}-{i}"
+            t = perf_counter()
+            await loop.run_in_executor(pool, request.get, endpoint, priority)
+            latencies[priority].append(perf_counter() - t)
+            i += 1
+
+    async def main():
+        await asyncio.gather(*(caller(n) for n in range(coroutines)))
+
+    pool = ThreadPoolExecutor(coroutines)
+    end = perf_counter() + duration
+    asyncio.run(main())
+    results.put(latencies)
+
+
+def percentiles(values, scale=1000):
+    if not values:
+        return None
+    return {
+        f"p{p}": round(float(np.percentile(values, p)) * scale, 2) for p in [50, 90, 99]
+    }
+
+
+def benchmark(manager, server, kwargs, processes, coroutines, duration, classes=4):
+    qa_pairs = tuple((manager.Queue(), manager.dict()) for _ in range(classes))
+    kwargs = dict(kwargs, base_url=server.url)
+    api_handler = mp.Process(target=run_messenger, args=(qa_pairs, kwargs))
+    api_handler.start()
+    RequestMp(qa_pairs).get("status")  # wait for the messenger to start
+
+    pids = [manager._process.pid, api_handler.pid]  # noqa
+    cpu0 = [cpu_time(pid) for pid in pids]
+    results = mp.Queue()
+    loads = [
+        mp.Process(target=load, args=(qa_pairs, coroutines, duration, results))
+        for _ in range(processes)
+    ]
+    t0 = perf_counter()
+    for p in loads:
+        p.start()
+    latencies = [[] for _ in range(classes)]
+    for _ in loads:
+        for priority, values in enumerate(results.get()):
+            latencies[priority].extend(values)
+    for p in loads:
+        p.join()
+    t = perf_counter() - t0
+    cpu = [(cpu_time(pid) - c) / t * 100 for pid, c in zip(pids, cpu0)]
+
+    sleep(STATS_INTERVAL + 1.5)  # the final stats
+    metrics = messenger_stats()["metrics"]["priorities"]
+    api_handler.terminate()
+    api_handler.join()
+
+    n = sum(len(values) for values in latencies)
+    ret = {
+        "requests": n,
+        "requests/sec": round(n / t, 1),
+        "CPU manager (%)": round(cpu[0], 1),
+        "CPU messenger (%)": round(cpu[1], 1),
+        "priorities": {},
+    }
+    for priority, values in enumerate(latencies):
+        m = metrics.get(priority, {})
+        ret["priorities"][priority] = {
+            "requests": len(values),
+            "latency (ms)": percentiles(values),
+            "queue wait (ms, bucket bound)": _metric(m, "wait"),
+            "round trip (ms, bucket bound)": _metric(m, "rtt"),
+        }
+    return ret
+
+
+def _metric(metrics, key):
+    if key not in metrics:
+        return None
+    return {p: round(metrics[key][p] * 1000, 2) for p in ["p50", "p90", "p99"]}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--coroutines", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--latency", type=float, nargs=2, default=[0.03, 0.08])
+    parser.add_argument("--per-second", type=float, default=200)
+    parser.add_argument("--config", nargs="+", default=list(CONFIGURATIONS))
+    parser.add_argument("--output", default=f"benchmark_request_{int(time())}.json")
+    args = parser.parse_args()
+
+    mp.set_start_method("fork")
+    manager = mp.Manager()
+    results = {"arguments": vars(args), "configurations": {}}
+    with MockServer(
+        latency=tuple(args.latency), per_second=args.per_second, burst=0
+    ) as server:
+        for name in args.config:
+            print(f"{name} ({args.processes} processes x {args.coroutines} coroutines)")
+            ret = benchmark(
+                manager,
+                server,
+                CONFIGURATIONS[name],
+                args.processes,
+                args.coroutines,
+                args.duration,
+            )
+            results["configurations"][name] = ret
+            print(json.dumps(ret, indent=2))
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"saved to {args.output}")
@@ -0,0 +1,50 @@
+"""
+A temporary database for the tests that need Postgres,
+on the server of st2.db.conninfo (ST2_DB). Without a server, these tests are skipped.
+"""
+
+import os
+from contextlib import contextmanager
+
+import psycopg
+import pytest
+from psycopg.conninfo import make_conninfo
+
+import st2.db
+from st2.db import db_tables_init
+
+
+def close_pools():
+    """close the connection pools of st2.db (the next db_conn() opens new ones)"""
+    if st2.db._pool is not None:
+        st2.db._pool[1].close()
+    st2.db._pool = None
+    st2.db._async_pools.clear()
+
+
+@contextmanager
+def temporary_database(init=True):
+    """
+    st2.db uses a new database in the block (with the st2 tables, if `init`),
+    which is dropped afterwards.
+    """
+    name = f"st2_test_{os.getpid()}"
+    conninfo = st2.db.conninfo
+    try:
+        admin = psycopg.connect(conninfo, autocommit=True, connect_timeout=3)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"No database server: {e}")
+    with admin:
+        admin.execute(f"DROP DATABASE IF EXISTS {name} WITH (FORCE)")
+        admin.execute(f"CREATE DATABASE {name}")
+    close_pools()
+    st2.db.conninfo = make_conninfo(conninfo, dbname=name)
+    try:
+        if init:
+            db_tables_init()
+        yield st2.db.conninfo
+    finally:
+        close_pools()
+        st2.db.conninfo = conninfo
+        with psycopg.connect(conninfo, autocommit=True) as admin:
+            admin.execute(f"DROP DATABASE {name} WITH (FORCE)")
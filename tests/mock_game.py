@@ -0,0 +1,750 @@
+"""
+A generated SpaceTraders universe, served by MockServer(game=MockGame()).
+
+Implements the endpoints used by st2: the server status, agent registration,
+factions, systems, waypoints, markets, shipyards, jump gates, contracts,
+and the ship actions to dock, orbit, navigate, refuel, trade and buy ships.
+All answers follow the SpaceTraders API v2 format.
+"""
+
+import math
+import random
+import re
+import string
+import threading
+from datetime import timedelta
+from uuid import uuid4
+
+from st2 import time
+from st2.db.static.traits import TRAITS_FACTION, TRAITS_WAYPOINT
+
+FACTIONS = ["COSMIC", "VOID", "GALACTIC", "QUANTUM", "DOMINION"]
+STAR_TYPES = ["RED_STAR", "ORANGE_STAR", "BLUE_STAR", "YOUNG_STAR", "WHITE_DWARF"]
+GOODS = [
+    "FUEL",
+    "IRON_ORE",
+    "COPPER_ORE",
+    "ALUMINUM_ORE",
+    "QUARTZ_SAND",
+    "ICE_WATER",
+    "HYDROCARBON",
+    "FOOD",
+    "MACHINERY",
+    "ELECTRONICS",
+    "MEDICINE",
+    "FABRICS",
+]
+SHIP_TYPES = {
+    # type: (frame, engine speed, fuel capacity, cargo capacity, price)
+    "SHIP_PROBE": ("FRAME_PROBE", 3, 0, 0, 25_000),
+    "SHIP_LIGHT_SHUTTLE": ("FRAME_SHUTTLE", 15, 400, 20, 60_000),
+    "SHIP_MINING_DRONE": ("FRAME_DRONE", 10, 100, 15, 40_000),
+    "SHIP_LIGHT_HAULER": ("FRAME_LIGHT_FREIGHTER", 30, 600, 80, 250_000),
+    "SHIP_COMMAND_FRIGATE": ("FRAME_FRIGATE", 36, 400, 40, 500_000),
+}
+FLIGHT_MODES = {
+    "DRIFT": (250, 0),
+    "STEALTH": (30, 1),
+    "CRUISE": (25, 1),
+    "BURN": (12.5, 2),
+}
+
+
+class MockGameError(Exception):
+    """answered as a SpaceTraders error response"""
+
+    def __init__(self, message, code=400, status_code=400, data=None):
+        super().__init__(message)
+        self.error = {"message": message, "code": code}
+        if data is not None:
+            self.error["data"] = data
+        self.status_code = status_code
+
+
+def _trait(symbol):
+    return dict(TRAITS_WAYPOINT.get(symbol) or {"symbol": symbol, "name": symbol})
+
+
+def _page(items, params):
+    page = int(params.get("page", 1))
+    limit = int(params.get("limit", 10))
+    if not 1 <= limit <= 20:
+        raise MockGameError("Limit must be between 1 and 20", 400)
+    data = items[(page - 1) * limit : page * limit]
+    meta = {"total": len(items), "page": page, "limit": limit}
+    return 200, {"data": data, "meta": meta}
+
+
+class MockGame:
+    """
+    A universe of `systems` generated systems (the first `start_systems` with a faction HQ).
+
+    :param seed: the same seed generates the same universe.
+    :param time_scale: multiplies all travel times and cooldowns
+    (e.g. 0.01 to run the game 100x faster).
+    """
+
+    def __init__(self, systems=100, start_systems=3, seed=0, time_scale=1.0):
+        self.time_scale = time_scale
+        self.reset_date = time.write(time.now())[:10]
+        self.next_reset = time.write(time.now() + timedelta(days=7))
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.systems = {}  # symbol: system
+        self.waypoints = {}  # symbol: waypoint
+        self.markets = {}  # waypoint symbol: market
+        self.shipyards = {}  # waypoint symbol: shipyard
+        self.gates = {}  # waypoint symbol: connections
+        self.factions = {}  # symbol: faction
+        self.agents = {}  # token: agent
+        self.ships = {}  # symbol: ship
+        self.contracts = {}  # agent symbol: [contract]
+        self._generate(systems, start_systems)
+        self._routes = [
+            ("get", r"", self._status),
+            ("post", r"register", self._register),
+            ("get", r"factions", self._get_factions),
+            ("get", r"factions/([^/]+)", self._get_faction),
+            ("get", r"agents/([^/]+)", self._get_agent),
+            ("get", r"my/agent", self._get_my_agent),
+            ("get", r"my/contracts", self._get_contracts),
+            ("get", r"systems", self._get_systems),
+            ("get", r"systems/([^/]+)", self._get_system),
+            ("get", r"systems/([^/]+)/waypoints", self._get_waypoints),
+            ("get", r"systems/([^/]+)/waypoints/([^/]+)", self._get_waypoint),
+            ("get", r"systems/([^/]+)/waypoints/([^/]+)/market", self._get_market),
+            ("get", r"systems/([^/]+)/waypoints/([^/]+)/shipyard", self._get_shipyard),
+            ("get", r"systems/([^/]+)/waypoints/([^/]+)/jump-gate", self._get_gate),
+            ("get", r"my/ships", self._get_ships),
+            ("post", r"my/ships", self._buy_ship),
+            ("get", r"my/ships/([^/]+)", self._get_ship),
+            ("post", r"my/ships/([^/]+)/orbit", self._orbit),
+            ("post", r"my/ships/([^/]+)/dock", self._dock),
+            ("post", r"my/ships/([^/]+)/navigate", self._navigate),
+            ("patch", r"my/ships/([^/]+)/nav", self._nav_patch),
+            ("post", r"my/ships/([^/]+)/refuel", self._refuel),
+            ("post", r"my/ships/([^/]+)/purchase", self._purchase),
+            ("post", r"my/ships/([^/]+)/sell", self._sell),
+        ]
+        self._routes = [(m, re.compile(p), f) for m, p, f in self._routes]
+
+    def answer(self, method, endpoint, params, data, token):
+        """return the status code and JSON response of a request"""
+        for route_method, pattern, func in self._routes:
+            match = pattern.fullmatch(endpoint)
+            if route_method == method and match:
+                break
+        else:
+            return 404, {"error": {"message": f"Not found: {endpoint}", "code": 404}}
+        try:
+            with self._lock:
+                return func(params, data or {}, token, *match.groups())
+        except MockGameError as e:
+            return e.status_code, {"error": e.error}
+
+    # universe
+
+    def _generate(self, systems, start_systems):
+        rnd = self._random
+        symbols = set()
+        while len(symbols) < systems:
+            letters = "".join(rnd.choices(string.ascii_uppercase, k=2))
+            symbols.add(f"X1-{letters}{rnd.randint(1, 99)}")
+        symbols = sorted(symbols)
+        gate_systems = symbols[: max(start_systems, systems // 5)]
+        for n, symbol in enumerate(symbols):
+            faction = FACTIONS[n] if n < start_systems else None
+            self._generate_system(symbol, faction, symbol in gate_systems)
+
+        # every gate connects to its 3 nearest gates (both ways)
+        gates = [s["jumpGate"] for s in self.systems.values() if s.get("jumpGate")]
+        for gate in gates:
+            nearest = sorted(gates, key=lambda g: self._distance(gate, g))[1:4]
+            for other in nearest:
+                self.gates[gate].add(other)
+                self.gates[other].add(gate)
+
+        for n, symbol in enumerate(FACTIONS):
+            hq = symbols[n] if n < start_systems else ""
+            traits = [t for t in TRAITS_FACTION.values() if t][n * 3 : n * 3 + 3]
+            self.factions[symbol] = {
+                "symbol": symbol,
+                "name": symbol.capitalize(),
+                "description": f"The {symbol.capitalize()} faction.",
+                "headquarters": hq,
+                "traits": [dict(t) for t in traits],
+                "isRecruiting": bool(hq),
+            }
+
+    def _generate_system(self, symbol, faction, gate):
+        rnd = self._random
+        system = {
+            "symbol": symbol,
+            "sectorSymbol": "X1",
+            "type": rnd.choice(STAR_TYPES),
+            "x": rnd.randint(-5000, 5000),
+            "y": rnd.randint(-5000, 5000),
+            "waypoints": [],
+            "factions": [{"symbol": faction}] if faction else [],
+        }
+        types = ["PLANET", "PLANET", "MOON", "ASTEROID", "GAS_GIANT", "ORBITAL_STATION"]
+        types = [rnd.choice(types) for _ in range(rnd.randint(4, 12))]
+        if faction:
+            types = ["PLANET", "ORBITAL_STATION", "ENGINEERED_ASTEROID"] + types
+        if gate:
+            types.append("JUMP_GATE")
+        parent = None
+        for n, wp_type in enumerate(types):
+            wp_symbol = f"{symbol}-{string.ascii_uppercase[n % 26]}{n + 1}"
+            orbits = None
+            if wp_type in ["MOON", "ORBITAL_STATION"] and parent is not None:
+                orbits = parent["symbol"]
+                x, y = parent["x"], parent["y"]
+            else:
+                x, y = rnd.randint(-100, 100), rnd.randint(-100, 100)
+            traits = []
+            if faction and n < 2 or rnd.random() < 0.3:
+                traits.append("MARKETPLACE")
+            if faction and n == 1 or rnd.random() < 0.05:
+                traits.append("SHIPYARD")
+            if not traits:
+                traits.append(rnd.choice(["BARREN", "ROCKY", "VOLCANIC", "FROZEN"]))
+            waypoint = {
+                "symbol": wp_symbol,
+                "type": wp_type,
+                "systemSymbol": symbol,
+                "x": x,
+                "y": y,
+                "orbitals": [],
+                "traits": [_trait(t) for t in traits],
+                "modifiers": [],
+                "chart": {"submittedBy": faction or "COSMIC"},
+                "isUnderConstruction": False,
+            }
+            if orbits:
+                waypoint["orbits"] = orbits
+                parent["orbitals"].append({"symbol": wp_symbol})
+            if faction:
+                waypoint["faction"] = {"symbol": faction}
+            if wp_type == "PLANET":
+                parent = waypoint
+            self.waypoints[wp_symbol] = waypoint
+            system["waypoints"].append(waypoint)
+
+            if "MARKETPLACE" in traits:
+                self._generate_market(wp_symbol)
+            if "SHIPYARD" in traits:
+                self._generate_shipyard(wp_symbol)
+            if wp_type == "JUMP_GATE":
+                self.gates[wp_symbol] = set()
+                system["jumpGate"] = wp_symbol
+        self.systems[symbol] = system
+
+    def _generate_market(self, symbol):
+        goods = self._random.sample(GOODS[1:], 6)
+        types = ["EXCHANGE"] + ["IMPORT"] * 3 + ["EXPORT"] * 2 + ["EXCHANGE"]
+        trade_goods = {}
+        for good, trade_type in zip(["FUEL"] + goods, types):
+            price = self._random.randint(20, 2000)
+            trade_goods[good] = {
+                "symbol": good,
+                "tradeVolume": self._random.choice([10, 20, 60, 100]),
+                "type": trade_type,
+                "supply": self._random.choice(
+                    ["SCARCE", "LIMITED", "MODERATE", "HIGH"]
+                ),
+                "activity": self._random.choice(["WEAK", "GROWING", "STRONG"]),
+                "purchasePrice": price,
+                "sellPrice": int(price * 0.95),
+            }
+        self.markets[symbol] = {"tradeGoods": trade_goods, "transactions": []}
+
+    def _generate_shipyard(self, symbol):
+        types = self._random.sample(sorted(SHIP_TYPES), 3)
+        if "SHIP_PROBE" not in types:
+            types[0] = "SHIP_PROBE"
+        self.shipyards[symbol] = {
+            "ships": {t: SHIP_TYPES[t][4] for t in types},
+            "transactions": [],
+        }
+
+    def _distance(self, wp1, wp2):
+        """distance between two waypoints (or their systems, if in other systems)"""
+        w1, w2 = self.waypoints[wp1], self.waypoints[wp2]
+        if w1["systemSymbol"] != w2["systemSymbol"]:
+            w1 = self.systems[w1["systemSymbol"]]
+            w2 = self.systems[w2["systemSymbol"]]
+        return math.hypot(w1["x"] - w2["x"], w1["y"] - w2["y"])
+
+    # lookups
+
+    def _agent(self, token):
+        agent = self.agents.get(token)
+        if agent is None:
+            raise MockGameError("Failed to parse token.", 401, 401)
+        return agent
+
+    def _ship(self, token, symbol):
+        agent = self._agent(token)
+        ship = self.ships.get(symbol)
+        if ship is None or ship["agentSymbol"] != agent["symbol"]:
+            raise MockGameError(f"Ship {symbol} not found.", 404, 404)
+        self._arrive(ship)
+        return ship
+
+    def _system(self, symbol):
+        if symbol not in self.systems:
+            raise MockGameError(f"System {symbol} not found.", 404, 404)
+        return self.systems[symbol]
+
+    def _waypoint(self, system_symbol, symbol):
+        waypoint = self.waypoints.get(symbol)
+        if waypoint is None or waypoint["systemSymbol"] != system_symbol:
+            raise MockGameError(f"Waypoint {symbol} not found.", 404, 404)
+        return waypoint
+
+    def _present(self, token, waypoint_symbol):
+        """whether the agent has a ship at the waypoint"""
+        agent = self.agents.get(token)
+        if agent is None:
+            return False
+        for ship in self.ships.values():
+            if (
+                ship["agentSymbol"] == agent["symbol"]
+                and ship["nav"]["waypointSymbol"] == waypoint_symbol
+                and ship["nav"]["status"] != "IN_TRANSIT"
+            ):
+                return True
+        return False
+
+    @staticmethod
+    def _public(ship):
+        return {k: v for k, v in ship.items() if k != "agentSymbol"}
+
+    # endpoints
+
+    def _status(self, params, data, token):
+        return 200, {
+            "status": "SpaceTraders is currently online and available to play",
+            "version": "v2.2.0 (mock)",
+            "resetDate": self.reset_date,
+            "description": "A local stand-in for the SpaceTraders API",
+            "stats": {
+                "agents": len(self.agents),
+                "ships": len(self.ships),
+                "systems": len(self.systems),
+                "waypoints": len(self.waypoints),
+            },
+            "serverResets": {"next": self.next_reset, "frequency": "weekly"},
+        }
+
+    def _register(self, params, data, token):
+        symbol = data.get("symbol", "")
+        faction = data.get("faction", "")
+        if not 3 <= len(symbol) <= 14:
+            raise MockGameError("Symbol must be 3-14 characters.", 422, 422)
+        if any(a["symbol"] == symbol for a in self.agents.values()):
+            raise MockGameError(f"Agent symbol {symbol} is taken.", 4111, 409)
+        if not self.factions.get(faction, {}).get("isRecruiting"):
+            raise MockGameError(f"Faction {faction} is not recruiting.", 4113, 400)
+        hq_system = self.factions[faction]["headquarters"]
+        hq = self.systems[hq_system]["waypoints"][0]["symbol"]
+        token = uuid4().hex
+        self.agents[token] = {
+            "accountId": uuid4().hex[:25],
+            "symbol": symbol,
+            "headquarters": hq,
+            "credits": 175_000,
+            "startingFaction": faction,
+            "shipCount": 0,
+        }
+        shipyard = self.systems[hq_system]["waypoints"][1]["symbol"]
+        ship = self._new_ship(token, "SHIP_COMMAND_FRIGATE", hq)
+        self._new_ship(token, "SHIP_PROBE", shipyard)
+        contract = {
+            "id": uuid4().hex[:25],
+            "factionSymbol": faction,
+            "type": "PROCUREMENT",
+            "terms": {
+                "deadline": time.write(time.now() + timedelta(days=7)),
+                "payment": {"onAccepted": 1_000, "onFulfilled": 10_000},
+                "deliver": [
+                    {
+                        "tradeSymbol": "IRON_ORE",
+                        "destinationSymbol": hq,
+                        "unitsRequired": 50,
+                        "unitsFulfilled": 0,
+                    }
+                ],
+            },
+            "accepted": False,
+            "fulfilled": False,
+            "deadlineToAccept": time.write(time.now() + timedelta(days=1)),
+        }
+        self.contracts[symbol] = [contract]
+        return 201, {
+            "data": {
+                "token": token,
+                "agent": self.agents[token],
+                "contract": contract,
+                "faction": self.factions[faction],
+                "ship": self._public(ship),
+            }
+        }
+
+    def _new_ship(self, token, ship_type, waypoint_symbol):
+        agent = self.agents[token]
+        agent["shipCount"] += 1
+        symbol = f'{agent["symbol"]}-{agent["shipCount"]:X}'
+        frame, speed, fuel, cargo, _ = SHIP_TYPES[ship_type]
+        waypoint = self.waypoints[waypoint_symbol]
+        location = {
+            k: waypoint[k] for k in ["symbol", "type", "systemSymbol", "x", "y"]
+        }
+        now = time.write()
+        ship = {
+            "symbol": symbol,
+            "agentSymbol": agent["symbol"],
+            "registration": {
+                "name": symbol,
+                "factionSymbol": agent["startingFaction"],
+                "role": "SATELLITE" if ship_type == "SHIP_PROBE" else "COMMAND",
+            },
+            "nav": {
+                "systemSymbol": waypoint["systemSymbol"],
+                "waypointSymbol": waypoint_symbol,
+                "route": {
+                    "destination": location,
+                    "origin": location,
+                    "departureTime": now,
+                    "arrival": now,
+                },
+                "status": "DOCKED",
+                "flightMode": "CRUISE",
+            },
+            "crew": {"current": 0, "required": 0, "capacity": 0, "morale": 100},
+            "frame": {
+                "symbol": frame,
+                "name": frame.split("_", 1)[1].replace("_", " ").title(),
+                "condition": 1,
+                "integrity": 1,
+            },
+            "reactor": {"symbol": "REACTOR_CHEMICAL_I", "condition": 1, "integrity": 1},
+            "engine": {
+                "symbol": "ENGINE_ION_DRIVE_I",
+                "speed": speed,
+                "condition": 1,
+                "integrity": 1,
+            },
+            "cooldown": {
+                "shipSymbol": symbol,
+                "totalSeconds": 0,
+                "remainingSeconds": 0,
+            },
+            "modules": [],
+            "mounts": [],
+            "cargo": {"capacity": cargo, "units": 0, "inventory": []},
+            "fuel": {
+                "current": fuel,
+                "capacity": fuel,
+                "consumed": {"amount": 0, "timestamp": now},
+            },
+        }
+        self.ships[symbol] = ship
+        return ship
+
+    def _get_factions(self, params, data, token):
+        return _page(list(self.factions.values()), params)
+
+    def _get_faction(self, params, data, token, symbol):
+        if symbol not in self.factions:
+            raise MockGameError(f"Faction {symbol} not found.", 404, 404)
+        return 200, {"data": self.factions[symbol]}
+
+    def _get_agent(self, params, data, token, symbol):
+        for agent in self.agents.values():
+            if agent["symbol"] == symbol:
+                public = {k: v for k, v in agent.items() if k != "accountId"}
+                return 200, {"data": public}
+        raise MockGameError(f"Agent {symbol} not found.", 404, 404)
+
+    def _get_my_agent(self, params, data, token):
+        return 200, {"data": self._agent(token)}
+
+    def _get_contracts(self, params, data, token):
+        agent = self._agent(token)
+        return _page(self.contracts.get(agent["symbol"], []), params)
+
+    def _get_systems(self, params, data, token):
+        systems = [self._system_data(s) for s in self.systems.values()]
+        return _page(systems, params)
+
+    def _system_data(self, system):
+        keys = ["symbol", "type", "x", "y", "orbits"]
+        ret = {k: v for k, v in system.items() if k not in ["waypoints", "jumpGate"]}
+        ret["waypoints"] = [
+            dict(
+                {k: wp[k] for k in keys if k in wp},
+                orbitals=[dict(o) for o in wp["orbitals"]],
+            )
+            for wp in system["waypoints"]
+        ]
+        return ret
+
+    def _get_system(self, params, data, token, symbol):
+        return 200, {"data": self._system_data(self._system(symbol))}
+
+    def _get_waypoints(self, params, data, token, system_symbol):
+        waypoints = self._system(system_symbol)["waypoints"]
+        if "type" in params:
+            waypoints = [wp for wp in waypoints if wp["type"] == params["type"]]
+        if "traits" in params:
+            waypoints = [
+                wp
+                for wp in waypoints
+                if params["traits"] in [t["symbol"] for t in wp["traits"]]
+            ]
+        return _page(waypoints, params)
+
+    def _get_waypoint(self, params, data, token, system_symbol, symbol):
+        return 200, {"data": self._waypoint(system_symbol, symbol)}
+
+    def _get_market(self, params, data, token, system_symbol, symbol):
+        self._waypoint(system_symbol, symbol)
+        market = self.markets.get(symbol)
+        if market is None:
+            raise MockGameError(f"Marketplace not found at {symbol}.", 4603, 404)
+        ret = {"symbol": symbol, "imports": [], "exports": [], "exchange": []}
+        for good in market["tradeGoods"].values():
+            key = good["type"].lower() + ("" if good["type"] == "EXCHANGE" else "s")
+            ret[key].append({"symbol": good["symbol"], "name": good["symbol"]})
+        if self._present(token, symbol):
+            ret["tradeGoods"] = [dict(g) for g in market["tradeGoods"].values()]
+            ret["transactions"] = list(market["transactions"][-20:])
+        return 200, {"data": ret}
+
+    def _get_shipyard(self, params, data, token, system_symbol, symbol):
+        self._waypoint(system_symbol, symbol)
+        shipyard = self.shipyards.get(symbol)
+        if shipyard is None:
+            raise MockGameError(f"Shipyard not found at {symbol}.", 4604, 404)
+        ret = {
+            "symbol": symbol,
+            "shipTypes": [{"type": t} for t in shipyard["ships"]],
+            "modificationsFee": 1_000,
+        }
+        if self._present(token, symbol):
+            ret["ships"] = [
+                {
+                    "type": t,
+                    "name": t,
+                    "supply": "MODERATE",
+                    "activity": "WEAK",
+                    "purchasePrice": price,
+                }
+                for t, price in shipyard["ships"].items()
+            ]
+            ret["transactions"] = list(shipyard["transactions"][-20:])
+        return 200, {"data": ret}
+
+    def _get_gate(self, params, data, token, system_symbol, symbol):
+        self._waypoint(system_symbol, symbol)
+        if symbol not in self.gates:
+            raise MockGameError(f"Jump gate not found at {symbol}.", 4605, 404)
+        return 200, {
+            "data": {"symbol": symbol, "connections": sorted(self.gates[symbol])}
+        }
+
+    def _get_ships(self, params, data, token):
+        agent = self._agent(token)
+        ships = [
+            self._public(s)
+            for s in self.ships.values()
+            if s["agentSymbol"] == agent["symbol"]
+        ]
+        return _page(ships, params)
+
+    def _get_ship(self, params, data, token, symbol):
+        return 200, {"data": self._public(self._ship(token, symbol))}
+
+    def _arrive(self, ship):
+        nav = ship["nav"]
+        if (
+            nav["status"] == "IN_TRANSIT"
+            and time.remaining(nav["route"]["arrival"]) == 0
+        ):
+            nav["status"] = "IN_ORBIT"
+
+    def _orbit(self, params, data, token, symbol):
+        ship = self._ship(token, symbol)
+        if ship["nav"]["status"] == "IN_TRANSIT":
+            raise MockGameError("Ship is in transit.", 4214)
+        ship["nav"]["status"] = "IN_ORBIT"
+        return 200, {"data": {"nav": ship["nav"]}}
+
+    def _dock(self, params, data, token, symbol):
+        ship = self._ship(token, symbol)
+        if ship["nav"]["status"] == "IN_TRANSIT":
+            raise MockGameError("Ship is in transit.", 4214)
+        ship["nav"]["status"] = "DOCKED"
+        return 200, {"data": {"nav": ship["nav"]}}
+
+    def _navigate(self, params, data, token, symbol):
+        ship = self._ship(token, symbol)
+        nav = ship["nav"]
+        destination = data.get("waypointSymbol")
+        if nav["status"] != "IN_ORBIT":
+            raise MockGameError("Ship must be in orbit to navigate.", 4236)
+        waypoint = self.waypoints.get(destination)
+        if waypoint is None or waypoint["systemSymbol"] != nav["systemSymbol"]:
+            raise MockGameError(f"Waypoint {destination} not in this system.", 4202)
+        distance = self._distance(nav["waypointSymbol"], destination)
+        multiplier, fuel_rate = FLIGHT_MODES[nav["flightMode"]]
+        fuel = 0 if not ship["fuel"]["capacity"] else math.ceil(distance * fuel_rate)
+        if fuel > ship["fuel"]["current"]:
+            raise MockGameError("Ship has insufficient fuel.", 4203)
+        seconds = round(
+            round(max(1.0, distance)) * multiplier / ship["engine"]["speed"] + 15
+        )
+        now = time.now()
+        arrival = now + timedelta(seconds=seconds * self.time_scale)
+        origin = self.waypoints[nav["waypointSymbol"]]
+        keys = ["symbol", "type", "systemSymbol", "x", "y"]
+        nav.update(
+            {
+                "waypointSymbol": destination,
+                "status": "IN_TRANSIT",
+                "route": {
+                    "origin": {k: origin[k] for k in keys},
+                    "destination": {k: waypoint[k] for k in keys},
+                    "departureTime": time.write(now),
+                    "arrival": time.write(arrival),
+                },
+            }
+        )
+        ship["fuel"]["current"] -= fuel
+        ship["fuel"]["consumed"] = {"amount": fuel, "timestamp": time.write(now)}
+        return 200, {"data": {"nav": nav, "fuel": ship["fuel"], "events": []}}
+
+    def _nav_patch(self, params, data, token, symbol):
+        ship = self._ship(token, symbol)
+        mode = data.get("flightMode")
+        if mode not in FLIGHT_MODES:
+            raise MockGameError(f"Invalid flight mode {mode}.", 422, 422)
+        ship["nav"]["flightMode"] = mode
+        return 200, {"data": ship["nav"]}
+
+    def _docked_market(self, ship):
+        if ship["nav"]["status"] != "DOCKED":
+            raise MockGameError("Ship must be docked.", 4244)
+        market = self.markets.get(ship["nav"]["waypointSymbol"])
+        if market is None:
+            raise MockGameError("No marketplace at this waypoint.", 4601)
+        return market
+
+    def _transaction(self, market, ship, good, trade_type, units, price):
+        agent = next(
+            a for a in self.agents.values() if a["symbol"] == ship["agentSymbol"]
+        )
+        total = units * price
+        if trade_type == "PURCHASE":
+            if total > agent["credits"]:
+                raise MockGameError("Agent has insufficient funds.", 4600)
+            agent["credits"] -= total
+        else:
+            agent["credits"] += total
+        transaction = {
+            "waypointSymbol": ship["nav"]["waypointSymbol"],
+            "shipSymbol": ship["symbol"],
+            "tradeSymbol": good,
+            "type": trade_type,
+            "units": units,
+            "pricePerUnit": price,
+            "totalPrice": total,
+            "timestamp": time.write(),
+        }
+        market["transactions"].append(transaction)
+        return agent, transaction
+
+    def _refuel(self, params, data, token, symbol):
+        ship = self._ship(token, symbol)
+        market = self._docked_market(ship)
+        fuel = ship["fuel"]
+        missing = fuel["capacity"] - fuel["current"]
+        units = data.get("units") or missing
+        price = market["tradeGoods"]["FUEL"]["purchasePrice"]
+        agent, transaction = self._transaction(
+            market, ship, "FUEL", "PURCHASE", math.ceil(units / 100), price
+        )
+        fuel["current"] = min(fuel["capacity"], fuel["current"] + units)
+        return 200, {"data": {"agent": agent, "fuel": fuel, "transaction": transaction}}
+
+    def _trade(self, token, symbol, data, trade_type):
+        ship = self._ship(token, symbol)
+        market = self._docked_market(ship)
+        good, units = data.get("symbol"), int(data.get("units", 0))
+        trade_good = market["tradeGoods"].get(good)
+        if trade_good is None:
+            raise MockGameError(f"Market does not trade {good}.", 4602)
+        if units > trade_good["tradeVolume"]:
+            raise MockGameError("Units exceed the trade volume.", 4604)
+        cargo = ship["cargo"]
+        inventory = {item["symbol"]: item for item in cargo["inventory"]}
+        if trade_type == "PURCHASE":
+            if cargo["units"] + units > cargo["capacity"]:
+                raise MockGameError("Ship has insufficient cargo space.", 4217)
+            price = trade_good["purchasePrice"]
+            item = inventory.setdefault(good, {"symbol": good, "units": 0})
+            item["units"] += units
+            cargo["units"] += units
+            trade_good["purchasePrice"] += max(1, price // 100)
+        else:
+            if inventory.get(good, {}).get("units", 0) < units:
+                raise MockGameError(f"Ship does not have {units} {good}.", 4219)
+            price = trade_good["sellPrice"]
+            inventory[good]["units"] -= units
+            cargo["units"] -= units
+            trade_good["sellPrice"] = max(1, price - price // 100)
+        cargo["inventory"] = [item for item in inventory.values() if item["units"]]
+        agent, transaction = self._transaction(
+            market, ship, good, trade_type, units, price
+        )
+        return 201, {
+            "data": {"agent": agent, "cargo": cargo, "transaction": transaction}
+        }
+
+    def _purchase(self, params, data, token, symbol):
+        return self._trade(token, symbol, data, "PURCHASE")
+
+    def _sell(self, params, data, token, symbol):
+        return self._trade(token, symbol, data, "SELL")
+
+    def _buy_ship(self, params, data, token):
+        agent = self._agent(token)
+        ship_type, waypoint_symbol = data.get("shipType"), data.get("waypointSymbol")
+        shipyard = self.shipyards.get(waypoint_symbol)
+        if shipyard is None or ship_type not in shipyard["ships"]:
+            raise MockGameError(f"{ship_type} is not sold at {waypoint_symbol}.", 4604)
+        if not self._present(token, waypoint_symbol):
+            raise MockGameError("Agent has no ship at the shipyard.", 4604)
+        price = shipyard["ships"][ship_type]
+        if price > agent["credits"]:
+            raise MockGameError("Agent has insufficient funds.", 4216)
+        agent["credits"] -= price
+        ship = self._new_ship(token, ship_type, waypoint_symbol)
+        transaction = {
+            "waypointSymbol": waypoint_symbol,
+            "shipSymbol": ship["symbol"],
+            "shipType": ship_type,
+            "price": price,
+            "agentSymbol": agent["symbol"],
+            "timestamp": time.write(),
+        }
+        shipyard["transactions"].append(transaction)
+        return 201, {
+            "data": {
+                "agent": agent,
+                "ship": self._public(ship),
+                "transaction": transaction,
+            }
+        }
@@ -0,0 +1,271 @@
+"""
+A local stand-in for the SpaceTraders API server, for offline tests and benchmarks.
+
+Example:
+    ```
+    from st2.request import Request
+    from tests.mock_game import MockGame
+    from tests.mock_server import MockServer
+
+    with MockServer(latency=0.2, game=MockGame()) as server:
+        request = Request(base_url=server.url)
+        request.get("status")
+    ```
+
+The whole stack can use a running server through the ST2_BASE_URL environment variable:
+    python -m tests.mock_server --port 8000 --systems 1000 --latency 0.1 --rate-limit
+    ST2_BASE_URL=http://127.0.0.1:8000/v2/ python main.py
+"""
+
+import argparse
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps, loads
+from queue import Queue
+from time import monotonic, sleep
+
+from st2.request import Messenger, RequestMp
+from tests.mock_game import MockGame
+
+
+class MockServer(ThreadingHTTPServer):
+    """
+    Answers every request after `latency` seconds,
+    with the rate limit headers of the SpaceTraders API.
+
+    :param port: 0 selects a free port.
+    :param latency: seconds, or a (min, max) range.
+    :param rate_limit: answer requests over the rate limit with a 429 error,
+    like the SpaceTraders server. Otherwise, the rate limit is only reported.
+    :param error_rate: fraction of the requests answered with a random `error_codes` error.
+    :param game: answers the requests (see MockGame). Without a game,
+    the status endpoint is answered and all other requests are echoed.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port=0,
+        latency=0.0,
+        per_second=2,
+        burst=30,
+        burst_time=60,
+        rate_limit=False,
+        error_rate=0.0,
+        error_codes=(500, 502, 503),
+        game=None,
+    ):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.per_second = per_second
+        self.burst = burst
+        self.burst_time = burst_time
+        self.rate_limit = rate_limit
+        self.error_rate = error_rate
+        self.error_codes = error_codes
+        self.game = game
+        self.requests = 0
+        self.limited = 0  # requests answered with a 429 error
+        self.errors = 0  # requests answered with an injected error
+        self._thread = None
+
+        self._lock = threading.Lock()
+        self._tokens = per_second
+        self._updated = monotonic()
+        self._remaining = burst
+        self._reset = None  # monotonic time at which the burst pool refills
+        self._fail = 0  # the next requests that fail
+        self._fail_code = 503
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/v2/"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def fail(self, n=1, status_code=503):
+        """answer the next n requests with an error"""
+        with self._lock:
+            self._fail = n
+            self._fail_code = status_code
+
+    def delay(self):
+        if isinstance(self.latency, (tuple, list)):
+            return random.uniform(*self.latency)
+        return self.latency
+
+    def error(self):
+        """the status code of an injected error (or None)"""
+        with self._lock:
+            if self._fail:
+                self._fail -= 1
+                return self._fail_code
+        if self.error_rate and random.random() < self.error_rate:
+            return random.choice(self.error_codes)
+        return None
+
+    def answer(self, method, endpoint, params, data, token=None):
+        """return the status code and JSON response of a request"""
+        if self.game is not None:
+            return self.game.answer(method, endpoint, params, data, token)
+        if endpoint == "":
+            return 200, {"status": "SpaceTraders is currently online (mock server)"}
+        return 200, {"data": {"method": method, "endpoint": endpoint, "data": data}}
+
+    def take(self):
+        """use the rate limit, and return the seconds to wait if it is exceeded"""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.per_second,
+                self._tokens + (now - self._updated) * self.per_second,
+            )
+            self._updated = now
+            if self._reset is not None and now >= self._reset:
+                self._remaining = self.burst
+                self._reset = None
+            if self._tokens >= 1:
+                self._tokens -= 1
+            elif self._remaining > 0:
+                self._remaining -= 1
+                if self._reset is None:
+                    self._reset = now + self.burst_time
+            else:
+                return (1 - self._tokens) / self.per_second
+            return 0
+
+    def rate_limit_headers(self):
+        with self._lock:
+            reset_in = self.burst_time
+            if self._reset is not None:
+                reset_in = max(self._reset - monotonic(), 0)
+            remaining = self._remaining
+        reset = datetime.now(timezone.utc) + timedelta(seconds=reset_in)
+        return {
+            "x-ratelimit-type": "IP Address",
+            "x-ratelimit-limit-per-second": str(self.per_second),
+            "x-ratelimit-limit-burst": str(self.burst),
+            "x-ratelimit-limit-burst-time": str(self.burst_time),
+            "x-ratelimit-remaining": str(remaining),
+            "x-ratelimit-reset": reset.isoformat(),
+        }
+
+    def rate_limit_error(self, retry_after):
+        headers = self.rate_limit_headers()
+        data = {
+            "type": headers["x-ratelimit-type"],
+            "retryAfter": retry_after,
+            "limitBurst": self.burst,
+            "limitPerSecond": self.per_second,
+            "remaining": int(headers["x-ratelimit-remaining"]),
+            "reset": headers["x-ratelimit-reset"],
+        }
+        message = "You have reached your API limit. Please wait and try again."
+        return 429, {"error": {"message": message, "code": 429, "data": data}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockServer
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, *args):
+        pass  # silence
+
+    def _handle(self, method):
+        path, _, query = self.path.partition("?")
+        endpoint = path.removeprefix("/v2/").strip("/")
+        params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+        length = int(self.headers.get("Content-Length", 0))
+        data = loads(self.rfile.read(length)) if length else None
+
+        auth = self.headers.get("Authorization", "")
+        token = auth.removeprefix("Bearer ") or None
+
+        server = self.server
+        server.requests += 1
+        sleep(server.delay())
+        retry_after = server.take()
+        error = server.error()
+        if retry_after and server.rate_limit:
+            server.limited += 1
+            status_code, resp_json = server.rate_limit_error(retry_after)
+        elif error is not None:
+            server.errors += 1
+            message = "Injected server error (mock server)"
+            status_code, resp_json = error, {
+                "error": {"message": message, "code": error}
+            }
+        else:
+            status_code, resp_json = server.answer(
+                method, endpoint, params, data, token
+            )
+
+        body = dumps(resp_json).encode()
+        self.send_response(status_code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in self.server.rate_limit_headers().items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._handle("get")
+
+    def do_POST(self):
+        self._handle("post")
+
+    def do_PATCH(self):
+        self._handle("patch")
+
+
+def start_messenger(server, classes=2, **kwargs):
+    """run a Messenger for the server in a thread, and return it with a RequestMp"""
+    qa_pairs = [(Queue(), {}) for _ in range(classes)]
+    messenger = Messenger(qa_pairs, base_url=server.url, **kwargs)
+    threading.Thread(target=messenger.run, daemon=True).start()
+    return messenger, RequestMp(qa_pairs, token="token")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local SpaceTraders server")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--systems", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--time-scale", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--per-second", type=float, default=2)
+    parser.add_argument("--burst", type=int, default=30)
+    parser.add_argument("--rate-limit", action="store_true")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    game = MockGame(args.systems, seed=args.seed, time_scale=args.time_scale)
+    server = MockServer(
+        args.port,
+        args.latency[0] if len(args.latency) == 1 else tuple(args.latency[:2]),
+        args.per_second,
+        args.burst,
+        rate_limit=args.rate_limit,
+        error_rate=args.error_rate,
+        game=game,
+    )
+    print(f"Serving {args.systems} systems at {server.url}")
+    server.serve_forever()
@@ -0,0 +1,76 @@
+import threading
+from time import perf_counter, sleep
+
+from st2.scheduler import Scheduler
+
+
+def test_scheduler_priority():
+    scheduler = Scheduler(3)
+    scheduler.put(2, "c")
+    scheduler.put(1, "b1")
+    scheduler.put(0, "a")
+    scheduler.put(1, "b2")
+    assert len(scheduler) == 4
+    jobs = [scheduler.get() for _ in range(4)]
+    assert jobs == [(0, "a"), (1, "b1"), (1, "b2"), (2, "c")]
+    assert scheduler.get(timeout=0.01) is None
+
+
+def test_scheduler_blocks():
+    scheduler = Scheduler(2)
+
+    def put():
+        sleep(0.1)
+        scheduler.put(1, "job")
+
+    threading.Thread(target=put).start()
+    t0 = perf_counter()
+    assert scheduler.get() == (1, "job")
+    assert perf_counter() - t0 >= 0.09
+
+
+def test_scheduler_weights():
+    scheduler = Scheduler(4, weights=(None, 6, 3, 1))
+    for priority in range(1, 4):
+        for n in range(100):
+            scheduler.put(priority, n)
+    served = [scheduler.get()[0] for _ in range(100)]
+    assert served.count(1) == 60
+    assert served.count(2) == 30
+    assert served.count(3) == 10  # never starved
+
+    # strict classes preempt the weighted classes
+    scheduler.put(0, "high")
+    assert scheduler.get() == (0, "high")
+    assert scheduler.stats()["served"] == [1, 60, 30, 10]
+
+
+def test_scheduler_idle_class():
+    scheduler = Scheduler(2, weights=(1, 1))
+    for n in range(10):
+        scheduler.put(0, n)
+    for _ in range(10):
+        scheduler.get()
+
+    # an idle class does not save up credit while the other classes are busy
+    for n in range(4):
+        scheduler.put(0, n)
+        scheduler.put(1, n)
+    served = [scheduler.get()[0] for _ in range(4)]
+    assert served.count(0) == 2
+
+
+def test_scheduler_edf():
+    scheduler = Scheduler(2, edf=True)
+    scheduler.put(1, "no deadline")
+    scheduler.put(1, "late", deadline=30)
+    scheduler.put(1, "early", deadline=10)
+    scheduler.put(0, "high", deadline=50)
+    jobs = [scheduler.get() for _ in range(4)]
+    assert jobs == [(0, "high"), (1, "early"), (1, "late"), (1, "no deadline")]
+
+    # deadlines are ignored in first in, first out mode
+    scheduler = Scheduler(1)
+    scheduler.put(0, "first", deadline=30)
+    scheduler.put(0, "second", deadline=10)
+    assert scheduler.get() == (0, "first")
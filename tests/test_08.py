@@ -0,0 +1,127 @@
+from datetime import timedelta
+from time import perf_counter, sleep
+
+import pytest
+
+from st2 import time
+from st2.exceptions import ServerDownError
+from st2.limiter import CircuitBreaker, RateLimiter
+from st2.request import Request
+from tests.mock_server import MockServer, start_messenger
+
+
+def headers(remaining, reset_in, per_second=10, burst=5, burst_time=1):
+    return {
+        "x-ratelimit-limit-per-second": str(per_second),
+        "x-ratelimit-limit-burst": str(burst),
+        "x-ratelimit-limit-burst-time": str(burst_time),
+        "x-ratelimit-remaining": str(remaining),
+        "x-ratelimit-reset": time.write(time.now() + timedelta(seconds=reset_in)),
+    }
+
+
+def test_limiter_steady():
+    limiter = RateLimiter(per_second=10, burst=0)
+    t0 = perf_counter()
+    for _ in range(15):
+        limiter.acquire()
+    # 10 requests from the full bucket, then 5 at 10 per second
+    assert 0.4 < perf_counter() - t0 < 0.7
+    assert limiter.stats()["steady"] == 15
+    assert limiter.stats()["burst_used"] == 0
+
+
+def test_limiter_burst():
+    limiter = RateLimiter(per_second=10, reserve=1)
+    limiter.update(headers(remaining=5, reset_in=1))
+    t0 = perf_counter()
+    for _ in range(14):
+        limiter.acquire()
+    # 10 requests from the steady bucket, 4 from the burst pool
+    assert perf_counter() - t0 < 0.1
+    stats = limiter.stats()
+    assert stats["burst_used"] == 4
+    assert stats["burst"] == 5
+
+    # the unused burst request is wasted when the pool refills
+    sleep(1.1)
+    limiter.acquire()
+    assert limiter.stats()["burst_wasted"] == 1
+
+
+def test_limiter_release():
+    limiter = RateLimiter(per_second=1, burst=0)
+    token = limiter.acquire()
+    assert token == "steady"
+    limiter.release(token)
+    t0 = perf_counter()
+    limiter.acquire()  # the token was given back
+    assert perf_counter() - t0 < 0.1
+    assert limiter.stats()["steady"] == 1
+
+
+def test_limiter_penalize():
+    limiter = RateLimiter(per_second=10, burst=0)
+    limiter.penalize(0.3)
+    t0 = perf_counter()
+    limiter.acquire()
+    assert perf_counter() - t0 >= 0.29
+    assert limiter.stats()["limited"] == 1
+
+
+def test_breaker_probe():
+    breaker = CircuitBreaker(backoff=0.2, jitter=0)
+    assert breaker.acquire() is False
+    breaker.failure(503)
+    assert breaker.is_open
+    with pytest.raises(ServerDownError):
+        breaker.acquire(fail_fast=True)
+
+    # one probe after the backoff, the others wait for its result
+    t0 = perf_counter()
+    assert breaker.acquire() is True
+    assert 0.15 < perf_counter() - t0 < 0.3
+    assert breaker.wait(timeout=0.1) is False
+    breaker.failure(503, probe=True)
+    assert breaker.stats()["backoff"] == 0.4
+    assert breaker.acquire() is True
+    breaker.success()
+    assert not breaker.is_open
+    assert breaker.wait(timeout=0) is True
+    assert breaker.stats()["opened"] == 1
+    assert breaker.stats()["probes"] == 2
+
+
+def test_breaker_server_down():
+    with MockServer() as server:
+        server.fail(2, 503)
+        request = Request(base_url=server.url)
+        request.breaker = CircuitBreaker(backoff=0.1, jitter=0)
+        t0 = perf_counter()
+        assert request.get("status")["status"]
+        # backoff 0.1 + 0.2 sec
+        assert 0.25 < perf_counter() - t0 < 0.5
+        assert request.last_retries == {503: 2}
+        assert not request.breaker.is_open
+
+
+def test_priority_decided_at_send_time():
+    with MockServer(per_second=2, burst=0) as server:
+        messenger, request = start_messenger(server, workers=4)
+        # the workers are slow to start sending (e.g. busy threads)
+        breaker_acquire = messenger.session.breaker.acquire
+
+        def acquire(fail_fast=False):
+            sleep(0.2)
+            return breaker_acquire(fail_fast)
+
+        messenger.session.breaker.acquire = acquire
+        low = [request._submit("get", f"my/ships/S-{n}", 1, None) for n in range(6)]
+        sleep(0.1)
+        t0 = perf_counter()
+        request.get("my/ships/S-high", priority=0)
+        # sent with the next token (at 0.5 sec), instead of waiting for
+        #  low priority requests that were selected without a token
+        assert perf_counter() - t0 < 0.8
+        for future in low:
+            future.result()
@@ -0,0 +1,35 @@
+from uuid import uuid4
+
+from st2.request import Request, ResponseCache, response_cache
+from tests.mock_server import MockServer
+
+
+def test_response_cache_rules():
+    rules = ResponseCache()
+    assert rules.ttl("systems") > 0
+    assert rules.ttl("systems/X1-A1") > 0
+    assert rules.ttl("systems/X1-A1/waypoints/X1-A1-B2/jump-gate") > 0
+    assert rules.ttl("systems/X1-A1/waypoints/X1-A1-B2/market") == 0
+    assert rules.ttl("my/ships") == 0
+
+
+def test_response_cache_hits():
+    token = str(uuid4())  # not cached yet
+    hits, misses = response_cache.hits, response_cache.misses
+    with MockServer() as server:
+        request = Request(base_url=server.url)
+        first = request.get("systems/X1-A1", token=token)
+        assert request.get("systems/X1-A1", token=token) == first
+        assert server.requests == 1
+        assert request.limiter.stats()["steady"] == 1
+
+        # other parameters, tokens and uncached endpoints are requested
+        request.get("systems/X1-A1", token=token, params={"page": 2})
+        request.get("my/ships", token=token)
+        request.get("my/ships", token=token)
+        request.get("systems/X1-A1", token=token, ttl=0)
+        assert server.requests == 5
+
+    assert response_cache.hits - hits == 1
+    assert response_cache.misses - misses == 2
+    response_cache.clear()
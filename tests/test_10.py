@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+
+from tests.mock_server import MockServer, start_messenger
+
+
+def test_coalesce_identical_gets():
+    with MockServer(latency=0.3) as server:
+        messenger, request = start_messenger(server)
+        with ThreadPoolExecutor(5) as pool:
+            futures = [pool.submit(request.get, "my/ships") for _ in range(5)]
+            answers = [f.result() for f in futures]
+        assert all(answer == answers[0] for answer in answers)
+        assert server.requests == 1
+        assert sum(messenger.stats()["coalesced"]) == 4
+
+        # other params or tokens are different requests
+        with ThreadPoolExecutor(2) as pool:
+            pool.submit(request.get, "my/ships", params={"page": 2})
+            pool.submit(request.get, "my/ships", token="other")
+        assert server.requests == 3
+
+
+def test_coalesce_not_across_other_requests():
+    with MockServer(latency=0.3) as server:
+        _, request = start_messenger(server)
+        with ThreadPoolExecutor(3) as pool:
+            pool.submit(request.get, "my/ships")
+            sleep(0.1)
+            pool.submit(request.post, "my/ships/S-1/orbit")
+            sleep(0.1)
+            # may be outdated by the POST request
+            pool.submit(request.get, "my/ships")
+        assert server.requests == 3
@@ -0,0 +1,49 @@
+from st2.metrics import Histogram, RequestMetrics, endpoint_template
+from tests.mock_server import MockServer, start_messenger
+
+
+def test_endpoint_template():
+    assert endpoint_template("my/ships") == "my/ships"
+    assert endpoint_template("my/ships/S-1/orbit") == "my/ships/{shipSymbol}/orbit"
+    assert (
+        endpoint_template("systems/X1-A1/waypoints/X1-A1-B2/market")
+        == "systems/{systemSymbol}/waypoints/{waypointSymbol}/market"
+    )
+    assert endpoint_template("") == ""
+
+
+def test_histogram():
+    histogram = Histogram()
+    assert histogram.percentile(50) is None
+    for n in range(100):
+        histogram.add(0.001 * n)
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 100
+    assert snapshot["max"] == 0.099
+    assert 0.032 <= snapshot["p50"] <= 0.064
+    assert 0.064 <= snapshot["p99"] <= 0.128
+
+
+def test_request_metrics():
+    metrics = RequestMetrics()
+    metrics.record(0, "get", "my/ships/S-1", 10.0, 10.5, 11.0)
+    metrics.record(1, "get", "my/ships/S-2", None, 20.0, 20.2, "GameError", {429: 1})
+    snapshot = metrics.snapshot()
+    endpoint = snapshot["endpoints"]["GET my/ships/{shipSymbol}"]
+    assert endpoint["requests"] == 2
+    assert endpoint["wait"]["count"] == 1
+    assert endpoint["errors"] == {"GameError": 1}
+    assert endpoint["retries"] == {429: 1}
+    assert snapshot["priorities"][0]["requests"] == 1
+
+
+def test_messenger_metrics():
+    with MockServer(latency=0.05) as server:
+        messenger, request = start_messenger(server)
+        request.get("my/ships")
+        request.post("my/ships/S-1/orbit", priority=1)
+        metrics = messenger.stats()["metrics"]
+    assert metrics["endpoints"]["GET my/ships"]["requests"] == 1
+    rtt = metrics["endpoints"]["POST my/ships/{shipSymbol}/orbit"]["rtt"]
+    assert rtt["max"] >= 0.05
+    assert metrics["priorities"][1]["wait"]["count"] == 1
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from st2 import time
+from st2.exceptions import GameError
+from st2.request import Request
+from tests.mock_game import MockGame
+from tests.mock_server import MockServer
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockServer(game=MockGame(systems=20, time_scale=0.01)) as server:
+        yield server
+
+
+def test_game_universe(server):
+    request = Request(base_url=server.url)
+    assert request.get("status")["stats"]["systems"] == 20
+    systems = [s for page in request.get_all("systems", ttl=0) for s in page["data"]]
+    assert len(systems) == 20
+    system = systems[0]
+    waypoints = request.get_all(f'systems/{system["symbol"]}/waypoints', ttl=0)
+    waypoints = [wp for page in waypoints for wp in page["data"]]
+    assert len(waypoints) == len(system["waypoints"])
+    gate = [wp for wp in waypoints if wp["type"] == "JUMP_GATE"][0]
+    endpoint = f'systems/{system["symbol"]}/waypoints/{gate["symbol"]}/jump-gate'
+    assert request.get(endpoint, ttl=0)["data"]["connections"]
+
+
+def test_game_agent(server):
+    request = Request(base_url=server.url)
+    data = request.post("register", data={"symbol": "MOCKAGENT", "faction": "COSMIC"})
+    data = data["data"]
+    token, ship = data["token"], data["ship"]
+    assert request.get("my/agent", token=token)["data"]["symbol"] == "MOCKAGENT"
+    assert len(request.get("my/ships", token=token)["data"]) == 2
+
+    # market prices are only shown with a ship present
+    nav = ship["nav"]
+    market = f'systems/{nav["systemSymbol"]}/waypoints/{nav["waypointSymbol"]}/market'
+    assert "tradeGoods" in request.get(market, token=token)["data"]
+    assert "tradeGoods" not in request.get(market)["data"]
+
+    # navigate
+    with pytest.raises(GameError):
+        request.post(f'my/ships/{ship["symbol"]}/navigate', token=token, data={})
+    request.post(f'my/ships/{ship["symbol"]}/orbit', token=token)
+    destination = data["faction"]["headquarters"] + "-C3"
+    data = request.post(
+        f'my/ships/{ship["symbol"]}/navigate',
+        token=token,
+        data={"waypointSymbol": destination},
+    )["data"]
+    assert data["nav"]["status"] == "IN_TRANSIT"
+    time.sleep(time.remaining(data["nav"]["route"]["arrival"]) + 0.01)
+    ship = request.get(f'my/ships/{ship["symbol"]}', token=token)["data"]
+    assert ship["nav"]["status"] == "IN_ORBIT"
+    assert ship["fuel"]["current"] < ship["fuel"]["capacity"]
+
+
+def test_rate_limit_and_errors():
+    with MockServer(per_second=10, burst=0, rate_limit=True, error_rate=0.1) as server:
+        # two clients that each use the whole rate limit
+        requests = [Request(base_url=server.url) for _ in range(2)]
+        for request in requests:
+            request.breaker.backoff = request.breaker.backoff_502 = 0.01
+
+        def get(n):
+            return requests[n % 2].get(f"my/ships/S-{n}")["data"]
+
+        with ThreadPoolExecutor(2) as pool:
+            assert all(pool.map(get, range(40)))
+        assert server.limited > 0
+        assert server.errors > 0
+        limited = sum(request.limiter.stats()["limited"] for request in requests)
+        assert limited == server.limited
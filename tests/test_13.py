@@ -0,0 +1,65 @@
+from time import perf_counter
+
+import pytest
+
+from st2.cassette import Cassette
+from st2.exceptions import CassetteError
+from st2.request import Request
+from tests.mock_server import MockServer
+
+
+def test_cassette_record_replay(tmp_path):
+    path = tmp_path / "session.jsonl"
+    with MockServer(latency=0.1) as server:
+        request = Request(base_url=server.url, cassette=Cassette(path))
+        recorded = [
+            request.get("my/ships"),
+            request.post("my/ships/S-1/orbit", data={"x": 1}),
+            request.get("my/ships", params={"page": 2, "limit": 20}),
+        ]
+        request.cassette.close()
+        assert request.cassette.stats()["recorded"] == 3
+    assert len(path.read_text().splitlines()) == 3
+
+    # full speed, without the server
+    request = Request(cassette=Cassette(path, "replay"))
+    t0 = perf_counter()
+    assert request.get("my/ships", params={"limit": 20, "page": 2}) == recorded[2]
+    assert request.get("my/ships") == recorded[0]
+    assert request.post("my/ships/S-1/orbit", data={"x": 1}) == recorded[1]
+    assert perf_counter() - t0 < 0.1
+    with pytest.raises(CassetteError):
+        request.post("my/ships/S-1/orbit", data={"x": 2})
+
+    # original pacing
+    request = Request(cassette=Cassette(path, "replay", pace=True))
+    t0 = perf_counter()
+    assert request.get("my/ships") == recorded[0]
+    assert perf_counter() - t0 >= 0.1
+
+
+def test_cassette_replays_errors(tmp_path):
+    path = tmp_path / "session.jsonl"
+    with MockServer() as server:
+        server.fail(1, 503)
+        request = Request(base_url=server.url, cassette=Cassette(path))
+        request.breaker.backoff = 0.01
+        request.get("my/ships")
+        request.cassette.close()
+
+    request = Request(cassette=Cassette(path, "replay"))
+    assert request.get("my/ships")["data"]
+    assert request.last_retries == {503: 1}
+
+
+def test_cassette_replays_copies(tmp_path):
+    path = tmp_path / "session.jsonl"
+    with MockServer() as server:
+        request = Request(base_url=server.url, cassette=Cassette(path))
+        recorded = request.get("my/ships")
+        request.cassette.close()
+
+    request = Request(cassette=Cassette(path, "replay"))
+    # the last exchange is repeated: changes to one answer do not affect the others
+    request.get("my/ships")["data"].clear()
+    assert request.get("my/ships") == recorded
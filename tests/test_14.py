@@ -0,0 +1,148 @@
+import asyncio
+from concurrent.futures import Future
+
+import pytest
+
+from st2.agent import register_agent
+from st2.exceptions import GameError
+from st2.pathing.travel import travel
+from st2.request import AsyncRequestMp, RequestMp, _page_futures
+from st2.ship import AsyncShip
+from tests.database import temporary_database
+from tests.mock_game import MockGame
+from tests.mock_server import MockServer, start_messenger
+
+
+def async_request(server):
+    _, request = start_messenger(server)
+    return AsyncRequestMp(list(request.queues.values()), token=request.token)
+
+
+@pytest.fixture(scope="module")
+def server():
+    with MockServer(game=MockGame(systems=30, time_scale=0.01)) as server:
+        yield server
+
+
+def test_async_requests(server):
+    request = async_request(server)
+
+    async def main():
+        status = await request.get("status")
+        systems = [
+            system
+            async for page in request.get_all("systems", ttl=0)
+            for system in page["data"]
+        ]
+        data = await request.post(
+            "register", data={"symbol": "ASYNCAGENT", "faction": "COSMIC"}
+        )
+        return status, systems, data["data"]
+
+    status, systems, data = asyncio.run(main())
+    assert status["stats"]["systems"] == 30
+    assert len({system["symbol"] for system in systems}) == 30
+    assert data["agent"]["symbol"] == "ASYNCAGENT"
+
+    # errors are raised in the coroutine
+    with pytest.raises(GameError):
+        asyncio.run(request.get("my/ships/UNKNOWN-1", token=data["token"]))
+
+    # a blocking request for the same queues
+    assert isinstance(request.sync, RequestMp)
+    assert request.sync.get("status")["stats"]["systems"] == 30
+
+
+def test_page_futures():
+    # (the pages of RequestMp.get_all and AsyncRequestMp.get_all)
+    submitted = {}
+
+    def submit(page):
+        submitted[page] = Future()
+        return submitted[page]
+
+    futures = _page_futures({"meta": {"total": 95, "limit": 20}}, submit, window=2)
+    assert next(futures) is submitted[2]
+    assert list(submitted) == [2, 3]
+    submitted[2].set_result("page 2")
+    assert next(futures) is submitted[3]
+    assert list(submitted) == [2, 3, 4]
+    # closed before the last pages: the pages not yet answered are cancelled
+    futures.close()
+    assert [f.cancelled() for f in submitted.values()] == [False, True, True]
+
+
+def test_event_loop_responsive():
+    ticks = []
+
+    async def heartbeat():
+        while True:
+            ticks.append(asyncio.get_running_loop().time())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        task = asyncio.create_task(heartbeat())
+        await asyncio.gather(*(request.get(f"my/ships/S-{n}") for n in range(4)))
+        task.cancel()
+
+    with MockServer(latency=0.3) as server:
+        request = async_request(server)
+        asyncio.run(main())
+    # the heartbeat kept beating while the requests were answered
+    assert len(ticks) > 10
+    assert max(t1 - t0 for t0, t1 in zip(ticks, ticks[1:])) < 0.2
+
+
+def test_async_ship_actions(server):
+    request = async_request(server)
+    with temporary_database():
+        data = register_agent(request.sync, 0, "SHIPAGENT")
+        ship = AsyncShip(data["ship"]["symbol"], list(request.queues.values()), 0)
+
+        async def main():
+            await ship.orbit()
+            # (runs Ship.buy in a thread, which docks the ship first)
+            bought = await ship.buy("FUEL", 2)
+            sold = await ship.sell("FUEL", 2)
+            return bought, sold
+
+        bought, sold = asyncio.run(main())
+    assert bought > 0 and sold > 0
+    assert ship["nav"]["status"] == "DOCKED"
+    assert ship["cargo"]["units"] == 0
+
+
+def test_travel_keeps_the_loop_responsive():
+    ticks = []
+
+    async def heartbeat():
+        while True:
+            ticks.append(asyncio.get_running_loop().time())
+            await asyncio.sleep(0.01)
+
+    game = MockGame(systems=5, time_scale=0.001)
+    with MockServer(game=game, latency=0.2) as server:
+        request = async_request(server)
+        with temporary_database():
+            data = register_agent(request.sync, 0, "TRAVELAGENT")
+            origin = data["ship"]["nav"]["waypointSymbol"]
+            system_symbol = data["ship"]["nav"]["systemSymbol"]
+            destination = [
+                wp
+                for wp in game.markets
+                if wp.startswith(f"{system_symbol}-") and wp != origin
+            ][0]
+
+            async def main():
+                task = asyncio.create_task(heartbeat())
+                queues = list(request.queues.values())
+                ship = await AsyncShip.load(data["ship"]["symbol"], queues, 0)
+                # (the system is loaded from the API on the way)
+                await travel(ship, destination, verbose=False)
+                task.cancel()
+                return ship
+
+            ship = asyncio.run(main())
+    assert ship["nav"]["waypointSymbol"] == destination
+    # the heartbeat kept beating while the system was loaded
+    assert max(t1 - t0 for t0, t1 in zip(ticks, ticks[1:])) < 0.15
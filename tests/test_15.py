@@ -0,0 +1,160 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing.connection import Client, Listener
+from time import sleep, time
+from uuid import uuid1
+
+import pytest
+
+import st2.request
+from st2.request import AsyncRequestMp, RawJson, RequestMp, _Replies
+from tests.mock_server import MockServer, start_messenger
+
+
+def wait_for(condition, timeout=5):
+    end = time() + timeout
+    while not condition():
+        assert time() < end
+        sleep(0.01)
+
+
+def job(endpoint, reply=None):
+    return {
+        "uuid": uuid1(),
+        "method": "get",
+        "endpoint": endpoint,
+        "token": "token",
+        "data": None,
+        "params": None,
+        "reply": reply,
+    }
+
+
+def test_timeout_cancels_queued_request():
+    with MockServer(latency=0.3) as server:
+        messenger, request = start_messenger(server, workers=1)
+        first = request._submit("get", "my/ships/S-1", None, None)
+        with pytest.raises(TimeoutError):
+            request.get("my/ships/S-2", timeout=0.1)
+        first.result()
+        sleep(0.4)
+        assert server.requests == 1
+        assert messenger.stats()["cancelled"] == [1, 0]
+
+
+def test_answer_after_timeout():
+    class Late(Future):
+        def result(self, timeout=None):
+            if timeout is not None:
+                # the answer arrives just after the timeout
+                self.set_result("answer")
+                raise FutureTimeoutError
+            return super().result()
+
+    assert RequestMp._result(Late(), 0.1) == "answer"
+
+
+def test_cancel_while_decoding(monkeypatch):
+    replies = _Replies()
+    first, second = uuid1(), uuid1()
+    cancelled = replies.expect(first)
+    answered = replies.expect(second)
+
+    def loads(content):
+        cancelled.cancel()  # e.g. a timeout while the answer is decoded
+        return {"data": content.decode()}
+
+    monkeypatch.setattr(st2.request, "_loads", loads)
+    with Client(replies.address) as conn:
+        conn.send((first, RawJson(b"first")))
+        conn.send((second, RawJson(b"second")))
+        # the next answers on the connection still arrive
+        assert answered.result(timeout=5) == {"data": "second"}
+    assert cancelled.cancelled()
+
+
+def test_cancel_coroutine():
+    with MockServer(latency=0.3) as server:
+        messenger, request = start_messenger(server, workers=1)
+        request = AsyncRequestMp(list(request.queues.values()), token="token")
+
+        async def main():
+            first = asyncio.ensure_future(request.get("my/ships/S-1"))
+            second = asyncio.ensure_future(request.get("my/ships/S-2"))
+            await asyncio.sleep(0.1)
+            second.cancel()  # e.g. TaskMaster.cancel
+            await first
+
+        asyncio.run(main())
+        sleep(0.4)
+        assert server.requests == 1
+        assert messenger.stats()["cancelled"] == [1, 0]
+
+
+def test_stopped_caller():
+    with MockServer() as server:
+        messenger, request = start_messenger(server)
+        queue, _ = request.queues[0]
+        queue.put(job("my/ships/S-1", reply="/tmp/st2-stopped-caller"))
+        wait_for(lambda: messenger.orphaned == [1, 0])
+        # the other requests of the stopped process are not sent
+        queue.put(job("my/ships/S-2", reply="/tmp/st2-stopped-caller"))
+        wait_for(lambda: messenger.cancelled == [1, 0])
+        assert server.requests == 1
+        assert not messenger._jobs
+        assert "/tmp/st2-stopped-caller" not in messenger._replies
+
+        # forgotten once none of its requests are left
+        messenger._forget_stopped(time() - 60)  # too recent
+        assert messenger._stopped
+        messenger._forget_stopped(time() + 1)
+        assert not messenger._stopped
+
+
+def test_stuck_caller():
+    with MockServer() as server:
+        messenger, request = start_messenger(server)
+        # a process that does not read its answers: the send blocks
+        with Listener(family="AF_UNIX") as stuck:
+            answer = RawJson(b"x" * 2**24)
+            deliver = threading.Thread(
+                target=messenger._deliver,
+                args=(0, job("my/ships/S-1", reply=stuck.address), answer),
+                daemon=True,
+            )
+            deliver.start()
+            sleep(0.1)
+            # the other processes still get their answers
+            assert "data" in request.get("my/ships/S-2", timeout=2)
+        deliver.join(timeout=5)
+        assert not deliver.is_alive()
+
+
+def test_evict_unclaimed_answers():
+    with MockServer() as server:
+        messenger, request = start_messenger(server)
+        queue, answer_dict = request.queues[1]
+        claimed, unclaimed = job("my/ships/S-1"), job("my/ships/S-2")
+        queue.put(claimed)
+        queue.put(unclaimed)
+        wait_for(lambda: len(answer_dict) == 2)
+        assert "data" in answer_dict.pop(claimed["uuid"])
+
+        messenger._evict_answers(time() - 60)  # too recent
+        assert len(answer_dict) == 1
+        messenger._evict_answers(time() + 1)
+        assert not answer_dict
+        evicted = messenger.stats()["evicted"]
+        assert evicted["answers"] == 1
+        assert evicted["bytes"] > 0
+
+
+def test_malformed_job():
+    with MockServer() as server:
+        messenger, request = start_messenger(server)
+        queue, _ = request.queues[0]
+        queue.put(("get", "my/ships/S-1"))  # e.g. a legacy tuple
+        # the queue is still served
+        assert request.get("my/ships/S-2", priority=0, timeout=5)
@@ -0,0 +1,116 @@
+import asyncio
+import os
+from multiprocessing import AuthenticationError, Process
+from time import sleep, time
+
+import pytest
+
+import st2.request
+from st2.request import AsyncRequestMp, Messenger, RequestClient
+from tests.mock_server import MockServer, start_messenger
+
+
+def wait_for(condition, timeout=5):
+    end = time() + timeout
+    while not condition():
+        assert time() < end
+        sleep(0.01)
+
+
+@pytest.fixture
+def broker(tmp_path):
+    with MockServer(latency=0.2) as server:
+        address = str(tmp_path / "broker.sock")
+        messenger, _ = start_messenger(server, workers=1, broker=address)
+        wait_for(lambda: os.path.exists(address))
+        yield server, messenger, address
+
+
+def test_broker_requests(broker):
+    server, messenger, address = broker
+    request = RequestClient(address, priority=1, token="token")
+    assert len(request.queues) == 2
+    assert request.get("my/ships/S-1")["data"]["endpoint"] == "my/ships/S-1"
+    assert request.post("my/ships/S-1/orbit")
+
+    # coroutines can use the same connection
+    async_request = AsyncRequestMp(request.qa_pairs, token="token")
+    data = asyncio.run(async_request.get("my/ships/S-2"))
+    assert data["data"]["endpoint"] == "my/ships/S-2"
+    assert server.requests == 3
+    assert messenger.stats()["scheduler"]["served"] == [1, 2]
+
+
+def test_broker_cancel(broker):
+    server, messenger, address = broker
+    request = RequestClient(address, token="token")
+    first = request._submit("get", "my/ships/S-1", None, None)
+    with pytest.raises(TimeoutError):
+        request.get("my/ships/S-2", timeout=0.05)
+    first.result()
+    sleep(0.3)
+    assert server.requests == 1
+    assert messenger.cancelled == [1, 0]
+
+
+def send_and_stop(address):
+    request = RequestClient(address, token="token")
+    for n in range(3):
+        request._submit("get", f"my/ships/S-{n}", None, None)
+    sleep(0.1)
+
+
+def test_broker_client_stopped(broker):
+    server, messenger, address = broker
+    p = Process(target=send_and_stop, args=(address,))
+    p.start()
+    p.join()
+    # the request in flight is answered, the queued requests are dropped
+    wait_for(lambda: messenger.cancelled == [2, 0])
+    sleep(0.3)
+    assert server.requests == 1
+    assert messenger.orphaned == [1, 0]
+    # the connection of the client is closed
+    assert not messenger._replies
+
+
+def test_broker_authkey(broker):
+    server, messenger, address = broker
+    # a new key for each run, readable by this user only
+    assert os.stat(f"{address}.key").st_mode & 0o777 == 0o600
+    with pytest.raises((AuthenticationError, EOFError, OSError)):
+        RequestClient(address, authkey=b"wrong key")
+    # the broker still accepts clients with the key
+    assert RequestClient(address, token="token").get("my/ships/S-1")
+
+
+def test_broker_env_authkey(tmp_path, monkeypatch):
+    # ST2_BROKER_AUTHKEY (startup passes it to the messenger)
+    monkeypatch.setattr(st2.request, "broker_authkey", b"secret")
+    address = str(tmp_path / "broker.sock")
+    with open(f"{address}.key", "wb") as f:
+        f.write(b"stale key")  # left behind by a stopped messenger
+    with MockServer() as server:
+        start_messenger(server, broker=address, authkey=st2.request.broker_authkey)
+        wait_for(lambda: os.path.exists(address))
+        assert RequestClient(address, token="token").get("my/ships/S-1")
+        # also without the key file
+        os.unlink(f"{address}.key")
+        assert RequestClient(address, token="token").get("my/ships/S-2")
+
+
+def test_broker_tcp_needs_authkey():
+    messenger = Messenger([], broker="127.0.0.1:0")
+    with pytest.raises(ValueError):
+        messenger._listen()
+    with pytest.raises(ValueError):
+        RequestClient("127.0.0.1:1")
+
+
+def test_broker_malformed_job(broker):
+    server, messenger, address = broker
+    request = RequestClient(address, token="token")
+    request.conn.send("not a (priority, job) tuple")
+    request.conn.send((0, ("get", "my/ships/S-1")))
+    # the connection is still served
+    assert request.get("my/ships/S-2")
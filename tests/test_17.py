@@ -0,0 +1,85 @@
+from time import perf_counter, sleep
+
+import pytest
+
+import st2.scheduler
+from st2.scheduler import Scheduler
+from tests.mock_server import MockServer, start_messenger
+
+
+def fill(scheduler, priority, n=100):
+    for i in range(n):
+        scheduler.put(priority, i)
+
+
+def test_budget_reserve():
+    scheduler = Scheduler(3, budgets=[None, None, (20, None)])
+    fill(scheduler, 0)
+    fill(scheduler, 2)
+    served = []
+    t0 = perf_counter()
+    while perf_counter() - t0 < 0.5:
+        served.append(scheduler.get()[0])
+        sleep(0.01)
+    # the strict class 0 would otherwise starve class 2
+    assert 5 <= served.count(2) <= 15
+    assert scheduler.stats()["reserved"][2] == served.count(2)
+
+
+def test_budget_unused_reserve():
+    scheduler = Scheduler(2, budgets=[None, (100, None)])
+    fill(scheduler, 0, 10)
+    assert [scheduler.get()[0] for _ in range(10)] == [0] * 10
+
+
+def test_budget_cap():
+    scheduler = Scheduler(2, budgets=[(None, 5), None])
+    fill(scheduler, 0, 20)
+    t0 = perf_counter()
+    for _ in range(10):  # the bucket holds 2 seconds
+        scheduler.get()
+    assert perf_counter() - t0 < 0.05
+    assert scheduler.get(timeout=0.05) is None
+    assert scheduler.get()[0] == 0
+    assert perf_counter() - t0 >= 0.15
+
+    # other classes go while the class is capped
+    fill(scheduler, 1, 1)
+    assert scheduler.get(timeout=0.01) == (1, 0)
+    assert scheduler.stats()["capped"] == [1, 0]
+
+    # budgets can be changed at runtime
+    scheduler.set_budget(0, cap=None)
+    assert scheduler.get(timeout=0.01)[0] == 0
+    with pytest.raises(ValueError):
+        scheduler.set_budget(0, reserve=-1)
+
+
+def test_budget_utilization(monkeypatch):
+    scheduler = Scheduler(2, budgets=[(0.5, None), None])
+    fill(scheduler, 0, 3)
+    fill(scheduler, 1, 3)
+    monkeypatch.setattr(st2.scheduler, "time", lambda: 600.0)
+    scheduler.get(), scheduler.get(), scheduler.get()
+    monkeypatch.setattr(st2.scheduler, "time", lambda: 660.0)
+    scheduler.get()
+    utilization = scheduler.stats()["utilization"]
+    assert len(utilization) == 1
+    assert utilization[0] == {
+        "timestamp": 600,
+        "rates": [0.05, 0.0],  # 3 requests per minute
+        "reserved": [0.1, None],  # of 0.5 requests per second
+    }
+
+
+def test_set_budget_at_runtime():
+    with MockServer() as server:
+        messenger, request = start_messenger(server, budgets=[None, (None, 1)])
+        request.set_budget(1, reserve=0.5)
+        request.get("my/ships/S-1")  # (after the budget message)
+        sleep(0.1)
+        budgets = messenger.stats()["scheduler"]["budgets"]
+        assert budgets == [
+            {"reserve": None, "cap": None},
+            {"reserve": 0.5, "cap": None},
+        ]
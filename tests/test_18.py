@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep, time
+
+import st2.request
+from st2.metrics import Ledger
+from tests.mock_server import MockServer, start_messenger
+
+
+def test_ledger():
+    ledger = Ledger()
+    ledger.record("probe", 600.0)
+    ledger.record("probe", 619.0, retries=2)
+    ledger.record("probe", 630.0, error="GameError")
+    ledger.record(None, 659.0, coalesced=True)
+    ledger.record("probe", 660.0)
+
+    # only completed minutes are taken
+    rows = ledger.take(before=665.0)
+    assert rows == [(600, "probe", 5, 0, 1), (600, "untagged", 0, 1, 0)]
+    assert ledger.take(before=665.0) == []
+    ledger.restore(rows[:1])
+    assert ledger.take(before=720.0) == [
+        (600, "probe", 5, 0, 1),
+        (660, "probe", 1, 0, 0),
+    ]
+    assert ledger.snapshot() == {
+        "probe": {"calls": 6, "coalesced": 0, "errors": 1},
+        "untagged": {"calls": 0, "coalesced": 1, "errors": 0},
+    }
+
+
+def test_tags_flow_through_the_messenger():
+    with MockServer(latency=0.3) as server:
+        messenger, request = start_messenger(server)
+        probe = request.tagged("probe")
+        seed = request.tagged("seed")
+        assert request.tag is None
+        with ThreadPoolExecutor(2) as pool:
+            pool.submit(probe.get, "my/ships")
+            sleep(0.1)
+            pool.submit(seed.get, "my/ships")  # answered by the probe's call
+        seed.post("my/ships/S-1/orbit")
+        assert messenger.stats()["ledger"] == {
+            "probe": {"calls": 1, "coalesced": 0, "errors": 0},
+            "seed": {"calls": 1, "coalesced": 1, "errors": 0},
+        }
+
+
+def test_write_ledger(monkeypatch):
+    written = []
+
+    def db_write_api_calls(rows):
+        if not written:
+            written.append(None)
+            raise ConnectionError("database down")
+        written.extend(rows)
+
+    monkeypatch.setattr(st2.request, "db_write_api_calls", db_write_api_calls)
+    monkeypatch.setattr(st2.request.Messenger, "ledger_interval", 0.05)
+    timestamp = time() - 60
+    with MockServer() as server:
+        messenger, request = start_messenger(server, ledger=True)
+        messenger.ledger.record("probe", timestamp)
+        sleep(0.3)
+    # written after the database came back
+    assert written[1:] == [(int(timestamp // 60) * 60, "probe", 1, 0, 0)]
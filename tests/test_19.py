@@ -0,0 +1,39 @@
+import pickle
+from uuid import uuid1
+
+from st2.request import RawJson, RequestMp
+from tests.mock_server import MockServer, start_messenger
+from tests.test_15 import wait_for
+
+
+def test_raw_json():
+    raw = RawJson(b'{"data": {"symbol": "S-1"}}')
+    assert pickle.loads(pickle.dumps(raw)).json() == {"data": {"symbol": "S-1"}}
+    assert RawJson(b"").json() == {}
+
+
+def test_raw_requests():
+    with MockServer() as server:
+        messenger, request = start_messenger(server)
+        raw = RequestMp(list(request.queues.values()), token="token", raw=True)
+        # decoded in this process
+        ret = raw.get("my/ships/S-1")
+        assert ret == request.get("my/ships/S-1", ttl=0)
+        assert ret["data"]["endpoint"] == "my/ships/S-1"
+
+        # decoded by the messenger for answers without a reply socket
+        queue, answer_dict = request.queues[0]
+        uuid = uuid1()
+        queue.put(
+            {
+                "uuid": uuid,
+                "method": "get",
+                "endpoint": "my/ships/S-2",
+                "token": "token",
+                "data": None,
+                "params": None,
+                "raw": True,
+            }
+        )
+        wait_for(lambda: uuid in answer_dict)
+        assert answer_dict[uuid]["data"]["endpoint"] == "my/ships/S-2"
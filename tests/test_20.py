@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+import st2.db
+from st2.db import db_conn, db_pool, db_pool_async, db_pool_stats
+from st2.stargazers import astronomer, cartographer
+from st2.system import System
+from tests.database import temporary_database
+from tests.mock_game import MockGame
+from tests.mock_server import MockServer, start_messenger
+
+
+@pytest.fixture
+def pools(monkeypatch):
+    # no connections are opened until they are needed (there is no database here)
+    monkeypatch.setattr(st2.db, "pool_min_size", 0)
+    monkeypatch.setattr(st2.db, "_pool", None)
+    yield
+    if st2.db._pool is not None:
+        st2.db._pool[1].close()
+
+
+def test_pool_per_process(pools):
+    pool = db_pool()
+    assert db_pool() is pool
+    assert pool.max_size == st2.db.pool_max_size
+    stats = db_pool_stats()["sync"]
+    assert stats["wait_ms"] == 0
+    assert stats["pool_max"] == st2.db.pool_max_size
+
+    # a forked process opens its own pool
+    st2.db._pool = (-1, pool)
+    assert db_pool() is not pool
+    pool.close()
+
+
+def test_async_pool_per_event_loop(pools):
+    async def main():
+        pool = await db_pool_async()
+        assert await db_pool_async() is pool
+        assert "async" in db_pool_stats()
+        await pool.close()
+        return pool
+
+    assert asyncio.run(main()) is not asyncio.run(main())
+
+
+class BusyRequest:
+    """a request for which another user of the pool needs a connection per call"""
+
+    def __init__(self, request):
+        self.request = request
+
+    def get(self, *args, **kwargs):
+        with db_conn() as conn:
+            conn.execute("SELECT 1")
+        return self.request.get(*args, **kwargs)
+
+    def get_all(self, *args, **kwargs):
+        with db_conn() as conn:
+            conn.execute("SELECT 1")
+        yield from self.request.get_all(*args, **kwargs)
+
+
+def test_crawl_releases_the_connection(monkeypatch):
+    # a single connection: a crawl holding it would starve the other users
+    monkeypatch.setattr(st2.db, "pool_max_size", 1)
+    monkeypatch.setattr(st2.db, "pool_timeout", 2)
+    with MockServer(game=MockGame(systems=30, start_systems=2)) as server:
+        _, request = start_messenger(server)
+        request = BusyRequest(request)
+        with temporary_database():
+            astronomer(request, priority=1, token="token")
+            cartographer(request, priority=1, token="token")
+            with db_conn() as conn:
+                systems = conn.execute("SELECT count(*) FROM systems").fetchone()
+                current = conn.execute("SELECT current, total FROM cartographer")
+                markets = conn.execute("SELECT count(*) FROM markets").fetchone()
+                assert systems == (30,)
+                assert current.fetchone()[0] == 2
+                assert markets[0] > 0
+
+
+def test_system_releases_the_connection(monkeypatch):
+    monkeypatch.setattr(st2.db, "pool_max_size", 1)
+    monkeypatch.setattr(st2.db, "pool_timeout", 2)
+    game = MockGame(systems=5, start_systems=1)
+    with MockServer(game=game) as server:
+        _, request = start_messenger(server)
+        request = BusyRequest(request)
+        with temporary_database():
+            symbol = next(iter(game.systems))
+            system = System(symbol, request, token="token", priority=1)
+            assert len(system.waypoints) == len(game.systems[symbol]["waypoints"])
+            assert None not in [wp["traits"] for wp in system.waypoints.values()]
+            # loaded from the database the next time
+            assert System(symbol, request, "token", 1).waypoints == system.waypoints
@@ -0,0 +1,135 @@
+import asyncio
+from contextlib import asynccontextmanager, contextmanager
+from copy import copy
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from st2.db import Insert, db_conn, db_execute, db_execute_async
+from st2.ship._market import LATEST, TRADEGOODS
+from tests.database import temporary_database
+
+
+class Cursor:
+    """records the queries and copied rows"""
+
+    def __init__(self):
+        self.queries = []
+        self.copied = []
+
+    def execute(self, query, params=None):
+        self.queries.append((" ".join(query.split()), params))
+
+    @contextmanager
+    def copy(self, query):
+        self.queries.append((query, None))
+        yield self
+
+    def write_row(self, row):
+        self.copied.append(row)
+
+
+class AsyncCursor(Cursor):
+    async def execute(self, query, params=None):
+        super().execute(query, params)
+
+    @asynccontextmanager
+    async def copy(self, query):
+        self.queries.append((query, None))
+        yield self
+
+    async def write_row(self, row):
+        super().write_row(row)
+
+
+SYSTEMS = Insert(
+    "systems", ["symbol", "type", "x", "y"], "ON CONFLICT (symbol) DO NOTHING"
+)
+
+
+def test_multi_row_insert():
+    cur = Cursor()
+    SYSTEMS.execute(cur, [("X1-A", "RED_STAR", 1, 2), ("X1-B", "BLUE_STAR", 3, 4)])
+    SYSTEMS.execute(cur, [])
+    assert cur.queries == [
+        (
+            'INSERT INTO systems ("symbol", "type", "x", "y") '
+            "VALUES (%s, %s, %s, %s), (%s, %s, %s, %s) "
+            "ON CONFLICT (symbol) DO NOTHING",
+            ["X1-A", "RED_STAR", 1, 2, "X1-B", "BLUE_STAR", 3, 4],
+        )
+    ]
+
+
+def test_copy_through_staging_table():
+    rows = [(f"X1-{n}", "RED_STAR", n, n) for n in range(SYSTEMS.copy_rows + 1)]
+    cur = AsyncCursor()
+    asyncio.run(SYSTEMS.execute_async(cur, rows))
+    queries = [query for query, _ in cur.queries]
+    assert queries[0].startswith("CREATE TEMPORARY TABLE IF NOT EXISTS staging_systems")
+    assert queries[1:3] == [
+        "TRUNCATE staging_systems",
+        'COPY staging_systems ("symbol", "type", "x", "y") FROM STDIN',
+    ]
+    assert queries[3] == (
+        'INSERT INTO systems ("symbol", "type", "x", "y") '
+        'SELECT "symbol", "type", "x", "y" FROM staging_systems '
+        "ON CONFLICT (symbol) DO NOTHING"
+    )
+    assert cur.copied == rows
+
+    # without a conflict clause, the rows are copied into the table
+    cur = Cursor()
+    Insert("events", ["symbol"]).execute(cur, [(n,) for n in range(1000)])
+    assert cur.queries == [('COPY events ("symbol") FROM STDIN', None)]
+    assert len(cur.copied) == 1000
+
+
+def snapshot(timestamp, price, goods=3):
+    return [
+        (
+            "X1-A1-B1",
+            "X1-A1",
+            f"GOOD_{g}",
+            60,
+            "EXCHANGE",
+            "MODERATE",
+            "GROWING",
+            price + g,
+            price + g - 10,
+            timestamp,
+        )
+        for g in range(goods)
+    ]
+
+
+@pytest.mark.parametrize("copy_rows", [Insert.copy_rows, 0])
+def test_market_upserts(copy_rows):
+    # the multi-row INSERT path, and the COPY path (through the staging tables)
+    tradegoods, latest = copy(TRADEGOODS), copy(LATEST)
+    tradegoods.copy_rows = latest.copy_rows = copy_rows
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+
+    def write(timestamp, price):
+        rows = snapshot(timestamp, price)
+        return [(tradegoods, rows), (latest, rows)]
+
+    with temporary_database():
+        db_execute(write(now, 100))
+        db_execute(write(now, 100))  # the same snapshot again
+        db_execute(write(now + timedelta(minutes=1), 200))
+        # an older snapshot arriving late does not replace the latest prices
+        asyncio.run(db_execute_async(write(now - timedelta(minutes=1), 50)))
+        with db_conn() as conn:
+            history = conn.execute(
+                'SELECT count(*) FROM market_tradegoods WHERE "symbol" = %s',
+                ("GOOD_0",),
+            ).fetchone()[0]
+            prices = conn.execute(
+                'SELECT "symbol", "purchasePrice", "timestamp" FROM market_latest '
+                'ORDER BY "symbol"'
+            ).fetchall()
+    assert history == 3
+    assert prices == [
+        (f"GOOD_{g}", 200 + g, now + timedelta(minutes=1)) for g in range(3)
+    ]
@@ -0,0 +1,55 @@
+from st2.ship import Ship
+from st2.ship._market import LATEST, TRADEGOODS, _market_statements
+from st2.ship._shipyard import _shipyard_statements
+
+
+def ship():
+    ship = Ship.__new__(Ship)
+    ship["nav"] = {"systemSymbol": "X1-A1", "waypointSymbol": "X1-A1-B2"}
+    return ship
+
+
+def test_market_latest():
+    data = {
+        "imports": [],
+        "exports": [{"symbol": "FUEL"}],
+        "exchange": [],
+        "tradeGoods": [
+            {
+                "symbol": "FUEL",
+                "tradeVolume": 60,
+                "type": "EXPORT",
+                "supply": "HIGH",
+                "purchasePrice": 70,
+                "sellPrice": 68,
+            }
+        ],
+    }
+    statements = dict(_market_statements(ship(), data))
+    # the latest trade goods are upserted with the history (in one transaction)
+    assert statements[LATEST] == statements[TRADEGOODS]
+    assert statements[LATEST][0][:3] == ("X1-A1-B2", "X1-A1", "FUEL")
+    assert LATEST.on_conflict.startswith(
+        'ON CONFLICT ("waypointSymbol", "symbol") DO UPDATE SET "tradeVolume"'
+    )
+    assert LATEST.on_conflict.endswith(
+        'WHERE market_latest."timestamp" <= excluded."timestamp"'
+    )
+
+
+def test_shipyard_latest():
+    data = {
+        "shipTypes": [{"type": "SHIP_PROBE"}],
+        "modificationsFee": 100,
+        "ships": [
+            {
+                "type": "SHIP_PROBE",
+                "supply": "MODERATE",
+                "activity": "WEAK",
+                "purchasePrice": 25000,
+            }
+        ],
+    }
+    tables = {insert.table: rows for insert, rows in _shipyard_statements(ship(), data)}
+    assert tables["shipyard_latest"] == tables["shipyard_ships"]
+    assert len(tables["shipyard_latest"]) == 1
@@ -0,0 +1,170 @@
+import datetime
+
+import st2.db
+from st2.db import (
+    _midnight,
+    _partition_bounds,
+    _partition_plan,
+    db_conn,
+    db_partitions_maintain,
+    db_tables_init,
+)
+from tests.database import temporary_database
+
+TODAY = datetime.date(2025, 3, 10)
+
+
+def test_partition_bounds():
+    assert _partition_bounds("events", "events_p20250310") == (
+        TODAY,
+        datetime.date(2025, 3, 11),
+    )
+    assert _partition_bounds("events", "events_legacy_20250301") == (
+        None,
+        datetime.date(2025, 3, 1),
+    )
+    assert _partition_bounds("events", "events_default") == (None, None)
+
+
+def test_create_partitions_ahead():
+    names = ["events_default", "events_p20250310"]
+    create, retire = _partition_plan("events", names, TODAY)
+    assert create == [datetime.date(2025, 3, 11), datetime.date(2025, 3, 12)]
+    assert retire == []
+
+
+def test_legacy_partition_covers_its_days():
+    # a table partitioned today holds today's rows in its legacy partition
+    names = ["navigation_default", "navigation_legacy_20250311"]
+    create, _ = _partition_plan("navigation", names, TODAY)
+    assert create == [datetime.date(2025, 3, 11), datetime.date(2025, 3, 12)]
+
+
+def test_retention(monkeypatch):
+    names = [
+        "market_tradegoods_default",
+        "market_tradegoods_legacy_20250301",
+        "market_tradegoods_p20250302",
+        "market_tradegoods_p20250303",
+        "market_tradegoods_p20250304",
+    ]
+    _, retire = _partition_plan("market_tradegoods", names, TODAY)
+    assert retire == []  # keep everything by default
+
+    monkeypatch.setattr(st2.db, "retention_days", 7)
+    _, retire = _partition_plan("market_tradegoods", names, TODAY)
+    # partitions that end on or before 2025-03-03
+    assert retire == [
+        "market_tradegoods_legacy_20250301",
+        "market_tradegoods_p20250302",
+    ]
+
+
+# the history tables as created before partitioning
+LEGACY = [
+    """
+    CREATE TABLE market_tradegoods
+    (
+        "waypointSymbol" text,
+        "systemSymbol" text,
+        "symbol" text,
+        "tradeVolume" integer,
+        "type" text,
+        "supply" text,
+        "activity" text,
+        "purchasePrice" integer,
+        "sellPrice" integer,
+        "timestamp" timestamptz,
+        PRIMARY KEY ("waypointSymbol", "symbol", "timestamp")
+    )
+    """,
+    """
+    CREATE TABLE events
+    (
+        "symbol" text,
+        "shipSymbol" text,
+        "activity" text,
+        "component" text,
+        "condition" float8,
+        "timestamp" timestamptz
+    )
+    """,
+    'CREATE TABLE navigation ("distance" float8, "time" float8, "fuel" integer)',
+]
+TRADEGOOD = (
+    'INSERT INTO market_tradegoods ("waypointSymbol", "symbol", "timestamp") '
+    "VALUES ('X1-A1-B1', 'FUEL', %s)"
+)
+
+
+def partitions(conn, table):
+    """partition: number of rows, of a history table"""
+    return dict(
+        conn.execute(
+            f"SELECT tableoid::regclass::text, count(*) FROM {table} GROUP BY 1"
+        ).fetchall()
+    )
+
+
+def test_partition_legacy_tables(monkeypatch):
+    today = st2.db._today()
+    day = datetime.timedelta(days=1)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    with temporary_database(init=False):
+        with db_conn() as conn:
+            for query in LEGACY:
+                conn.execute(query)
+            for t in (now - 10 * day, now - day, now):
+                conn.execute(TRADEGOOD, (t,))
+            conn.execute("INSERT INTO events (symbol, timestamp) VALUES ('A', NULL)")
+            conn.execute("INSERT INTO events (symbol, timestamp) VALUES ('B', now())")
+            conn.execute(
+                "INSERT INTO events (symbol, timestamp) VALUES ('C', %s)",
+                (now + 5 * day,),
+            )
+            conn.execute("INSERT INTO navigation VALUES (1, 2, 3)")
+        db_tables_init()
+
+        legacy = f"market_tradegoods_legacy_{today + day:%Y%m%d}"
+        in_3_days = f"market_tradegoods_p{today + 3 * day:%Y%m%d}"
+        with db_conn() as conn:
+            assert partitions(conn, "market_tradegoods") == {legacy: 3}
+            assert partitions(conn, "events") == {
+                f"events_legacy_{today + day:%Y%m%d}": 1,
+                "events_default": 2,  # (no timestamp, or a later one)
+            }
+            assert partitions(conn, "navigation") == {
+                f"navigation_legacy_{today + day:%Y%m%d}": 1
+            }
+            # a row without a partition yet
+            conn.execute(TRADEGOOD, (_midnight(today + 3 * day),))
+            assert partitions(conn, "market_tradegoods")["market_tradegoods_default"]
+
+        # the next day: its rows move from the default partition to a new partition
+        db_partitions_maintain(today + day)
+        with db_conn() as conn:
+            assert partitions(conn, "market_tradegoods") == {legacy: 3, in_3_days: 1}
+            conn.execute(TRADEGOOD, (_midnight(today + day),))
+
+        # archive the partitions past the retention
+        monkeypatch.setattr(st2.db, "retention_days", 2)
+        db_partitions_maintain(today + 3 * day)
+        with db_conn() as conn:
+            assert partitions(conn, "market_tradegoods") == {
+                f"market_tradegoods_p{today + day:%Y%m%d}": 1,
+                in_3_days: 1,
+            }
+            assert partitions(conn, f"archive.{legacy}") == {f"archive.{legacy}": 3}
+
+        # or drop them
+        monkeypatch.setattr(st2.db, "retention_action", "drop")
+        db_partitions_maintain(today + 4 * day)
+        with db_conn() as conn:
+            assert partitions(conn, "market_tradegoods") == {in_3_days: 1}
+            tables = conn.execute(
+                "SELECT table_schema, table_name FROM information_schema.tables"
+            ).fetchall()
+            assert ("archive", legacy) in tables
+            assert f"market_tradegoods_p{today + day:%Y%m%d}" not in [
+                name for _, name in tables
+            ]
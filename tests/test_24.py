@@ -0,0 +1,31 @@
+import st2.db
+from st2.db import INDEXES, OBSOLETE_INDEXES, db_conn, db_indexes_init
+from tests.database import temporary_database
+
+
+def index_states(conn):
+    """name: valid, of the indexes in the database"""
+    return dict(conn.execute("""
+            SELECT c.relname, i.indisvalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            """).fetchall())
+
+
+def test_indexes_init_twice(monkeypatch):
+    # one connection: the concurrent builds run on the connection used before
+    monkeypatch.setattr(st2.db, "pool_min_size", 1)
+    monkeypatch.setattr(st2.db, "pool_max_size", 1)
+    with temporary_database():  # db_tables_init builds the indexes
+        with db_conn() as conn:
+            conn.execute(f"CREATE INDEX {OBSOLETE_INDEXES[0]} ON tasks (symbol)")
+            # as after an interrupted CREATE INDEX CONCURRENTLY
+            conn.execute("""
+                UPDATE pg_index SET indisvalid = false
+                WHERE indexrelid = 'tasks_pname_idx'::regclass
+                """)
+        db_indexes_init()
+        db_indexes_init()  # nothing left to do
+        with db_conn() as conn:
+            states = index_states(conn)
+    assert {name: states.get(name) for name in INDEXES} == dict.fromkeys(INDEXES, True)
+    assert not set(OBSOLETE_INDEXES) & set(states)